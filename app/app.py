@@ -9,15 +9,19 @@ import time
 from datetime import datetime, timedelta
 
 import flask
-import pyodbc
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, session, \
+    stream_with_context
 from flask.cli import load_dotenv
 from flask_executor import Executor
 from flask_httpauth import HTTPBasicAuth
 
 import vars.global_vars as global_vars
-from functions.DatabaseManager import DatabaseManager
-from functions.pwsh_processor import process_csv
+from functions.DatabaseManager import DEFAULT_PAGE_SIZE, DatabaseManager
+from functions.StorageBackend import FILTER_COLUMNS
+from functions.inventory_export import export_stream
+from functions.ProgressBroadcaster import progress_broadcaster
+from functions.pwsh_processor import process_csv, progress_state
+from functions.startup_timing import startup_report
 from secret.user_management import USER_DETAILS_FILEPATH, user_auth
 
 app = Flask(__name__, template_folder='templates', static_folder="static")
@@ -111,25 +115,54 @@ os.makedirs(LOG_DIR, exist_ok=True)
 logging.basicConfig(filename=os.path.join(LOG_DIR, f'{db_manager.get_timestamp("dmy")}-app.log'), level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Systeminformationen
+# Systeminformationen, die IP-Adresse wird erst für die Statusseite aufgelöst (DNS kann beim Start hängen)
 system_info = {
     'hostname': socket.gethostname(),
-    'ip_address': socket.gethostbyname(socket.gethostname()),
+    'ip_address': None,
     'os': platform.platform(),
     'python_version': platform.python_version(),
     'flask_version': flask.__version__,
     'start_time': datetime.now()
 }
 
-try:
-    service_active_db = db_manager.get_metadata("service_active")
-    if service_active_db == 1:
-        global_vars.service_active.set()
-    else:
-        global_vars.service_active.clear()
-    print(f"Service status synchronized from database: {'Active' if service_active_db == 1 else 'Inactive'}")
-except Exception as e:
-    print(f"Error synchronizing service status: {e}")
+
+def get_ip_address():
+    """
+    Resolves the ip address of this host once and keeps it in ``system_info``
+    """
+    if system_info['ip_address'] is None:
+        try:
+            system_info['ip_address'] = socket.gethostbyname(system_info['hostname'])
+        except OSError as e:
+            logging.warning(f"Could not resolve ip address of {system_info['hostname']}: {e}")
+            return "unbekannt"
+    return system_info['ip_address']
+
+
+# Dienststatus aus der Datenbank, beim ersten Request statt beim Import (bis es klappt)
+service_status_synced = False
+
+
+def sync_service_status():
+    """
+    Takes over ``service_active`` from the database, a failure (database not reachable) is retried with the
+    next request
+
+    :return: ``bool`` synchronized
+    """
+    global service_status_synced
+    try:
+        service_active_db = db_manager.get_metadata("service_active")
+        if service_active_db == 1:
+            global_vars.service_active.set()
+        else:
+            global_vars.service_active.clear()
+        service_status_synced = True
+        print(f"Service status synchronized from database: {'Active' if service_active_db == 1 else 'Inactive'}")
+    except Exception as e:
+        print(f"Error synchronizing service status: {e}")
+    return service_status_synced
+
 
 port = 5000  #hell no, go away...
 
@@ -138,7 +171,7 @@ if os.environ.get('WERKZEUG_RUN_MAIN') != 'true' or not hasattr(app, 'welcome_sh
     print("\n" + "=" * 80)
     print("Software Inventory Service gestartet")
     print(f"Startzeit: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Website ist zugänglich über {system_info['ip_address']}:{port}")
+    print(f"Website ist zugänglich über {system_info['hostname']}:{port}")
     print("=" * 80 + "\n")
     app.welcome_shown = True
 
@@ -149,6 +182,12 @@ def verify_password(username, password):
     return None
 
 
+@app.before_request
+def ensure_service_status():
+    if not service_status_synced and request.endpoint != 'static':
+        sync_service_status()
+
+
 # Login-Erforderlich für alle Routen
 @app.before_request
 def require_login():
@@ -204,39 +243,16 @@ def dashboard():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    def get_distinct_number_hosts():
-        conn = db_manager.connect_db()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(DISTINCT hostname) from dbo.{db_manager.table_name}")
-
-        count = cursor.fetchall()
-        return count[0][0]
-
-    def get_distinct_number_software():
-        conn = db_manager.connect_db()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(DISTINCT name) from dbo.{db_manager.table_name}")
-        count = cursor.fetchall()
-        cursor.execute(f"SELECT COUNT(name) from dbo.{db_manager.table_name}")
-        count_all = cursor.fetchall()
-
-        return count[0][0], count_all[0][0]
-
-    def get_distinct_number_publisher():
-        conn = db_manager.connect_db()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT COUNT(DISTINCT publisher) from dbo.{db_manager.table_name}")
-
-        count = cursor.fetchall()
-        return count[0][0]
-
     last_run = get_last_run()
-    count_hosts = get_distinct_number_hosts()
-    count_sw = get_distinct_number_software()[0]
-    count_sw_all = get_distinct_number_software()[1]
-    count_publisher = get_distinct_number_publisher()
-
-    next_run = db_manager.get_metadata("next_inventory_run")
+    # Zählungen aus der Übersichtstabelle, aktualisiert nach jedem Lauf
+    counts = db_manager.get_inventory_counts()
+    count_hosts = counts['hosts']
+    count_sw = counts['software']
+    count_sw_all = counts['software_all']
+    count_publisher = counts['publisher']
+    counts_updated = counts['updated_at'].strftime("%d.%m.%Y %H:%M")
+
+    next_run = db_manager.get_service_metadata().next_inventory_run
     next_run = next_run.strftime("%Y-%m-%d %H:%M:%S")
 
     return render_template('dashboard.html',
@@ -244,19 +260,16 @@ def dashboard():
                            count_sw_all=count_sw_all,
                            count_sw=count_sw,
                            count_publisher=count_publisher,
+                           counts_updated=counts_updated,
                            last_run=last_run,
                            next_run=next_run)
 
 
 def get_last_run():
-    conn = db_manager.connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT last_inventory_start from dbo.service_metadata")
-    date_last_run = cursor.fetchall()[0][0]
-
-    if date_last_run != "None":
-        dt = datetime.strptime(str(date_last_run), "%Y-%m-%d %H:%M:%S.%f")
-        de_format = dt.strftime("%d.%m.%Y %H:%M:%S")
+    date_last_run = db_manager.get_service_metadata().last_inventory_start
+
+    if date_last_run is not None:
+        de_format = date_last_run.strftime("%d.%m.%Y %H:%M:%S")
     else:
         de_format = "Noch nicht ausgeführt"
     return de_format
@@ -321,17 +334,33 @@ def progress_data():
     last_run_formatted = None
     if global_vars.last_run_time:
         last_run_formatted = global_vars.last_run_time.strftime("%Y-%m-%d %H:%M:%S")
-    start_time_str = None
-    if global_vars.inventory_start_time:
-        start_time_str = global_vars.inventory_start_time.strftime("%Y-%m-%d %H:%M:%S")
+    # Fortschritt samt Restzeit aus den gemessenen Host-Dauern früherer Läufe
     with global_vars.processed_hosts_lock:
-        return jsonify({
-            'is_running': global_vars.is_running,
-            'total_hosts': global_vars.total_hosts,
-            'processed_hosts': global_vars.processed_hosts,
-            'start_time': start_time_str,
-            'last_run': last_run_formatted
-        })
+        state = progress_state()
+    state['last_run'] = last_run_formatted
+    return jsonify(state)
+
+
+def progress_snapshot():
+    with global_vars.processed_hosts_lock:
+        return progress_state()
+
+
+@app.route('/inventory-progress-stream')
+def progress_stream():
+    """
+    Server-Sent Events of the inventory progress: a ``snapshot`` on connect, then a ``host`` event per finished
+    host (with its status and the ETA) and a ``run`` event at start and end of a run. All viewers share one
+    producer, see ``ProgressBroadcaster``.
+    """
+    if 'username' not in session:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+
+    # Browser senden beim automatischen Neuverbinden die Id des letzten Ereignisses
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(stream_with_context(progress_broadcaster.stream(progress_snapshot, last_id)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -397,22 +426,64 @@ def get_inventory():
         return redirect(url_for('login'))
     log_request("INVENTORY_ACCESS")
 
-    def get_data_from_database():
-        conn = db_manager.connect_db()
-        cursor = conn.cursor()
-
-        cursor.execute(f"SELECT * FROM {db_manager.table_name}")
-        columns = [column[0] for column in cursor.description]
+    # Die Zeilen lädt die Seite seitenweise über /api/inventory
+    counts = db_manager.get_inventory_counts()
+    return render_template('inventory.html', total=counts['software_all'], page_size=DEFAULT_PAGE_SIZE)
 
-        cursor.execute(f"SELECT * FROM {db_manager.table_name}")
-        rows = cursor.fetchall()
 
-        inventory = [dict(zip(columns, row)) for row in rows]
-        return inventory
+@app.route('/api/inventory', methods=['GET'])
+def inventory_api():
+    """
+    One page of the software inventory as JSON. Query parameters: ``hostname``, ``name``, ``publisher`` and
+    ``version`` (contains), ``sort``, ``order`` (asc/desc), ``limit`` and ``cursor`` (``next_cursor`` of the
+    previous page)
+    """
+    if 'username' not in session:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
 
-    data = get_data_from_database()
+    try:
+        page = db_manager.get_inventory_page(
+            filters={column: request.args.get(column, '').strip() for column in FILTER_COLUMNS},
+            sort=request.args.get('sort', 'hostname'),
+            descending=request.args.get('order', 'asc').lower() == 'desc',
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    for item in page['items']:
+        # Datum als ISO-Text statt des HTTP-Datumsformats von jsonify
+        if item['installDate'] is not None:
+            item['installDate'] = str(item['installDate'])
+    return jsonify(page)
+
+
+@app.route('/api/inventory/export', methods=['GET'])
+def inventory_export():
+    """
+    Streams the whole inventory as a file. Query parameters: the filters and ``sort``/``order`` of
+    ``/api/inventory``, ``format`` (csv or ndjson), ``gzip`` (1) and ``run`` (state after this inventory run from
+    the history). Rows are read and sent in chunks, the memory doesn't grow with the table.
+    """
+    if 'username' not in session:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+    log_request("INVENTORY_EXPORT")
 
-    return render_template('inventory.html', inventory=data)
+    try:
+        row_chunks = db_manager.export_inventory(
+            filters={column: request.args.get(column, '').strip() for column in FILTER_COLUMNS},
+            sort=request.args.get('sort', 'hostname'),
+            descending=request.args.get('order', 'asc').lower() == 'desc',
+            run_id=request.args.get('run', type=int))
+        stream, content_type, extension = export_stream(
+            row_chunks, request.args.get('format', 'csv').lower(),
+            compress=request.args.get('gzip', '').lower() in ('1', 'true', 'yes'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    filename = f"inventory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return Response(stream_with_context(stream), mimetype=content_type,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
 
 @app.route('/run-inventory', methods=['GET', 'POST'])
@@ -538,21 +609,21 @@ def service_status():
     minutes, seconds = divmod(remainder, 60)
     uptime_str = f"{days} Tag(e), {hours} Stunde(n), {minutes} Minute(n), {seconds} Sekunde(n)"
 
-    connection = False
-
-    if db_manager.conn is not None:
-        connection = True
+    db_pool = db_manager.pool_stats()
+    connection = db_pool['open'] > 0
 
     last_run = get_last_run()
 
-    service_active_db_2 = db_manager.get_metadata("service_active")
+    # Eine Abfrage (oder keine, solange der Cache gilt) für alle Metadaten
+    metadata = db_manager.get_service_metadata()
+    service_active_db_2 = 1 if metadata.service_active else 0
     if service_active_db_2 == 1:
         global_vars.service_active.set()
     else:
         global_vars.service_active.clear()
-    status_interval_weeks = int(db_manager.get_metadata("interval_weeks"))
+    status_interval_weeks = metadata.interval_weeks
 
-    next_run = db_manager.get_metadata("next_inventory_run")
+    next_run = metadata.next_inventory_run
     next_run = next_run.strftime("%d.%m.%Y %H:%M:%S")
 
     def get_active_man_threads_count():
@@ -562,6 +633,7 @@ def service_status():
 
     return render_template("status.html",
                            inventory_running=inventory_running,
+                           ip_address=get_ip_address(),
                            service_active=service_active_db_2,  # Verwende den DB-Wert
                            system_info=system_info,
                            uptime=uptime_str,
@@ -570,9 +642,28 @@ def service_status():
                            interval_weeks=status_interval_weeks,
                            threads=threads,
                            connection=connection,
+                           db_pool=db_pool,
                            next_run=next_run)
 
 
+@app.route('/db-pool-stats')
+def db_pool_stats():
+    """Statistiken des Datenbank-Verbindungspools (offen, belegt, Wartezeiten) zur Dimensionierung"""
+    if 'username' not in session:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+
+    return jsonify(db_manager.pool_stats())
+
+
+@app.route('/startup-report')
+def startup_report_json():
+    """Dauer der Startschritte (Konfiguration, Datenbank-Verbindung, Schema-Prüfung)"""
+    if 'username' not in session:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+
+    return jsonify(startup_report())
+
+
 @app.route('/account')
 def account():
     """Kontoübersicht für den angemeldeten Benutzer"""
@@ -664,6 +755,8 @@ def test_db():
 def check_drivers():
     """Überprüft verfügbare ODBC-Treiber"""
     try:
+        # Nur für engine = mssql installiert
+        import pyodbc
         drivers = pyodbc.drivers()
         return jsonify({
             "available_drivers": drivers,
@@ -8,13 +8,15 @@ from datetime import datetime, timedelta
 import functions.pwsh_processor
 import functions.pwsh_processor as _func
 import vars.global_vars as gv
+from config.config_manager import get_settings
 from functions.DatabaseManager import DatabaseManager
 from functions.pwsh_processor import process_csv
 
 # Logger konfigurieren
 logger = logging.getLogger('SchedulerService')
 logger.setLevel(logging.INFO)
-handler = logging.FileHandler('logs/scheduler.log')
+# delay: Logdatei erst beim ersten Eintrag öffnen, nicht beim Import
+handler = logging.FileHandler('logs/scheduler.log', delay=True)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
@@ -34,18 +36,21 @@ def run_inventory():
         return False
 
     try:
+        # Geänderte config.ini (z.B. neue Zugangsdaten) vor dem Lauf übernehmen
+        get_settings(db_manager.config_file)
+
         # Fortschrittsvariablen setzen
         with gv.processed_hosts_lock:
             gv.inventory_start_time = datetime.now()
             gv.processed_hosts = 0
-            with open('csv\\hosts.csv', 'r') as f:
+            with open(gv.HOSTS_FILE, 'r') as f:
                 gv.total_hosts = sum(1 for _ in csv.reader(f)) - 1
             gv.is_running = True
 
         logger.info(f"Starting inventory at {datetime.now()}")
         process_csv(db_manager)
         end_time = datetime.now()
-        next_run = end_time + timedelta(weeks=db_manager.get_metadata("interval_weeks")[0] or 2)
+        next_run = end_time + timedelta(weeks=db_manager.get_service_metadata().interval_weeks or 2)
 
         db_manager.set_metadata("last_inventory_start", end_time.strftime("%Y-%m-%d %H:%M:%S"))
         db_manager.set_metadata("next_inventory_run", next_run.strftime("%Y-%m-%d %H:%M:%S"))
@@ -72,27 +77,19 @@ def monitor_schedule():
 
     while True:
         try:
-            # Hole Zeitstempel aus der Datenbank
-            last_run_value = db_manager.get_metadata("last_inventory_start")[0]
-            next_run_value = db_manager.get_metadata("next_inventory_run")[0]
-            service_active_value = db_manager.get_metadata("service_active")[0]
+            # Hole Zeitstempel aus der Datenbank (eine Abfrage, bereits als datetime)
+            metadata = db_manager.get_service_metadata()
+            next_run = metadata.next_inventory_run
 
-            logger.debug(f"DB values - last: {last_run_value}, next: {next_run_value}, active: {service_active_value}")
+            logger.debug(f"DB values - last: {metadata.last_inventory_start}, next: {next_run}, "
+                         f"active: {metadata.service_active}")
 
             # Prüfe ob Service aktiv ist
-            if service_active_value != "1":
+            if not metadata.service_active:
                 logger.debug("Service ist deaktiviert - überspringe Prüfung")
                 time.sleep(60)
                 continue
 
-            # Konvertiere zu datetime-Objekten
-            next_run = None
-            if next_run_value and next_run_value != "None":
-                try:
-                    next_run = datetime.strptime(str(next_run_value), "%Y-%m-%d %H:%M:%S")
-                except Exception as e:
-                    logger.error(f"Fehler beim Parsen von next_run: {str(e)}")
-
             # Prüfe ob Inventur benötigt wird
             try:
                 if next_run and datetime.now() >= next_run:
@@ -1,16 +1,189 @@
 import configparser
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
 
+from cryptography.fernet import Fernet
 
-def get_config():
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_FILE = os.path.join(CONFIG_DIR, "config.ini")
+DEFAULT_KEY_FILE = os.path.join(CONFIG_DIR, "secret.key")
+
+# Mindestabstand in Sekunden zwischen zwei mtime-Prüfungen der config.ini
+MTIME_CHECK_INTERVAL = 5
+
+_settings = None
+_settings_checked = 0.0
+_settings_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Immutable snapshot of ``config.ini`` with the already decrypted credentials.
+
+    Loaded once per process by ``get_settings()`` and shared by ``DatabaseManager``, ``SoftwareInventoryWinRM``,
+    the collectors and the scheduler. Options without a typed field are available through ``get()`` and friends,
+    which mirror the ``configparser`` API.
+    """
+    config_file: str
+    mtime: float
+    db_host: str
+    db_user: str
+    db_database: str
+    db_driver: str
+    prod_table: str
+    backup_table: str
+    ps_user: str
+    db_password: str = field(repr=False)
+    ps_password: str = field(repr=False)
+    sections: MappingProxyType = field(repr=False)
+
+    def get(self, section, option, fallback=None):
+        return self.sections.get(section, {}).get(option, fallback)
+
+    def getint(self, section, option, fallback=None):
+        value = self.get(section, option)
+        return fallback if value in (None, '') else int(value)
+
+    def getfloat(self, section, option, fallback=None):
+        value = self.get(section, option)
+        return fallback if value in (None, '') else float(value)
+
+    def getboolean(self, section, option, fallback=None):
+        value = self.get(section, option)
+        if value in (None, ''):
+            return fallback
+        if value.lower() not in configparser.ConfigParser.BOOLEAN_STATES:
+            raise ValueError(f"Not a boolean: {value}")
+        return configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+
+
+def decrypt_password(encrypted_password: str, key_path: str = None) -> str:
+    """
+    Uses the ``secret.key`` to decrypt the previously encrypted password.
+
+    ``key_path`` folder path where the secret.key is located
+
+    :param encrypted_password:
+    :param key_path:
+    :return: str
+    """
+    if not key_path:
+        key_path = DEFAULT_KEY_FILE
+    try:
+        with open(key_path, "rb") as key_file:
+            key = key_file.read()
+        fernet = Fernet(key)
+        return fernet.decrypt(encrypted_password.encode()).decode()
+    except Exception as e:
+        logging.error(f"Decryption failed: {str(e)}")
+        raise RuntimeError("Password decryption error")
+
+
+def load_settings(config_file=DEFAULT_CONFIG_FILE):
+    """
+    Reads ``config_file`` and decrypts the passwords. Use ``get_settings()`` to get the shared instance.
+
+    :param config_file:
+    :return: ``Settings``
+    """
     config = configparser.ConfigParser()
-    config.read('config\\config.ini')
+    read_files = config.read(config_file)
+    if not read_files:
+        raise FileNotFoundError(f"Config file not found: {config_file}")
+
+    if not config.has_section('db'):
+        raise Exception("Config file does not have [db] section")
+
+    encrypted_pwd_ps = config.get('ps-auth', 'pwd_ps', fallback='')
+    # Ohne Passwort z.B. mit engine = sqlite
+    encrypted_pwd_db = config.get('db', 'pass', fallback='')
+
+    return Settings(
+        config_file=config_file,
+        mtime=os.path.getmtime(config_file),
+        db_host=config.get('db', 'host', fallback='10.100.13.55'),
+        db_user=config.get('db', 'user', fallback='db-admin'),
+        db_database=config.get('db', 'database', fallback=''),
+        db_driver=config.get('db', 'driver', fallback=''),
+        prod_table=config.get('db', 'prod-table'),
+        backup_table=config.get('db', 'backup-table'),
+        ps_user=config.get('ps-auth', 'user_ps', fallback=''),
+        db_password=decrypt_password(encrypted_pwd_db) if encrypted_pwd_db else '',
+        ps_password=decrypt_password(encrypted_pwd_ps) if encrypted_pwd_ps else '',
+        sections=MappingProxyType({
+            section: MappingProxyType(dict(config.items(section, raw=True)))
+            for section in config.sections()
+        }),
+    )
+
+
+def get_settings(config_file=None):
+    """
+    Returns the process-wide ``Settings``.
+
+    The file is loaded on first use and again only if its mtime changed (checked at most every
+    ``MTIME_CHECK_INTERVAL`` seconds) or another ``config_file`` is requested.
+
+    :param config_file:
+    :return: ``Settings``
+    """
+    global _settings, _settings_checked
+    config_file = os.path.normpath(config_file or DEFAULT_CONFIG_FILE)
+
+    now = time.monotonic()
+    settings = _settings
+    if settings is not None and settings.config_file == config_file and now - _settings_checked < MTIME_CHECK_INTERVAL:
+        return settings
+
+    with _settings_lock:
+        settings = _settings
+        try:
+            changed = settings is None or settings.config_file != config_file \
+                      or os.path.getmtime(config_file) != settings.mtime
+        except OSError:
+            # Datei kurzzeitig nicht lesbar - bisherigen Stand weiterverwenden
+            changed = settings is None
+        if changed:
+            settings = load_settings(config_file)
+            _settings = settings
+        _settings_checked = now
+    return settings
+
+
+def reload_settings(config_file=None):
+    """
+    Forces a reload of the config file, e.g. after the credentials have been rotated.
+
+    :param config_file:
+    :return: ``Settings``
+    """
+    global _settings, _settings_checked
+    config_file = os.path.normpath(config_file or DEFAULT_CONFIG_FILE)
+    with _settings_lock:
+        _settings = load_settings(config_file)
+        _settings_checked = time.monotonic()
+    return _settings
+
+
+def get_config():
+    """
+    Database settings in the former ``get_config`` layout, served from ``get_settings()``
+
+    :return: ``dict`` with the key ``db_config``
+    """
+    settings = get_settings()
 
     return {
         'db_config': {
-            'hostname': config.get('database', 'hostname'),
-            'username': config.get('database', 'username'),
-            'password': config.get('database', 'password'),
-            'database': config.get('database', 'database'),
-            'table_name': config.get('database', 'table_name')
+            'hostname': settings.db_host,
+            'username': settings.db_user,
+            'password': settings.db_password,
+            'database': settings.db_database,
+            'table_name': settings.prod_table
         }
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import base64
+import logging
+import ssl
+import struct
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import escape
+
+import spnego
+
+import functions.DatabaseManager as dm
+from functions.HostStateCache import host_state
+from functions.SoftwareInventoryWinRM import select_script, handle_output
+
+NS_SOAP = "http://www.w3.org/2003/05/soap-envelope"
+NS_SHELL = "http://schemas.microsoft.com/wbem/wsman/1/windows/shell"
+
+ACTION_CREATE = "http://schemas.xmlsoap.org/ws/2004/09/transfer/Create"
+ACTION_DELETE = "http://schemas.xmlsoap.org/ws/2004/09/transfer/Delete"
+ACTION_COMMAND = "http://schemas.microsoft.com/wbem/wsman/1/windows/shell/Command"
+ACTION_RECEIVE = "http://schemas.microsoft.com/wbem/wsman/1/windows/shell/Receive"
+ACTION_SIGNAL = "http://schemas.microsoft.com/wbem/wsman/1/windows/shell/Signal"
+RESOURCE_CMD = "http://schemas.microsoft.com/wbem/wsman/1/windows/shell/cmd"
+SIGNAL_TERMINATE = "http://schemas.microsoft.com/wbem/wsman/1/windows/shell/signal/terminate"
+STATE_DONE = "http://schemas.microsoft.com/wbem/wsman/1/windows/shell/CommandState/Done"
+
+# WS-Man fault code if a Receive hits the OperationTimeout without output (not an error)
+WSMAN_TIMED_OUT = "2150858793"
+
+MIME_BOUNDARY = b"--Encrypted Boundary"
+ENCRYPTION_PROTOCOL = b"application/HTTP-SPNEGO-session-encrypted"
+
+ENVELOPE = """<env:Envelope xmlns:env="http://www.w3.org/2003/05/soap-envelope" \
+xmlns:a="http://schemas.xmlsoap.org/ws/2004/08/addressing" \
+xmlns:w="http://schemas.dmtf.org/wbem/wsman/1/wsman.xsd" \
+xmlns:p="http://schemas.microsoft.com/wbem/wsman/1/wsman.xsd" \
+xmlns:rsp="http://schemas.microsoft.com/wbem/wsman/1/windows/shell">\
+<env:Header>\
+<a:To>{endpoint}</a:To>\
+<a:ReplyTo><a:Address mustUnderstand="true">http://schemas.xmlsoap.org/ws/2004/08/addressing/role/anonymous</a:Address></a:ReplyTo>\
+<w:MaxEnvelopeSize mustUnderstand="true">153600</w:MaxEnvelopeSize>\
+<a:MessageID>uuid:{message_id}</a:MessageID>\
+<w:Locale mustUnderstand="false" xml:lang="en-US"/>\
+<p:DataLocale mustUnderstand="false" xml:lang="en-US"/>\
+<w:OperationTimeout>PT{operation_timeout}S</w:OperationTimeout>\
+<w:ResourceURI mustUnderstand="true">{resource_uri}</w:ResourceURI>\
+<a:Action mustUnderstand="true">{action}</a:Action>\
+{selectors}{options}\
+</env:Header>\
+<env:Body>{body}</env:Body>\
+</env:Envelope>"""
+
+
+class AsyncSoftwareInventoryWinRM:
+    """
+    asyncio based WinRM client for the software inventory.
+
+    Speaks WS-Man over a single keep-alive HTTP(S) connection without OS threads. Authentication is NTLM via
+    ``spnego``; on plain HTTP (5985) the messages are sealed with the NTLM session key like pywinrm does,
+    on HTTPS (5986) TLS protects the payload.
+    """
+
+    def __init__(self, host, user, pwd, scheme='http', port=None, verify_ssl=True,
+                 read_timeout_sec=15, operation_timeout_sec=10):
+        self.host = host
+        self.user = user
+        self.pwd = pwd
+        self.scheme = scheme
+        self.port = port or (5986 if scheme == 'https' else 5985)
+        self.verify_ssl = verify_ssl
+        self.read_timeout_sec = read_timeout_sec
+        self.operation_timeout_sec = operation_timeout_sec
+        self.endpoint = f"{scheme}://{host}:{self.port}/wsman"
+        self.encrypt = scheme != 'https'
+
+        self.log = dm.DatabaseManager()
+        self.get_logprint_info = self.log.get_logprint_info
+        self.get_logprint_error = self.log.get_logprint_error
+
+        self._reader = None
+        self._writer = None
+        self._context = None
+        # Dauer in Sekunden je Phase, für die Planung der nächsten Läufe
+        self.timings = {'connect': 0.0, 'script': 0.0}
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def connect(self):
+        """
+        Opens the TCP/TLS connection and runs the NTLM handshake on it.
+        The authentication is bound to the connection, so it has to be kept alive afterwards.
+        """
+        start = time.monotonic()
+        ssl_context = None
+        if self.scheme == 'https':
+            ssl_context = ssl.create_default_context()
+            if not self.verify_ssl:
+                ssl_context.check_hostname = False
+                ssl_context.verify_mode = ssl.CERT_NONE
+
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context),
+            timeout=self.read_timeout_sec)
+
+        self._context = spnego.client(self.user, self.pwd, hostname=self.host, service="HTTP", protocol="ntlm")
+        token = self._context.step()
+        status, headers, _ = await self._request(b"", {"Authorization": f"Negotiate {base64.b64encode(token).decode()}"})
+        challenge = _negotiate_token(headers)
+        if status != 401 or challenge is None:
+            raise ConnectionError(f"Unexpected authentication response from {self.host}: HTTP {status}")
+
+        token = self._context.step(challenge)
+        status, _, _ = await self._request(b"", {"Authorization": f"Negotiate {base64.b64encode(token).decode()}"})
+        if status == 401:
+            raise PermissionError("the specified credentials were rejected by the server")
+        self.timings['connect'] += time.monotonic() - start
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = self._context = None
+
+    async def run_ps(self, script):
+        """
+        Runs a PowerShell script in a new shell, like ``winrm.Session.run_ps``.
+
+        :param script:
+        :return: ``tuple`` (status_code, std_out, std_err)
+        """
+        start = time.monotonic()
+        try:
+            return await self._run_ps(script)
+        finally:
+            self.timings['script'] += time.monotonic() - start
+
+    async def _run_ps(self, script):
+        encoded_ps = base64.b64encode(script.encode('utf_16_le')).decode('ascii')
+        command = f"powershell -encodedcommand {encoded_ps}"
+
+        shell_body = ("<rsp:Shell><rsp:InputStreams>stdin</rsp:InputStreams>"
+                      "<rsp:OutputStreams>stdout stderr</rsp:OutputStreams></rsp:Shell>")
+        options = {"WINRS_NOPROFILE": "FALSE", "WINRS_CODEPAGE": "65001"}
+        root = await self._send(ACTION_CREATE, shell_body, options=options)
+        shell_id = root.find(f".//{{{NS_SHELL}}}ShellId").text
+
+        cancelled = False
+        try:
+            command_body = f"<rsp:CommandLine><rsp:Command>{escape(command)}</rsp:Command></rsp:CommandLine>"
+            options = {"WINRS_CONSOLEMODE_STDIN": "TRUE", "WINRS_SKIP_CMD_SHELL": "FALSE"}
+            root = await self._send(ACTION_COMMAND, command_body, shell_id=shell_id, options=options)
+            command_id = root.find(f".//{{{NS_SHELL}}}CommandId").text
+
+            std_out, std_err, status_code = [], [], None
+            receive_body = (f'<rsp:Receive><rsp:DesiredStream CommandId="{command_id}">stdout stderr'
+                            f'</rsp:DesiredStream></rsp:Receive>')
+            while status_code is None:
+                root = await self._send(ACTION_RECEIVE, receive_body, shell_id=shell_id,
+                                        options={"WSMAN_CMDSHELL_OPTION_KEEPALIVE": "TRUE"})
+                if root is None:
+                    # OperationTimeout ohne Ausgabe - erneut abfragen
+                    continue
+                for stream in root.iter(f"{{{NS_SHELL}}}Stream"):
+                    if stream.text:
+                        target = std_out if stream.get("Name") == "stdout" else std_err
+                        target.append(base64.b64decode(stream.text))
+                state = root.find(f".//{{{NS_SHELL}}}CommandState")
+                if state is not None and state.get("State") == STATE_DONE:
+                    exit_code = state.find(f"{{{NS_SHELL}}}ExitCode")
+                    status_code = int(exit_code.text) if exit_code is not None else 0
+
+            signal_body = (f'<rsp:Signal CommandId="{command_id}"><rsp:Code>{SIGNAL_TERMINATE}</rsp:Code>'
+                           f'</rsp:Signal>')
+            await self._send(ACTION_SIGNAL, signal_body, shell_id=shell_id)
+        except asyncio.CancelledError:
+            # Timeout des Hosts: die Verbindung steht mitten in einer Antwort, die Shell räumt der Server selbst ab
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                try:
+                    await self._send(ACTION_DELETE, "", shell_id=shell_id)
+                except Exception as e:
+                    # Nach einem Verbindungsfehler schlägt auch das fehl - der eigentliche Fehler soll ankommen
+                    logging.warning(f"Deleting WinRM shell {shell_id} on {self.host} failed: {e}")
+
+        return status_code, b"".join(std_out), b"".join(std_err)
+
+    async def get_installed_software(self):
+        """
+        Async counterpart of ``SoftwareInventoryWinRM.get_installed_software``.
+        Returns the decoded software list instead of writing it to a file.
+
+        :return: ``list``
+        """
+        script, payload_format = select_script(self.host)
+        try:
+            status_code, std_out, std_err = await self.run_ps(script)
+            if status_code != 0:
+                raise RuntimeError(f"Fehler beim Ausführen des Skripts: {std_err.decode(errors='ignore')}")
+            return handle_output(std_out.decode('utf-8'), self.host, self.log, payload_format)
+        except Exception:
+            if payload_format:
+                host_state.discard(self.host, "payload_format", "os")
+            raise
+
+    async def _send(self, action, body, shell_id=None, options=None):
+        """
+        Sends one WS-Man message and returns the parsed response envelope.
+        Returns ``None`` if the operation timed out on the server side without a result.
+        """
+        selectors = ""
+        if shell_id:
+            selectors = f'<w:SelectorSet><w:Selector Name="ShellId">{shell_id}</w:Selector></w:SelectorSet>'
+        option_set = ""
+        if options:
+            option_set = "<w:OptionSet>" + "".join(
+                f'<w:Option Name="{name}">{value}</w:Option>' for name, value in options.items()) + "</w:OptionSet>"
+
+        message = ENVELOPE.format(endpoint=self.endpoint, message_id=uuid.uuid4(),
+                                  operation_timeout=self.operation_timeout_sec, resource_uri=RESOURCE_CMD,
+                                  action=action, selectors=selectors, options=option_set, body=body).encode('utf-8')
+
+        if self.encrypt:
+            content_type = ('multipart/encrypted;protocol="application/HTTP-SPNEGO-session-encrypted";'
+                            'boundary="Encrypted Boundary"')
+            status, headers, response = await self._request(self._wrap(message), {"Content-Type": content_type})
+            if headers.get("content-type", [""])[0].startswith("multipart/encrypted"):
+                response = self._unwrap(response)
+        else:
+            status, headers, response = await self._request(message, {})
+
+        if status == 401:
+            raise PermissionError("the specified credentials were rejected by the server")
+        if status != 200:
+            if WSMAN_TIMED_OUT in response.decode('utf-8', errors='ignore'):
+                return None
+            raise RuntimeError(f"WS-Man request to {self.host} failed with HTTP {status}: {_fault_text(response)}")
+        return ElementTree.fromstring(response)
+
+    async def _request(self, body, headers):
+        request = [f"POST /wsman HTTP/1.1", f"Host: {self.host}:{self.port}",
+                   f"Content-Length: {len(body)}", "Connection: Keep-Alive",
+                   "User-Agent: Python WinRM client"]
+        if "Content-Type" not in headers:
+            headers["Content-Type"] = "application/soap+xml;charset=UTF-8"
+        request += [f"{key}: {value}" for key, value in headers.items()]
+        self._writer.write(("\r\n".join(request) + "\r\n\r\n").encode('latin-1') + body)
+        await self._writer.drain()
+        return await asyncio.wait_for(self._read_response(), timeout=self.read_timeout_sec)
+
+    async def _read_response(self):
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError(f"Connection closed by {self.host}")
+        status = int(status_line.split(b" ", 2)[1])
+
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode('latin-1').partition(":")
+            headers.setdefault(key.strip().lower(), []).append(value.strip())
+
+        if "chunked" in headers.get("transfer-encoding", [""])[0].lower():
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    while (await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+            body = b"".join(chunks)
+        else:
+            length = int(headers.get("content-length", ["0"])[0])
+            body = await self._reader.readexactly(length) if length else b""
+        return status, headers, body
+
+    def _wrap(self, message):
+        wrapped = self._context.wrap_winrm(message)
+        payload = struct.pack("<i", len(wrapped.header)) + wrapped.header + wrapped.data
+        return (MIME_BOUNDARY + b"\r\n"
+                + b"\tContent-Type: " + ENCRYPTION_PROTOCOL + b"\r\n"
+                + b"\tOriginalContent: type=application/soap+xml;charset=UTF-8;Length="
+                + str(len(message)).encode() + b"\r\n"
+                + MIME_BOUNDARY + b"\r\n"
+                + b"\tContent-Type: application/octet-stream\r\n"
+                + payload + MIME_BOUNDARY + b"--\r\n")
+
+    def _unwrap(self, response):
+        parts = [part for part in response.split(MIME_BOUNDARY + b"\r\n") if part]
+        message = b""
+        for i in range(0, len(parts) - 1, 2):
+            payload = parts[i + 1]
+            if payload.endswith(MIME_BOUNDARY + b"--\r\n"):
+                payload = payload[:-len(MIME_BOUNDARY + b"--\r\n")]
+            payload = payload.replace(b"\tContent-Type: application/octet-stream\r\n", b"")
+            header_length = struct.unpack("<i", payload[:4])[0]
+            header = payload[4:4 + header_length]
+            message += self._context.unwrap_winrm(header, payload[4 + header_length:])
+        return message
+
+
+def _negotiate_token(headers):
+    for value in headers.get("www-authenticate", []):
+        scheme, _, token = value.partition(" ")
+        if scheme.lower() in ("negotiate", "ntlm") and token:
+            return base64.b64decode(token)
+    return None
+
+
+def _fault_text(response):
+    try:
+        root = ElementTree.fromstring(response)
+        text = root.find(f".//{{{NS_SOAP}}}Text")
+        if text is not None and text.text:
+            return text.text.strip()
+    except ElementTree.ParseError:
+        pass
+    return response[:500].decode('utf-8', errors='ignore')
+
+
+async def collect_hosts(hostnames, user, pwd, on_result, concurrency=256, host_timeout=120, **client_options):
+    """
+    Collects the software inventory of ``hostnames`` concurrently with at most ``concurrency`` hosts in flight.
+
+    ``on_result(hostname, software_list, error, timings)`` is awaited once per host as soon as it is finished,
+    ``software_list`` is ``None`` if the host failed, ``timings`` holds the connect and script durations.
+
+    :param hostnames:
+    :param user:
+    :param pwd:
+    :param on_result:
+    :param concurrency:
+    :param host_timeout:
+    :param client_options: passed on to ``AsyncSoftwareInventoryWinRM``
+    :return:
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def inventory(client):
+        async with client:
+            return await client.get_installed_software()
+
+    async def collect(hostname):
+        async with semaphore:
+            client = AsyncSoftwareInventoryWinRM(hostname, user, pwd, **client_options)
+            try:
+                software_list = await asyncio.wait_for(inventory(client), timeout=host_timeout)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"Timeout after {host_timeout}s")
+                await on_result(hostname, None, e, client.timings)
+                return
+        await on_result(hostname, software_list, None, client.timings)
+
+    await asyncio.gather(*(collect(hostname) for hostname in hostnames))
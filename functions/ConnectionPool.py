@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_MIN_SIZE = 1
+DEFAULT_MAX_SIZE = 8
+DEFAULT_MAX_AGE = 1800
+DEFAULT_HEALTH_INTERVAL = 30
+DEFAULT_CHECKOUT_TIMEOUT = 30
+
+
+class PoolTimeout(TimeoutError):
+    pass
+
+
+class PooledConnection:
+    """
+    A database connection together with the times the pool needs to decide about health checks and recycling
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception as e:
+            logging.debug(f"Closing database connection failed: {e}")
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections created by ``connect``.
+
+    Between ``min_size`` and ``max_size`` connections are kept open. A connection is checked out exclusively with
+    ``connection()``; if all are in use the caller waits up to ``checkout_timeout`` seconds. Connections idle for
+    more than ``health_interval`` seconds are probed before they are handed out, connections older than ``max_age``
+    seconds are replaced. A connection that raised an error and cannot be rolled back is discarded.
+    """
+
+    def __init__(self, connect, min_size=DEFAULT_MIN_SIZE, max_size=DEFAULT_MAX_SIZE, max_age=DEFAULT_MAX_AGE,
+                 health_interval=DEFAULT_HEALTH_INTERVAL, checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.max_age = max_age
+        self.health_interval = health_interval
+        self.checkout_timeout = checkout_timeout
+        self._idle = []
+        self._count = 0
+        self._cond = threading.Condition()
+        self._stats = {'checkouts': 0, 'waits': 0, 'wait_time': 0.0, 'max_wait': 0.0, 'timeouts': 0,
+                       'created': 0, 'recycled': 0, 'discarded': 0}
+
+    def prefill(self):
+        """
+        Opens connections until ``min_size`` are available
+        """
+        while True:
+            with self._cond:
+                if self._count >= self.min_size:
+                    return
+                self._count += 1
+            pooled = self._open()
+            self._checkin(pooled)
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection, returns it to the pool afterwards.
+        Uncommitted work is rolled back on return, so a connection never carries an open transaction to the next user.
+
+        :return: ``pyodbc.Connection``
+        """
+        pooled = self._checkout()
+        try:
+            yield pooled.conn
+        except BaseException:
+            self._release(pooled)
+            raise
+        self._release(pooled)
+
+    def close_all(self):
+        """
+        Closes all idle connections, e.g. on shutdown
+
+        :return: ``int`` number of closed connections
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            pooled.close()
+        return len(idle)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            stats = dict(self._stats, open=self._count, idle=idle, in_use=self._count - idle,
+                         min_size=self.min_size, max_size=self.max_size)
+        stats['avg_wait'] = stats['wait_time'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    def _checkout(self):
+        """
+        Returns a healthy idle connection or opens a new one if the pool is not full yet
+        """
+        requested = time.monotonic()
+        waited = False
+        with self._cond:
+            while not self._idle and self._count >= self.max_size:
+                waited = True
+                remaining = self.checkout_timeout - (time.monotonic() - requested)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+                self._cond.wait(remaining)
+            if self._idle:
+                pooled = self._idle.pop()
+            else:
+                self._count += 1
+                pooled = None
+
+        if pooled is None:
+            pooled = self._open()
+        elif not self._usable(pooled):
+            # Slot der ersetzten Verbindung wird direkt weiterverwendet
+            pooled.close()
+            pooled = self._open()
+
+        wait_time = time.monotonic() - requested
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time'] += wait_time
+            self._stats['max_wait'] = max(self._stats['max_wait'], wait_time)
+            if waited:
+                self._stats['waits'] += 1
+        return pooled
+
+    def _usable(self, pooled):
+        now = time.monotonic()
+        if self.max_age and now - pooled.created > self.max_age:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+        if now - pooled.last_used <= self.health_interval:
+            return True
+        try:
+            cursor = pooled.conn.cursor()
+            cursor.execute("SELECT 1").fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logging.warning(f"Pooled database connection failed the health check, replacing it: {e}")
+            with self._cond:
+                self._stats['discarded'] += 1
+            return False
+
+    def _open(self):
+        try:
+            pooled = PooledConnection(self._connect())
+        except BaseException:
+            self._drop_slot()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return pooled
+
+    def _release(self, pooled):
+        try:
+            pooled.conn.rollback()
+        except Exception as e:
+            logging.warning(f"Rollback on returned database connection failed, discarding it: {e}")
+            pooled.close()
+            with self._cond:
+                self._stats['discarded'] += 1
+            self._drop_slot()
+            return
+        pooled.last_used = time.monotonic()
+        self._checkin(pooled)
+
+    def _checkin(self, pooled):
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def _drop_slot(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
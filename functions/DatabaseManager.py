@@ -1,40 +1,90 @@
 # -*- coding: utf-8 -*-
 
-import re
+import base64
+import binascii
+import hashlib
+import json
 import logging
 import os
 import threading
 
-import pyodbc
-import configparser
 from datetime import datetime
-from cryptography.fernet import Fernet
-
-db_lock = threading.Lock()
-
-
-def clean_names(item):
-    # Architektur in Klammern entfernen (z.B. (x64), (64-bit), (x86_64))
-    name = re.sub(r'\(\s*.*?(x64|x86|64-bit|32-bit|x86_64).*?\s*\)', '', item, flags=re.IGNORECASE)
-    # Architektur-Begriffe außerhalb von Klammern entfernen (inkl. Unterstrich)
-    name = re.sub(r'\b(x64|x86|64-bit|32-bit|x86_64)\b', '', name, flags=re.IGNORECASE)
-    # Versionen entfernen, z.B. "14.40.33816", "v11.10"
-    name = re.sub(r'\bv?\d+(\.\d+)*\b', '', name, flags=re.IGNORECASE)
-    # Leere Klammern entfernen
-    name = re.sub(r'\(\s*\)', '', name)
-    # Leerzeichen um Bindestriche bereinigen, Jahresbereiche wie 2015-2022 bleiben
-    name = re.sub(r'(?<=\D)\s*-\s*(?=\D)', '-', name)
-    # Leerzeichen und Bindestriche am Ende entfernen
-    name = re.sub(r'[\s\-]+$', '', name)
-    # Mehrere Leerzeichen auf eins reduzieren
-    name = re.sub(r'\s{2,}', ' ', name)
-    name = name.strip()
-    return name
+
+from config.config_manager import DEFAULT_CONFIG_FILE, decrypt_password, get_settings
+from functions.ConnectionPool import (ConnectionPool, DEFAULT_CHECKOUT_TIMEOUT, DEFAULT_HEALTH_INTERVAL,
+                                      DEFAULT_MAX_AGE, DEFAULT_MAX_SIZE, DEFAULT_MIN_SIZE)
+from functions.MetadataCache import DEFAULT_METADATA_TTL, MetadataCache
+from functions.StorageBackend import FILTER_COLUMNS, SORT_COLUMNS, create_backend, inventory_order
+from functions.startup_timing import timed
+# clean_names und normalise_software bleiben auch über dieses Modul importierbar
+from functions.software_normaliser import clean_names, normalise_software, normalise_software_list
+
+DEFAULT_BATCH_SIZE = 1000
+WRITE_MODES = ("append", "snapshot")
+SCHEMAS = ("flat", "normalised")
+# Anzahl Läufe, deren Historie beim Aufräumen erhalten bleibt (0 = alles behalten)
+DEFAULT_HISTORY_RETENTION = 26
+DEFAULT_PRUNE_BATCH_SIZE = 50000
+# Zeilen pro Seite der Inventar-API
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Zeilen pro fetchmany-Aufruf beim Export
+DEFAULT_EXPORT_CHUNK_SIZE = 5000
+
+
+def software_fingerprint(rows):
+    """
+    Stable SHA-256 over the normalised rows of one host, independent of their order
+
+    :param rows: result of ``normalise_software`` per entry
+    :return: ``str`` hex digest
+    """
+    canonical = json.dumps(sorted([str(value) for value in row] for row in rows), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def encode_page_cursor(sort, descending, values):
+    """
+    Opaque token for the position behind a row of the inventory API
+
+    :param sort:
+    :param descending:
+    :param values: values of the order columns of the row, dates become ISO strings
+    :return: ``str``
+    """
+    payload = json.dumps({'s': sort, 'd': descending, 'k': values}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_cursor(token, sort, descending):
+    """
+    Reverse of ``encode_page_cursor``, the token has to belong to the same order
+
+    :param token:
+    :param sort:
+    :param descending:
+    :return: ``list`` values of the order columns
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        values = payload['k']
+        valid = payload['s'] == sort and payload['d'] == descending
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid page cursor")
+    if not valid or not isinstance(values, list) or len(values) != len(inventory_order(sort)):
+        raise ValueError("Page cursor doesn't match the requested order")
+    return values
 
 
 class DatabaseManager:
     _instance = None
     _initialized = False
+    # Lazy start: configured on first use, schema checked on the first connection
+    _configured = False
+    _configuring = None
+    _ready = False
+    _preparing = False
+    _config_lock = threading.RLock()
 
     def __new__(cls, *args, **kwargs):
         """
@@ -48,48 +98,90 @@ class DatabaseManager:
             cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self, config_file = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "config", "config.ini")), transport='ntlm'):
+    def __init__(self, config_file = DEFAULT_CONFIG_FILE, transport='ntlm'):
         """
-        Initializes database connection only once
-
-        Needs the parameter ``config_file``
+        Only remembers the config file, creating the instance is free of side effects so that modules can hold
+        it at import time. Settings, backend, logger and pool are set up on first use (``_configure``), the
+        database is connected and its tables checked on the first connection (``_ensure_ready``).
 
         :param config_file:
         """
         if self._initialized:
             return
         self.config_file = config_file
-        config = configparser.ConfigParser()
-        read_files = config.read(self.config_file)
-        if not read_files:
-            raise FileNotFoundError(f"Config file not found: {self.config_file}")
-
-        if not config.has_section('db'):
-            raise Exception("Config file does not have [db] section")
-
-        self.pwd = config.get('db', 'pass')
-
-        self.host = config.get('db', 'host', fallback='10.100.13.55')
-        self.user = config.get('db', 'user', fallback='db-admin')
-        self.db = config.get('db', 'database')
-        self.driver = config.get('db', 'driver')
-
-        self.__passw = decrypt_password(self.pwd)
+        self.transport = transport
+        self._initialized = True
 
+    def __getattr__(self, name):
+        # Nur für noch nicht gesetzte Attribute: Einstellungen, Backend, Pool oder Logger werden gebraucht
+        if name.startswith('__') or self._configured or self._configuring == threading.get_ident():
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        self._configure()
+        return object.__getattribute__(self, name)
 
-        connection_str =(
-                f"DRIVER=" + "{" + f"{self.driver}" + "}" + f";"
-                                                            f"SERVER={self.host},1433;"
-                                                            f"DATABASE={self.db};"
-                                                            f"UID={self.user};"
-                                                            f"PWD={self.__passw};"
-                                                            f"TrustServerCertificate=yes;"
-                                                            f"Authentication=SqlPassword;"
-        )
-        self.connection_str = connection_str
+    def _configure(self):
+        """
+        Reads the settings and creates backend, logger, pool and metadata cache, without connecting.
+        Fails again on the next access if the configuration is broken.
+        """
+        with self._config_lock:
+            if self._configured:
+                return
+            self._configuring = threading.get_ident()
+            try:
+                with timed("Datenbank-Konfiguration"):
+                    self._configure_settings(get_settings(self.config_file))
+                self._configured = True
+            finally:
+                self._configuring = None
+
+    def _configure_settings(self, settings):
+        """
+        The former constructor: takes over the settings and builds backend, logger, pool and metadata cache
 
-        self.backup_table = config.get('db', 'backup-table')
-        self.table_name = config.get('db', 'prod-table')
+        :param settings: ``Settings``
+        """
+        self.host = settings.db_host
+        self.user = settings.db_user
+        self.driver = settings.db_driver
+
+        self.backup_table = settings.backup_table
+        self.table_name = settings.prod_table
+        # Zeilen pro executemany-Aufruf beim Einfügen der Software
+        self.batch_size = max(1, settings.getint('db', 'batch_size', fallback=DEFAULT_BATCH_SIZE))
+        # mssql: SQL Server über pyodbc, sqlite: lokale Datei (kleine Standorte, Tests und Benchmarks)
+        self.engine = settings.get('db', 'engine', fallback="mssql").strip().lower()
+        self.backend = create_backend(self.engine, settings, self.table_name, self.batch_size)
+        self.db = self.backend.describe()
+        # append: jeder Lauf hängt neue Zeilen an, snapshot: Software eines Hosts wird per MERGE ersetzt
+        self.write_mode = settings.get('db', 'write_mode', fallback="append").strip().lower()
+        if self.write_mode not in WRITE_MODES:
+            raise ValueError(f"Invalid write_mode '{self.write_mode}', expected one of {WRITE_MODES}")
+        self.staging_table = self.backend.staging_table
+        # Regeltabelle zur Vereinheitlichung der Hersteller, leer = config/publisher_rules.csv
+        self.publisher_rules = settings.get('db', 'publisher_rules', fallback='') or None
+        # flat: eine Tabelle pro Zeile, normalised: Host-, Hersteller- und Titel-Tabellen plus Installationen
+        self.schema = settings.get('db', 'schema', fallback="flat").strip().lower()
+        if self.schema not in SCHEMAS:
+            raise ValueError(f"Invalid schema '{self.schema}', expected one of {SCHEMAS}")
+        if self.schema not in self.backend.schemas:
+            raise ValueError(f"Schema '{self.schema}' is not supported by the {self.engine} engine")
+        self.schema_tables = self.backend.schema_tables
+        # Tabelle bzw. View, aus der die Web-Oberfläche die flachen Zeilen liest
+        if self.schema == "normalised":
+            self.inventory_source = self.schema_tables['view']
+        else:
+            self.inventory_source = self.table_name
+        # Historie: jede Software-Version eines Hosts mit dem Lauf, in dem sie auftauchte bzw. verschwand
+        self.history = settings.getboolean('db', 'history', fallback=True)
+        self.history_table = self.backend.history_table
+        self.history_retention = max(0, settings.getint('db', 'history_retention_runs',
+                                                        fallback=DEFAULT_HISTORY_RETENTION))
+        self.prune_batch_size = max(1, settings.getint('db', 'prune_batch_size', fallback=DEFAULT_PRUNE_BATCH_SIZE))
+        self.export_chunk_size = max(1, settings.getint('db', 'export_chunk_size',
+                                                        fallback=DEFAULT_EXPORT_CHUNK_SIZE))
+        # Laufende Inventur, wird von start_run gesetzt und von finish_run zurückgesetzt
+        self.current_run_id = None
 
         # Zeitstempel für Logs
         self.time_dmy = self.get_timestamp("dmy")
@@ -104,17 +196,22 @@ class DatabaseManager:
         self.debug = "[DEBUG]   |"
         self.warning = "[WARNING] |"
         self.error = "[ERROR]   |"
-        self.config_file = config_file
-        self.existing_config = os.path.exists(config_file)
-        self.conn = None
+        self.existing_config = os.path.exists(self.config_file)
 
         # Database-configuration
         self._load_config()
-        self._initialize_db_connection()
-        self._ensure_metadata_table()
-        self._initialized = True
+        # Verbindungs-Pool statt einer gemeinsamen Verbindung, Lesen und Schreiben laufen parallel
+        self.pool = ConnectionPool(
+            self._open_connection,
+            min_size=settings.getint('db', 'pool_min_size', fallback=DEFAULT_MIN_SIZE),
+            max_size=settings.getint('db', 'pool_max_size', fallback=DEFAULT_MAX_SIZE),
+            max_age=settings.getfloat('db', 'pool_max_age', fallback=DEFAULT_MAX_AGE),
+            health_interval=settings.getfloat('db', 'pool_health_interval', fallback=DEFAULT_HEALTH_INTERVAL),
+            checkout_timeout=settings.getfloat('db', 'pool_timeout', fallback=DEFAULT_CHECKOUT_TIMEOUT))
+        # service_metadata wird als ganze Zeile gelesen und kurz gecacht
+        self.metadata_cache = MetadataCache(
+            self._load_metadata_row, ttl=settings.getfloat('db', 'metadata_ttl', fallback=DEFAULT_METADATA_TTL))
         self.logger.info("DatabaseManager initialized")
-        print(f"{self.get_logprint_info()} Database connection established.")
 
     def _init_logger(self):
         self.log_file = os.path.join('../logs', f'{self.time_dmy}_{self.time_hms}-dbmanager.log')
@@ -153,8 +250,7 @@ class DatabaseManager:
 
     def _load_config(self):
         try:
-            config = configparser.ConfigParser()
-            config.read(self.config_file)
+            get_settings(self.config_file)
             self.logger.info("Configuration loaded successfully")
         except Exception as e:
             self.logger.error(f"Error loading configuration: {str(e)}")
@@ -162,42 +258,27 @@ class DatabaseManager:
 
     def _initialize_db_connection(self):
         """
-        Initializes the database connection.
-        Function reads the ``config_file`` and initializes the connection to the given database.
+        Initializes the database connection pool.
+        Opens ``pool_min_size`` connections so a wrong configuration is noticed on the first connection.
         """
-        available_drivers = ["ODBC Driver 17 for SQL Server", "ODBC Driver 18 for SQL Server"]
-
-
         try:
-            self.conn = pyodbc.connect(self.connection_str)
-            if self.conn:
-                try:
-                    # Prüfe ob Verbindung noch gültig
-                    self.conn.execute("SELECT 1")
-                    self.logger.info("Using existing database connection")
-                    return
-                except pyodbc.Error:
-                    self.logger.warning("Existing connection invalid, reconnecting...")
-                    self.conn = None
-
-            if not self.driver:
-                raise ValueError("Database driver not configured")
-
-            if self.driver not in available_drivers:
-                raise ValueError(
-                    f"Driver '{self.driver}' not installed. Available drivers: {available_drivers}")
-
-            self.conn = pyodbc.connect(self.connection_str)
-            self.conn.autocommit = False
-
-            self.logger.info("Database connection established successfully")
+            self.pool.prefill()
             print(f"{self.get_logprint_info()} Connected to database {self.db}")
         except Exception as e:
             self.logger.error(f"Connection failed: {str(e)}")
             print(f"{self.get_logprint_error()} Database connection failed: {str(e)}")
-            self.conn = None
             raise
 
+    def _open_connection(self):
+        """
+        Opens a new database connection for the pool
+
+        :return: DB-API connection of the backend
+        """
+        conn = self.backend.connect()
+        self.logger.info("Database connection established successfully")
+        return conn
+
     def _ensure_metadata_table(self):
         """
         Ensures that the table exists in the database
@@ -205,59 +286,55 @@ class DatabaseManager:
         :return:
         """
         try:
-            create_table_sql = """
-            IF NOT EXISTS (
-                SELECT * FROM INFORMATION_SCHEMA.TABLES 
-                WHERE TABLE_NAME = 'service_metadata'
-            )
-            BEGIN
-                CREATE TABLE service_metadata (
-                    service_active INT,
-                    last_inventory_start DATETIME,
-                    next_inventory_start DATETIME,
-                    interval_weeks INT,
-                    last_end_time DATETIME,
-                    identifier INT
-                );
-                
-                DECLARE @init_last_run DATETIME = NULL;
-                DECLARE @init_next_run DATETIME = DATEADD(WEEK, 2, GETDATE());
-        
-                INSERT INTO service_metadata (
-                    service_active, 
-                    last_inventory_start, 
-                    next_inventory_run, 
-                    interval_weeks,
-                    last_end_time,
-                    identifier
-                ) VALUES (
-                    0,
-                    @init_last_run,
-                    @init_next_run,
-                    2,
-                    NULL,
-                    NULL
-                );
-            END
-            """
-            with db_lock:
-                self.connect_db()
-                self.conn.execute(create_table_sql)
-                self.conn.commit()
+            with self.connection() as conn:
+                self.backend.create_metadata_table(conn.cursor())
+                conn.commit()
                 self.logger.info("Service metadata table verified")
         except Exception as e:
             self.logger.error(f"Error creating metadata table: {str(e)}")
             raise
 
-    def connect_db(self):
+    def connection(self):
         """
-        Stellt sicher, dass eine gültige DB-Verbindung besteht
+        Checks out a connection from the pool, to be used as context manager.
+        Uncommitted changes are rolled back when the block is left.
 
-        :return:
+        :return: ``contextmanager`` yielding a DB-API connection of the backend
         """
-        if self.conn is None:
-            self._initialize_db_connection()
-        return self.conn
+        self._ensure_ready()
+        return self.pool.connection()
+
+    def _ensure_ready(self):
+        """
+        Connects and creates the metadata table and the missing tables before the first connection is handed out.
+        A failed attempt (database not reachable) is repeated on the next call, the service starts without
+        database and picks it up once it is back.
+        """
+        if self._ready:
+            return
+        with self._config_lock:
+            # _preparing: Aufrufe von connection() aus der Tabellenprüfung selbst
+            if self._ready or self._preparing:
+                return
+            self._preparing = True
+            try:
+                with timed("Datenbank-Verbindung"):
+                    self._initialize_db_connection()
+                with timed("Datenbank-Schema"):
+                    self._ensure_metadata_table()
+                    self.ensure_tables_exist()
+                self._ready = True
+                print(f"{self.get_logprint_info()} Database connection established.")
+            finally:
+                self._preparing = False
+
+    def pool_stats(self):
+        """
+        Statistics of the connection pool (open, in use, waits and wait times) for sizing ``pool_max_size``
+
+        :return: ``dict``
+        """
+        return self.pool.stats()
 
     def dependencies_check(self):
         """
@@ -282,8 +359,10 @@ class DatabaseManager:
         :param exc_tb:
         :return:
         """
+        if not self._configured:
+            return
         try:
-            self.conn.close()
+            self.pool.close_all()
             self.logger.info(f"Connection to database {self.db} has been closed successfully.")
             print(f"{self.get_logprint_info()} Connection to database {self.db} has been closed successfully")
         except Exception as e:
@@ -300,265 +379,460 @@ class DatabaseManager:
         :return: Any
         """
         try:
-            with db_lock:
-                # productive table
-                self.conn.execute(queries(self.table_name))
-                self.logger.info(f"Checked/Created table {self.table_name}")
+            with self.connection() as conn:
+                self.backend.create_tables(conn.cursor(), self.schema)
+                conn.commit()
+                self.logger.info(f"Checked/Created tables of {self.table_name} ({self.engine}, {self.schema})")
 
-                self.conn.commit()
+            if self.schema == "normalised":
+                self.migrate_to_normalised()
 
-                # backup table TODO: implement it or abandon it? Or get a better solution. Create a backup SQL-file?
-                #                    Makes sense to me tho.
-                '''self.conn.execute(queries(self.backup_table))
-                self.logger.info(f"Checked/Created table {self.backup_table}")'''
+        except Exception as e:
+            self.logger.error(f"Table creation failed: {str(e)}")
+            raise
 
-                self.conn.commit()
+    def migrate_to_normalised(self, force=False):
+        """
+        Copies the flat prod table into the normalised tables, in one transaction.
 
+        Runs automatically on startup with ``schema = normalised`` as long as the installation table is still empty;
+        ``force`` adds missing rows to a filled one. The flat table is left as it is, switching back to
+        ``schema = flat`` is possible.
+
+        :param force:
+        :return: ``int`` number of migrated installations
+        """
+        try:
+            with self.connection() as conn:
+                migrated = self.backend.migrate_to_normalised(conn.cursor(), force)
+                if not migrated:
+                    return 0
+                conn.commit()
+                self.logger.info(f"Migrated {migrated} installations from {self.table_name} to the normalised schema")
+                print(f"{self.get_logprint_info()} Migrated {migrated} installations to the normalised schema")
+            self.refresh_inventory_summary()
+            return migrated
         except Exception as e:
-            self.logger.error(f"Table creation failed: {str(e)}")
+            self.logger.error(f"Migration to the normalised schema failed: {str(e)}")
             raise
 
+    def get_inventory_counts(self):
+        """
+        Numbers shown on the dashboard: hosts, distinct software names, installations and publishers.
+
+        Read from the one summary row of the current schema, which ``refresh_inventory_summary`` updates after
+        every run; the page view doesn't scan the inventory. Without a summary row it is computed once.
+
+        :return: ``dict`` with the keys hosts, software, software_all, publisher and updated_at
+        """
+        with self.connection() as conn:
+            counts = self.backend.read_summary(conn.cursor(), self.inventory_source)
+        if counts is None:
+            return self.refresh_inventory_summary()
+        return counts
+
+    def get_inventory_page(self, filters=None, sort="hostname", descending=False, cursor=None,
+                           limit=DEFAULT_PAGE_SIZE):
+        """
+        One page of the inventory for the web interface, filtered, sorted and paged by the database (keyset).
+        Only ``limit`` rows are read per call, however large the inventory is.
+
+        Rows are ordered by ``sort`` and then by hostname, name, publisher and version. In ``write_mode = append``
+        one host can hold the same version several times, such duplicates can fall on a page boundary and be
+        skipped.
+
+        :param filters: ``dict`` column -> text the column has to contain, columns hostname, name, publisher, version
+        :param sort: hostname, name, publisher, version or installDate
+        :param descending:
+        :param cursor: ``next_cursor`` of the previous page, ``None`` for the first page
+        :param limit: rows per page, at most ``MAX_PAGE_SIZE``
+        :return: ``dict`` with ``items`` and ``next_cursor`` (``None`` on the last page)
+        """
+        filters = self._check_inventory_args(filters, sort)
+        limit = min(max(1, limit), MAX_PAGE_SIZE)
+        after = decode_page_cursor(cursor, sort, descending) if cursor else None
+
+        with self.connection() as conn:
+            # Eine Zeile mehr lesen, um zu wissen, ob eine weitere Seite folgt
+            rows = self.backend.inventory_page(conn.cursor(), self.inventory_source, filters, sort, descending,
+                                               after, limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_page_cursor(sort, descending, [rows[-1][column] for column in inventory_order(sort)])
+        return {'items': rows, 'next_cursor': next_cursor}
+
+    def export_inventory(self, filters=None, sort="hostname", descending=False, run_id=None):
+        """
+        The whole (filtered) inventory for exports, read in chunks of ``export_chunk_size`` rows with
+        ``fetchmany`` so that only one chunk is held in memory.
+
+        The arguments are checked right away, the query runs when the returned generator is iterated. The
+        connection stays checked out until the generator is exhausted or closed.
+
+        :param filters: see ``get_inventory_page``
+        :param sort: see ``get_inventory_page``
+        :param descending:
+        :param run_id: optional, the state after this run from the history
+        :return: generator of ``list`` of row tuples with the columns ``INVENTORY_COLUMNS``
+        """
+        filters = self._check_inventory_args(filters, sort)
+        if run_id is not None:
+            with self.connection() as conn:
+                self._check_run(conn.cursor(), run_id)
+        query, params = self.backend.inventory_query(self.inventory_source, filters, sort, descending,
+                                                     run_id=run_id)
+        return self._fetch_chunks(query, params)
+
+    def _fetch_chunks(self, query, params):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(self.export_chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    @staticmethod
+    def _check_inventory_args(filters, sort):
+        """
+        Validates sort column and filters of the inventory API and export, column names end up in the sql text
+
+        :return: ``dict`` the non-empty filters
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort column '{sort}', expected one of {SORT_COLUMNS}")
+        filters = {column: value for column, value in (filters or {}).items() if value}
+        unknown = set(filters) - set(FILTER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Invalid filter columns {sorted(unknown)}, expected some of {FILTER_COLUMNS}")
+        return filters
+
+    def refresh_inventory_summary(self):
+        """
+        Counts the inventory once and stores the result in ``inventory_summary``
+
+        :return: ``dict``, see ``get_inventory_counts``
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            counts = self.backend.count_inventory(cursor, self.schema)
+            counts['updated_at'] = datetime.now()
+            self.backend.write_summary(cursor, self.inventory_source, counts)
+            conn.commit()
+        self.logger.info(f"Inventory summary of {self.inventory_source} refreshed: {counts}")
+        return counts
+
+    def get_service_metadata(self, max_age=None):
+        """
+        Returns the ``service_metadata`` row with typed fields, from the cache if it is younger than ``max_age``
+        (default ``[db] metadata_ttl``) seconds
+
+        :param max_age:
+        :return: ``ServiceMetadata``
+        """
+        return self.metadata_cache.get(max_age)
+
+    def _load_metadata_row(self):
+        with self.connection() as conn:
+            return self.backend.load_metadata_row(conn.cursor())
+
     def get_metadata(self, key):
         """
-        Holt einen Metadaten-Wert aus der Datenbank
+        Holt einen Metadaten-Wert aus der (gecachten) service_metadata-Zeile
 
         :param key:
         :return:
         """
         try:
-            self.connect_db()
-            cursor = self.conn.cursor()
-            cursor.execute(f"SELECT {key} FROM service_metadata")
-            row = cursor.fetchone()
-            if row:
-                return row[0]
+            return self.get_service_metadata().raw.get(key)
         except Exception as e:
             self.logger.error(f"Error getting metadata for key '{key}': {str(e)}")
             return None
 
     def set_metadata(self, key, value):
-        """Setzt einen Metadaten-Wert in der Datenbank"""
+        """Setzt einen Metadaten-Wert in der Datenbank, der Cache wird danach verworfen"""
         try:
-            # DEBUG: Aktuellen Wert ausgeben
+            # Aktueller Wert aus dem Cache, kein zusätzlicher SELECT
             current_value = self.get_metadata(key)
-            print(f"DEBUG: Setting metadata - Key: {key}, Value: {value}, Current: {current_value}")
+            self.logger.debug(f"Setting metadata - Key: {key}, Value: {value}, Current: {current_value}")
 
             # Korrekte SQL-Syntax - Spaltenname muss direkt im String sein
-            if current_value is not None:
-                # Für Integer-Werte
-                if isinstance(value, int):
-                    self.conn.execute(f"UPDATE service_metadata SET {key} = ? WHERE identifier = 1", value)
-                # Für String/Datetime-Werte
+            with self.connection() as conn:
+                if current_value is not None:
+                    self.backend.update_metadata(conn.cursor(), key, value)
+                    conn.commit()
+                    self.logger.debug(f"UPDATE executed for {key} = {value}")
                 else:
-                    self.conn.execute(f"UPDATE service_metadata SET {key} = ? WHERE identifier = 1", value)
-                self.conn.commit()
-                print(f"DEBUG: UPDATE executed for {key} = {value}")
-            else:
-                # Fallback: INSERT (sollte normalerweise nicht vorkommen)
-                self.conn.execute(f"INSERT INTO service_metadata ({key}, identifier) VALUES (?, 1)", value)
-                self.conn.commit()
-                print(f"DEBUG: INSERT executed for {key} = {value}")
+                    # Fallback: INSERT (sollte normalerweise nicht vorkommen)
+                    self.backend.insert_metadata(conn.cursor(), key, value)
+                    conn.commit()
+                    self.logger.debug(f"INSERT executed for {key} = {value}")
 
             self.logger.info(f"Metadata updated: {key} = {value}")
-            print(f"Metadata successfully updated: {key} = {value}")
             return True
         except Exception as e:
             self.logger.error(f"Error setting metadata for key '{key}': {str(e)}")
-            print(f"ERROR setting metadata: {str(e)}")
             return False
+        finally:
+            self.metadata_cache.invalidate()
 
     def set_starttime(self):
-        cursor = self.conn.cursor()
         x = datetime.now()
-        cursor.execute("UPDATE service_metadata SET last_inventory_start = ? WHERE identifier = 1", x)
-        cursor.commit()
+        try:
+            with self.connection() as conn:
+                self.backend.update_metadata(conn.cursor(), "last_inventory_start", x)
+                conn.commit()
+        finally:
+            self.metadata_cache.invalidate()
         return print(f"Metadata has been updated to: {x}")
 
     def set_nexttime(self, value):
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE service_metadata SET next_inventory_run = ? WHERE identifier = 1", value)
-        cursor.commit()
+        try:
+            with self.connection() as conn:
+                self.backend.update_metadata(conn.cursor(), "next_inventory_run", value)
+                conn.commit()
+        finally:
+            self.metadata_cache.invalidate()
         return print(f"Metadata 'next_inventory_run' has been updated to: {value}")
 
-    def insert_software(self, software_list, hostname):
+    def insert_software(self, software_list, hostname, force=False):
         """
         Insert the values from the gathered JSON file into the database
 
-        ``query`` is declared as a local variable. It's not dynamic at this point, but it will be in the future
-        :var self.query:
+        The rows are sent with ``executemany`` (SQL Server: ``fast_executemany``) in batches of ``batch_size``
+        (``[db] batch_size``).\n
+        If the fingerprint of the normalised list equals the stored one of the host, nothing is inserted and only
+        ``last_seen`` is updated. ``force`` inserts anyway.\n
+        With ``write_mode = snapshot`` the rows of the host are replaced instead of appended, see
+        ``StorageBackend.write_snapshot``.
+
         :param software_list:
         :param hostname:
-        :return:
+        :param force:
+        :return: ``int`` number of inserted (append) or changed (snapshot) rows
         """
+        rows = normalise_software_list(software_list, self.publisher_rules)
 
         try:
-            with db_lock:  # Thread-security
-                # Need to reconnect?
-                self.connect_db()
+            # Eigene Verbindung aus dem Pool, Hosts werden parallel geschrieben
+            with self.connection() as conn:
                 # Ensure that tables exist
                 # self.ensure_tables_exist()
 
-                query = f"""
-                        INSERT INTO [{self.table_name}] (name, publisher, installDate, programSize, version, hostname, isNew)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """
-
-                insert_count = 0
-
-                for item in software_list:
-                    name = item.get('Name') or 'Unknown'
-                    publisher = item.get('Publisher') or ''
-                    install_date_str = item.get('InstallDate')
-                    size = item.get('Size') or 0
-                    version = item.get('Version') or '0.0.0'
-                    # process installDate
-                    install_date = None
-                    if install_date_str := item.get('InstallDate'):
-                        try:
-                            # support different time formats
-                            for fmt in ("%Y%m%d", "%Y-%m-%d", "%d.%m.%Y"):
-                                try:
-                                    install_date = datetime.strptime(install_date_str, fmt).date()
-                                    break
-                                except ValueError:
-                                    continue
-                        except Exception:
-                            install_date = None
-
-                    # unification same publisher with different spelling
-                    publisher = str(item.get('Publisher', ''))
-                    if "Interflex" in publisher:
-                        publisher = "Interflex Datensysteme GmbH & Co. KG"
-                    if "Microsoft" in publisher:
-                        publisher = "Microsoft Corporation"
-
-
-                    name = clean_names(item.get('Name'))
-
-                    # insert data
-                    self.conn.execute(query, (
-                        name,
-                        publisher[:90],  # Auf maximale Länge kürzen
-                        install_date,
-                        size,
-                        version[:50],
-                        hostname,
-                        True  # isNew = True
-                    ))
-                    insert_count += 1
-
-                self.conn.commit()
-                self.logger.info(f"Inserted {insert_count} records for {hostname}")
-                print(f"{self.get_logprint_info()} Inserted {insert_count} items for {hostname}")
+                insert_count = self._write_host(conn.cursor(), rows, hostname, force)
+                conn.commit()
+                return insert_count
 
         except Exception as e:
+            # Rollback erfolgt bei der Rückgabe der Verbindung an den Pool
             self.logger.error(f"Insert failed for {hostname}: {str(e)}")
-            if self.conn:
-                self.conn.rollback()
             raise
 
-    '''def backup_database_table(self):
+    def insert_many(self, results, force=False):
         """
+        Writes the software lists of several hosts in one transaction (group commit).
 
-        :return:
+        If the transaction fails, every host is written again in its own transaction, so one broken host
+        doesn't cost the others their data.
+
+        :param results: ``list`` of (hostname, software_list)
+        :param force:
+        :return: ``dict`` hostname -> number of written rows or the ``Exception`` of that host
         """
         try:
-            with db_lock:
-                self.ensure_tables_exist()
+            normalised = [(hostname, normalise_software_list(software_list, self.publisher_rules))
+                          for hostname, software_list in results]
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                counts = {hostname: self._write_host(cursor, rows, hostname, force) for hostname, rows in normalised}
+                conn.commit()
+                return counts
+        except Exception as e:
+            if len(results) == 1:
+                hostname = results[0][0]
+                self.logger.error(f"Insert failed for {hostname}: {str(e)}")
+                return {hostname: e}
+            self.logger.warning(f"Group commit of {len(results)} hosts failed, writing them one by one: {str(e)}")
+
+        counts = {}
+        for hostname, software_list in results:
+            try:
+                counts[hostname] = self.insert_software(software_list, hostname, force)
+            except Exception as e:
+                counts[hostname] = e
+        return counts
+
+    def _write_host(self, cursor, rows, hostname, force):
+        """
+        Writes the normalised ``rows`` of ``hostname`` and its fingerprint inside the caller's transaction
 
-                copy_query = f"""
-                        INSERT INTO {self.backup_table} (name, publisher, installDate, programSize, version, hostname, isNew)
-                        SELECT name, publisher, installDate, programSize, version, hostname, isNew
-                        FROM {self.table_name}
-                        """
+        :return: ``int`` number of written rows, 0 if the software is unchanged
+        """
+        backend = self.backend
+        fingerprint = software_fingerprint(rows)
+        now = datetime.now()
+        stored = backend.read_fingerprint(cursor, hostname)
+
+        run_id = self.current_run_id if self.history else None
+        if stored == fingerprint and not force:
+            backend.touch_fingerprint(cursor, hostname, now)
+            # Host ohne Historie (z.B. Historie gerade eingeschaltet): nur die Historie anlegen
+            if run_id is not None and not backend.has_open_history(cursor, hostname):
+                backend.load_staging(cursor, rows, hostname)
+                self._write_history(cursor, hostname, run_id)
+                backend.clear_staging(cursor, hostname)
+            self.logger.info(f"Software of {hostname} unchanged, skipped insert")
+            print(f"{self.get_logprint_info()} Software of {hostname} unchanged, only last_seen updated")
+            return 0
+
+        # Staging wird einmal geladen und von Historie und Snapshot gemeinsam genutzt
+        staged = run_id is not None or self.schema == "normalised" or self.write_mode == "snapshot"
+        if staged:
+            backend.load_staging(cursor, rows, hostname)
+        if run_id is not None:
+            self._write_history(cursor, hostname, run_id)
+
+        if self.schema == "normalised" or self.write_mode == "snapshot":
+            if self.schema == "normalised":
+                inserted, updated, deleted = backend.write_normalised(cursor, hostname)
+            else:
+                inserted, updated, deleted = backend.write_snapshot(cursor, hostname)
+            self.logger.info(f"Snapshot of {hostname}: {inserted} inserted, {updated} updated, {deleted} deleted")
+            insert_count = inserted + updated + deleted
+        else:
+            insert_count = backend.insert_rows(cursor, self.table_name, rows, hostname)
+        if staged:
+            backend.clear_staging(cursor, hostname)
 
-                self.conn.execute(copy_query)
-                self.conn.commit()
+        backend.store_fingerprint(cursor, hostname, fingerprint, now, exists=stored is not None)
 
-                self.logger.info(f"Backup created in {self.backup_table}")
-                print(f"{self.get_logprint_info()} Backup created successfully")
+        mode = "normalised" if self.schema == "normalised" else self.write_mode
+        self.logger.info(f"Wrote {insert_count} records for {hostname} ({mode})")
+        print(f"{self.get_logprint_info()} Wrote {insert_count} items for {hostname} ({mode})")
+        return insert_count
 
-        except Exception as e:
-            self.logger.error(f"Backup failed: {str(e)}")
-            if self.conn:
-                self.conn.rollback()
-            raise'''
+    def _write_history(self, cursor, hostname, run_id):
+        """
+        Tags the change of the staged software of ``hostname`` with ``run_id`` in the history table.
+
+        Open entries (``valid_to_run IS NULL``) that vanished from the host or whose publisher, install date or size
+        changed are closed with ``run_id``, staged software without an open entry is added with
+        ``valid_from_run = run_id``. Unchanged software is not touched, so the history only grows with the changes.
+        """
+        added, closed = self.backend.write_history(cursor, hostname, run_id)
+        self.logger.info(f"History of {hostname} in run {run_id}: {added} added, {closed} closed")
+
+    def start_run(self):
+        """
+        Registers a new inventory run, its id tags the history written until ``finish_run``.
+        Runs still marked as running from a crashed process are set to ``aborted``.
 
-    '''def reset_data_table(self):
+        :return: ``int`` run id
         """
+        with self.connection() as conn:
+            run_id = self.backend.start_run(conn.cursor(), datetime.now())
+            conn.commit()
+        self.current_run_id = run_id
+        self.logger.info(f"Inventory run {run_id} started")
+        print(f"{self.get_logprint_info()} Inventory run {run_id} started")
+        return run_id
+
+    def finish_run(self, run_id, status="finished", hosts=None):
+        """
+        Closes the run and prunes the history beyond ``[db] history_retention_runs``
 
+        :param run_id:
+        :param status: ``finished`` or ``failed``
+        :param hosts: number of processed hosts
         :return:
         """
+        if self.current_run_id == run_id:
+            self.current_run_id = None
+        with self.connection() as conn:
+            self.backend.finish_run(conn.cursor(), run_id, datetime.now(), status, hosts)
+            conn.commit()
+        self.logger.info(f"Inventory run {run_id} {status}, {hosts} hosts")
+        print(f"{self.get_logprint_info()} Inventory run {run_id} {status}")
+
+        # Dashboard-Zahlen einmal pro Lauf statt bei jedem Seitenaufruf zählen
         try:
-            with db_lock:
-                self.connect_db()
+            self.refresh_inventory_summary()
+        except Exception as e:
+            self.logger.error(f"Refreshing the inventory summary failed: {str(e)}")
 
-                update_query = f"UPDATE {self.table_name} SET isNew = 1;"
+        if self.history_retention:
+            try:
+                self.prune_history()
+            except Exception as e:
+                self.logger.error(f"Pruning the history failed: {str(e)}")
 
-                self.conn.execute(update_query)
-                self.conn.commit()
+    def get_runs(self, limit=50):
+        """
+        The latest inventory runs, newest first
 
-                self.logger.info("Reset isNew flags")
-                print(f"{self.get_logprint_info()} Reset completed")
+        :param limit:
+        :return: ``list`` of ``dict`` (run_id, started_at, finished_at, status, hosts)
+        """
+        with self.connection() as conn:
+            return self.backend.get_runs(conn.cursor(), limit)
 
-        except Exception as e:
-            self.logger.error(f"Reset failed: {str(e)}")
-            if self.conn:
-                self.conn.rollback()
-            raise'''
+    def get_software_at_run(self, run_id, hostname=None):
+        """
+        The software as it was after ``run_id``; hosts not reached in that run keep their last known state
+
+        :param run_id:
+        :param hostname: optional, only this host
+        :return: ``list`` of ``dict`` with the columns of the prod table without ``isNew``
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self._check_run(cursor, run_id)
+            return self.backend.get_software_at_run(cursor, run_id, hostname)
 
+    def diff_runs(self, from_run, to_run, hostname=None):
+        """
+        Software added and removed between the state after ``from_run`` and after ``to_run``.
+        A changed publisher, install date or size shows up as removed and added.
 
-def queries(table):
-    """
-    Generates sql-query. Creates a new table if the given name is not existing
+        :param from_run:
+        :param to_run:
+        :param hostname: optional, only this host
+        :return: ``dict`` with the lists ``added`` and ``removed``
+        """
+        if from_run > to_run:
+            raise ValueError(f"from_run {from_run} is newer than to_run {to_run}")
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self._check_run(cursor, from_run)
+            self._check_run(cursor, to_run)
+            return self.backend.diff_runs(cursor, from_run, to_run, hostname)
+
+    def prune_history(self, keep_runs=None):
+        """
+        Deletes the history only visible in runs older than the newest ``keep_runs`` (default
+        ``[db] history_retention_runs``) runs, together with those runs.
 
-    :param table:
-    :return: ``str``
-    """
-    # Ensure that the table name is valid
-    if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', table):
-        raise ValueError(f"Invalid table name: {table}")
-
-    query = f"""
-    IF NOT EXISTS (
-        SELECT * FROM INFORMATION_SCHEMA.TABLES
-        WHERE TABLE_NAME = '{table}' AND TABLE_SCHEMA = 'dbo'
-    )
-    BEGIN
-        CREATE TABLE dbo.{table} (
-            name VARCHAR(90),
-            publisher VARCHAR(90),
-            installDate DATE,
-            programSize INT,
-            version NVARCHAR(50),
-            hostname VARCHAR(80),
-            isNew BIT NOT NULL
-        );
-    END
-    """
-    return query
+        The history table is indexed (on SQL Server clustered) on ``valid_to_run``, so the deleted entries form one
+        contiguous range that is removed in chunks of ``[db] prune_batch_size`` rows, each in its own transaction.
 
-def decrypt_password(encrypted_password: str, key_path: str = None) -> str:
-    """
-    Uses the ``secret.key`` to decrypt the previously encrypted password.
+        :param keep_runs:
+        :return: ``int`` number of deleted history entries
+        """
+        keep_runs = self.history_retention if keep_runs is None else keep_runs
+        if keep_runs <= 0:
+            return 0
 
-    ``key_path`` folder path where the secret.key is located
+        with self.connection() as conn:
+            deleted, runs, oldest_kept = self.backend.prune_history(conn, keep_runs, self.prune_batch_size)
+
+        if deleted or runs > 0:
+            self.logger.info(f"Pruned {deleted} history entries and {runs} runs older than run {oldest_kept}")
+            print(f"{self.get_logprint_info()} Pruned {deleted} history entries of {runs} old runs")
+        return deleted
+
+    def _check_run(self, cursor, run_id):
+        if not self.backend.run_exists(cursor, run_id):
+            raise ValueError(f"Unknown or pruned inventory run {run_id}")
 
-    :param encrypted_password:
-    :param key_path:
-    :return: str
-    """
-    if not key_path:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        key_dir = os.path.join(current_dir, "..", "config", "secret.key")
-        key_path = os.path.normpath(key_dir)
-    try:
-        with open(key_path, "rb") as key_file:
-            key = key_file.read()
-        fernet = Fernet(key)
-        return fernet.decrypt(encrypted_password.encode()).decode()
-    except Exception as e:
-        logging.error(f"Decryption failed: {str(e)}")
-        raise RuntimeError("Password decryption error")
-
-DatabaseManager.ensure_tables_exist(DatabaseManager())
\ No newline at end of file
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_BATCH_HOSTS = 20
+DEFAULT_MAX_DELAY = 2.0
+DEFAULT_QUEUE_SIZE = 64
+
+
+class DatabaseWriter:
+    """
+    Single writer stage between the collectors and ``DatabaseManager``.
+
+    Collectors hand their parsed software lists to ``submit`` and continue with the next host. A background thread
+    groups the queued hosts and writes them with ``insert_many`` in one transaction: a batch is committed as soon as
+    ``batch_hosts`` hosts are queued or ``max_delay`` seconds after its first host. The queue holds at most
+    ``queue_size`` hosts; if the database falls behind, ``submit`` blocks until there is room again (backpressure).
+    """
+
+    def __init__(self, db_inst, batch_hosts=DEFAULT_BATCH_HOSTS, max_delay=DEFAULT_MAX_DELAY,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.db_inst = db_inst
+        self.batch_hosts = max(1, batch_hosts)
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._stats_lock = threading.Lock()
+        self._stats = {'batches': 0, 'hosts': 0, 'rows': 0, 'failed': 0, 'dropped': 0, 'batch_time': 0.0,
+                       'max_batch_time': 0.0, 'backpressure_waits': 0, 'backpressure_time': 0.0}
+        self._thread = threading.Thread(target=self._write_loop, name="inventory_db_writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, hostname, software_list, cancelled=None):
+        """
+        Queues the software list of ``hostname`` for writing. Blocks while the queue is full.
+
+        :param hostname:
+        :param software_list:
+        :param cancelled: optional ``threading.Event``, if it is set before the batch is written the host is dropped
+                          and the future cancelled (e.g. the host was reported as timed out meanwhile)
+        :return: ``Future`` resolving to the number of written rows
+        """
+        future = Future()
+        item = (hostname, software_list, future, cancelled)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            start = time.monotonic()
+            self._queue.put(item)
+            with self._stats_lock:
+                self._stats['backpressure_waits'] += 1
+                self._stats['backpressure_time'] += time.monotonic() - start
+        return future
+
+    def close(self):
+        """
+        Writes all queued hosts and stops the writer thread
+
+        :return: ``dict`` statistics, see ``stats``
+        """
+        self._queue.put(None)
+        self._thread.join()
+        return self.stats()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['avg_batch_time'] = stats['batch_time'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _next_batch(self):
+        """
+        Waits for the first host, then collects more until ``batch_hosts`` or ``max_delay`` is reached
+
+        :return: ``tuple`` (list of queued items, ``bool`` stop after this batch)
+        """
+        item = self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_hosts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                # Der Writer-Thread darf nicht sterben, sonst blockieren submit() und close() für immer
+                self._fail_batch(batch, e)
+
+    def _write_batch(self, batch):
+        db_inst = self.db_inst
+        dropped = [item for item in batch if item[3] is not None and item[3].is_set()]
+        if dropped:
+            for hostname, _, future, _ in dropped:
+                db_inst.logger.warning(f"Dropping queued write of {hostname}, its deadline has passed")
+                future.cancel()
+            batch = [item for item in batch if item not in dropped]
+            with self._stats_lock:
+                self._stats['dropped'] += len(dropped)
+            if not batch:
+                return
+
+        start = time.monotonic()
+        try:
+            results = db_inst.insert_many([(hostname, software_list) for hostname, software_list, _, _ in batch])
+        except Exception as e:
+            results = {hostname: e for hostname, _, _, _ in batch}
+        elapsed = time.monotonic() - start
+
+        rows = failed = 0
+        for hostname, _, future, _ in batch:
+            result = results.get(hostname)
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"{db_inst.get_logprint_error()} Error inserting data into database for {hostname}: {result}")
+                future.set_exception(result)
+            else:
+                rows += result or 0
+                print(f"{db_inst.get_logprint_info()} Data of {hostname} successfully inserted into database.")
+                future.set_result(result)
+
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['hosts'] += len(batch)
+            self._stats['rows'] += rows
+            self._stats['failed'] += failed
+            self._stats['batch_time'] += elapsed
+            self._stats['max_batch_time'] = max(self._stats['max_batch_time'], elapsed)
+        db_inst.logger.info(f"Committed batch of {len(batch)} hosts ({rows} rows, {failed} failed) "
+                            f"in {elapsed:.3f}s, {self._queue.qsize()} hosts queued")
+
+    def _fail_batch(self, batch, error):
+        """
+        Fails the still open futures of ``batch`` with ``error`` after an unexpected error in ``_write_batch``
+
+        :param batch:
+        :param error:
+        :return:
+        """
+        failed = 0
+        for _, _, future, _ in batch:
+            if future.done():
+                continue
+            try:
+                future.set_exception(error)
+                failed += 1
+            except Exception:
+                # Future wurde inzwischen abgebrochen
+                pass
+        with self._stats_lock:
+            self._stats['hosts'] += failed
+            self._stats['failed'] += failed
+        try:
+            self.db_inst.logger.error(f"Writer batch of {len(batch)} hosts failed: {error}")
+        except Exception:
+            pass
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import threading
+
+DEFAULT_STATE_FILE = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cache", "host_state.json"))
+
+
+class HostStateCache:
+    """
+    Small persisted key/value store with one entry per host, kept between inventory runs.
+
+    Holds what the collectors learned about a host (e.g. its ``payload_format``) so later runs can skip the
+    detection. Reads and updates are in memory and thread-safe, ``save()`` writes the file atomically.
+    """
+
+    def __init__(self, state_file=DEFAULT_STATE_FILE):
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Loads the state file. A missing or broken file starts with an empty cache.
+        """
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                hosts = json.load(f)
+        except FileNotFoundError:
+            hosts = {}
+        except Exception as e:
+            logging.warning(f"Host state cache {self.state_file} unreadable, starting empty: {e}")
+            hosts = {}
+        with self._lock:
+            self._hosts = hosts if isinstance(hosts, dict) else {}
+            self._dirty = False
+
+    def get(self, hostname):
+        """
+        Returns a copy of the cached entry of ``hostname`` (empty ``dict`` if unknown)
+
+        :param hostname:
+        :return: ``dict``
+        """
+        with self._lock:
+            return dict(self._hosts.get(hostname.lower(), {}))
+
+    def update(self, hostname, **fields):
+        with self._lock:
+            self._hosts.setdefault(hostname.lower(), {}).update(fields)
+            self._dirty = True
+
+    def discard(self, hostname, *fields):
+        """
+        Removes ``fields`` of a host, or the whole entry if no fields are given
+        """
+        with self._lock:
+            entry = self._hosts.get(hostname.lower())
+            if entry is None:
+                return
+            if fields:
+                for name in fields:
+                    entry.pop(name, None)
+            else:
+                del self._hosts[hostname.lower()]
+            self._dirty = True
+
+    def save(self):
+        """
+        Writes the cache to ``state_file`` if anything changed since the last load/save
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._hosts, indent=2, ensure_ascii=False, default=str)
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_file, self.state_file)
+
+
+# Gemeinsame Instanz für alle Collector
+host_state = HostStateCache()
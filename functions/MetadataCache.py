@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+
+DEFAULT_METADATA_TTL = 10.0
+DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S")
+
+
+def _to_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(str(value), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _to_int(value, default=None):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass(frozen=True)
+class ServiceMetadata:
+    """
+    Typed snapshot of the single ``service_metadata`` row. ``raw`` holds the column values as read from the database.
+    """
+    service_active: bool = False
+    last_inventory_start: datetime = None
+    next_inventory_run: datetime = None
+    interval_weeks: int = None
+    last_end_time: datetime = None
+    raw: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        :param row: ``dict`` column -> value, ``None`` if the table is empty
+        :return: ``ServiceMetadata``
+        """
+        row = dict(row or {})
+        return cls(
+            service_active=_to_int(row.get('service_active'), 0) == 1,
+            last_inventory_start=_to_datetime(row.get('last_inventory_start')),
+            next_inventory_run=_to_datetime(row.get('next_inventory_run')),
+            interval_weeks=_to_int(row.get('interval_weeks')),
+            last_end_time=_to_datetime(row.get('last_end_time')),
+            raw=MappingProxyType(row),
+        )
+
+
+class MetadataCache:
+    """
+    Caches the ``service_metadata`` row for ``ttl`` seconds.
+
+    ``load`` reads the whole row in one query. Writers go straight to the database and call ``invalidate``
+    afterwards, so the next read sees the new values.
+    """
+
+    def __init__(self, load, ttl=DEFAULT_METADATA_TTL):
+        self._load = load
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._metadata = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def get(self, max_age=None):
+        """
+        Returns the cached metadata, reloads it if it is older than ``max_age`` (default ``ttl``) seconds
+
+        :param max_age:
+        :return: ``ServiceMetadata``
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            if self._metadata is not None and time.monotonic() - self._loaded_at <= max_age:
+                return self._metadata
+            generation = self._generation
+
+        metadata = ServiceMetadata.from_row(self._load())
+        with self._lock:
+            # Nach einem zwischenzeitlichen invalidate() ist der gelesene Stand evtl. veraltet, nicht cachen
+            if generation == self._generation:
+                self._metadata = metadata
+                self._loaded_at = time.monotonic()
+        return metadata
+
+    def invalidate(self):
+        with self._lock:
+            self._metadata = None
+            self._generation += 1
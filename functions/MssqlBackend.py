@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+import pyodbc
+
+from functions.StorageBackend import StorageBackend, check_table_name, fetch_dicts, normalised_table_names
+
+AVAILABLE_DRIVERS = ["ODBC Driver 17 for SQL Server", "ODBC Driver 18 for SQL Server"]
+
+
+class MssqlBackend(StorageBackend):
+    """
+    SQL Server via ``pyodbc``: rows are sent with ``fast_executemany``, snapshots are written with ``MERGE``
+    """
+    engine = "mssql"
+    schema_prefix = "dbo."
+    # T-SQL kennt kein LIMIT, OFFSET/FETCH setzt ein ORDER BY voraus
+    limit_clause = " OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+
+    def __init__(self, settings, table, batch_size):
+        super().__init__(settings, table, batch_size)
+        self.host = settings.db_host
+        self.db = settings.db_database
+        self.driver = settings.db_driver
+        self.connection_str = (
+            f"DRIVER={{{self.driver}}};"
+            f"SERVER={self.host},1433;"
+            f"DATABASE={self.db};"
+            f"UID={settings.db_user};"
+            f"PWD={settings.db_password};"
+            f"TrustServerCertificate=yes;"
+            f"Authentication=SqlPassword;"
+        )
+
+    def describe(self):
+        return self.db
+
+    def connect(self):
+        if not self.driver:
+            raise ValueError("Database driver not configured")
+
+        if self.driver not in AVAILABLE_DRIVERS:
+            raise ValueError(
+                f"Driver '{self.driver}' not installed. Available drivers: {AVAILABLE_DRIVERS}")
+
+        conn = pyodbc.connect(self.connection_str)
+        conn.autocommit = False
+        return conn
+
+    def create_tables(self, cursor, schema):
+        # productive table
+        cursor.execute(queries(self.table))
+        cursor.execute(natural_key_index_query(self.table))
+        # staging table for the snapshot write mode
+        cursor.execute(queries(self.staging_table))
+        cursor.execute(natural_key_index_query(self.staging_table))
+        # fingerprints of the last inserted software list per host
+        cursor.execute(fingerprint_queries())
+        # counts shown on the dashboard
+        cursor.execute(summary_queries())
+        # inventory runs and the software history tagged with them
+        cursor.execute(run_queries())
+        for query in history_queries(self.history_table):
+            cursor.execute(query)
+        # normalised schema: dimension tables, installations and the flat view on them
+        if schema == "normalised":
+            for query in normalised_queries(self.table):
+                cursor.execute(query)
+
+    def create_metadata_table(self, cursor):
+        cursor.execute("""
+            IF NOT EXISTS (
+                SELECT * FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_NAME = 'service_metadata'
+            )
+            BEGIN
+                CREATE TABLE service_metadata (
+                    service_active INT,
+                    last_inventory_start DATETIME,
+                    next_inventory_run DATETIME,
+                    interval_weeks INT,
+                    last_end_time DATETIME,
+                    identifier INT
+                );
+
+                DECLARE @init_last_run DATETIME = NULL;
+                DECLARE @init_next_run DATETIME = DATEADD(WEEK, 2, GETDATE());
+
+                INSERT INTO service_metadata (
+                    service_active,
+                    last_inventory_start,
+                    next_inventory_run,
+                    interval_weeks,
+                    last_end_time,
+                    identifier
+                ) VALUES (
+                    0,
+                    @init_last_run,
+                    @init_next_run,
+                    2,
+                    NULL,
+                    1
+                );
+            END
+            """)
+
+    def migrate_to_normalised(self, cursor, force):
+        installations = self.schema_tables['installations']
+        if not force and cursor.execute(f"SELECT TOP 1 1 FROM [{installations}]").fetchone():
+            return 0
+        if not cursor.execute(f"SELECT TOP 1 1 FROM [{self.table}]").fetchone():
+            return 0
+        for query in migration_queries(self.table):
+            cursor.execute(query)
+        return cursor.rowcount
+
+    def load_metadata_row(self, cursor):
+        row = cursor.execute("SELECT TOP 1 * FROM service_metadata").fetchone()
+        if row is None:
+            return None
+        return {column[0]: value for column, value in zip(cursor.description, row)}
+
+    def insert_rows(self, cursor, table, rows, hostname):
+        # Parameter-Arrays statt einem ODBC-Roundtrip pro Zeile
+        cursor.fast_executemany = True
+        return super().insert_rows(cursor, f"[{table}]", rows, hostname)
+
+    def write_snapshot(self, cursor, hostname):
+        """
+        The staged rows are merged into the prod table on the natural key (hostname, name, version): new software
+        is inserted with ``isNew = 1``, changed rows are updated, rows that are still present lose their ``isNew``
+        flag and software that vanished from the host is deleted. Unchanged rows are not touched. Duplicates from
+        the append mode are removed first, so an existing table is migrated host by host.
+        """
+        # Altbestand aus dem append-Modus: pro Schlüssel nur eine Zeile behalten
+        cursor.execute(f"""
+                WITH dupes AS (
+                    SELECT ROW_NUMBER() OVER (PARTITION BY name, version ORDER BY isNew DESC) AS rn
+                    FROM [{self.table}] WHERE hostname = ?
+                )
+                DELETE FROM dupes WHERE rn > 1
+                """, hostname)
+
+        cursor.execute(f"""
+                WITH target AS (
+                    SELECT * FROM [{self.table}] WHERE hostname = ?
+                )
+                MERGE target AS t
+                USING (
+                    SELECT name, version, MAX(publisher) AS publisher, MAX(installDate) AS installDate,
+                           MAX(programSize) AS programSize
+                    FROM [{self.staging_table}] WHERE hostname = ?
+                    GROUP BY name, version
+                ) AS s
+                ON t.name = s.name AND t.version = s.version
+                WHEN MATCHED AND (t.isNew = 1
+                                  OR EXISTS (SELECT t.publisher, t.installDate, t.programSize
+                                             EXCEPT SELECT s.publisher, s.installDate, s.programSize)) THEN
+                    UPDATE SET publisher = s.publisher, installDate = s.installDate, programSize = s.programSize,
+                               isNew = 0
+                WHEN NOT MATCHED BY TARGET THEN
+                    INSERT (name, publisher, installDate, programSize, version, hostname, isNew)
+                    VALUES (s.name, s.publisher, s.installDate, s.programSize, s.version, ?, 1)
+                WHEN NOT MATCHED BY SOURCE THEN
+                    DELETE
+                OUTPUT $action;
+                """, hostname, hostname, hostname)
+        return merge_actions(cursor)
+
+    def write_normalised(self, cursor, hostname):
+        """
+        Missing host, publisher and title entries are added first, then the installations of the host are merged
+        on (title, version) the same way as in ``write_snapshot``.
+        """
+        t = self.schema_tables
+
+        # UPDLOCK/HOLDLOCK: parallele Writer legen denselben Eintrag nicht doppelt an
+        cursor.execute(f"""
+                IF NOT EXISTS (SELECT 1 FROM [{t['hosts']}] WITH (UPDLOCK, HOLDLOCK) WHERE hostname = ?)
+                    INSERT INTO [{t['hosts']}] (hostname) VALUES (?)
+                """, hostname, hostname)
+        host_id = cursor.execute(f"SELECT host_id FROM [{t['hosts']}] WHERE hostname = ?", hostname).fetchone()[0]
+
+        cursor.execute(f"""
+                INSERT INTO [{t['publishers']}] (name)
+                SELECT DISTINCT s.publisher FROM [{self.staging_table}] s
+                WHERE s.hostname = ? AND NOT EXISTS (
+                    SELECT 1 FROM [{t['publishers']}] p WITH (UPDLOCK, HOLDLOCK) WHERE p.name = s.publisher)
+                """, hostname)
+        cursor.execute(f"""
+                INSERT INTO [{t['titles']}] (name, publisher_id)
+                SELECT DISTINCT s.name, p.publisher_id FROM [{self.staging_table}] s
+                JOIN [{t['publishers']}] p ON p.name = s.publisher
+                WHERE s.hostname = ? AND NOT EXISTS (
+                    SELECT 1 FROM [{t['titles']}] ti WITH (UPDLOCK, HOLDLOCK)
+                    WHERE ti.name = s.name AND ti.publisher_id = p.publisher_id)
+                """, hostname)
+
+        cursor.execute(f"""
+                WITH target AS (
+                    SELECT * FROM [{t['installations']}] WHERE host_id = ?
+                )
+                MERGE target AS t
+                USING (
+                    SELECT ti.title_id, s.version, MAX(s.installDate) AS installDate,
+                           MAX(s.programSize) AS programSize
+                    FROM [{self.staging_table}] s
+                    JOIN [{t['publishers']}] p ON p.name = s.publisher
+                    JOIN [{t['titles']}] ti ON ti.name = s.name AND ti.publisher_id = p.publisher_id
+                    WHERE s.hostname = ?
+                    GROUP BY ti.title_id, s.version
+                ) AS s
+                ON t.title_id = s.title_id AND t.version = s.version
+                WHEN MATCHED AND (t.isNew = 1
+                                  OR EXISTS (SELECT t.installDate, t.programSize
+                                             EXCEPT SELECT s.installDate, s.programSize)) THEN
+                    UPDATE SET installDate = s.installDate, programSize = s.programSize, isNew = 0
+                WHEN NOT MATCHED BY TARGET THEN
+                    INSERT (host_id, title_id, version, installDate, programSize, isNew)
+                    VALUES (?, s.title_id, s.version, s.installDate, s.programSize, 1)
+                WHEN NOT MATCHED BY SOURCE THEN
+                    DELETE
+                OUTPUT $action;
+                """, host_id, hostname, host_id)
+        return merge_actions(cursor)
+
+    def has_open_history(self, cursor, hostname):
+        return cursor.execute(
+            f"SELECT TOP 1 1 FROM [{self.history_table}] WHERE hostname = ? AND valid_to_run IS NULL",
+            hostname).fetchone() is not None
+
+    def write_history(self, cursor, hostname, run_id):
+        staged = f"""
+                SELECT name, version, MAX(publisher) AS publisher, MAX(installDate) AS installDate,
+                       MAX(programSize) AS programSize
+                FROM [{self.staging_table}] WHERE hostname = ?
+                GROUP BY name, version
+                """
+        cursor.execute(f"""
+                UPDATE h SET valid_to_run = ?
+                FROM [{self.history_table}] h
+                WHERE h.hostname = ? AND h.valid_to_run IS NULL AND NOT EXISTS (
+                    SELECT 1 FROM ({staged}) s
+                    WHERE s.name = h.name AND s.version = h.version
+                      AND NOT EXISTS (SELECT s.publisher, s.installDate, s.programSize
+                                      EXCEPT SELECT h.publisher, h.installDate, h.programSize))
+                """, run_id, hostname, hostname)
+        closed = cursor.rowcount
+        # Zweiter Schreibvorgang im selben Lauf: Einträge ohne Gültigkeitsdauer entfernen
+        cursor.execute(f"DELETE FROM [{self.history_table}] WHERE hostname = ? AND valid_from_run = ? "
+                       f"AND valid_to_run = ?", hostname, run_id, run_id)
+        cursor.execute(f"""
+                INSERT INTO [{self.history_table}]
+                    (hostname, name, publisher, installDate, programSize, version, valid_from_run)
+                SELECT ?, s.name, s.publisher, s.installDate, s.programSize, s.version, ?
+                FROM ({staged}) s
+                WHERE NOT EXISTS (SELECT 1 FROM [{self.history_table}] h
+                                  WHERE h.hostname = ? AND h.valid_to_run IS NULL
+                                    AND h.name = s.name AND h.version = s.version)
+                """, hostname, run_id, hostname, hostname)
+        return cursor.rowcount, closed
+
+    def start_run(self, cursor, now):
+        cursor.execute("UPDATE inventory_runs SET status = 'aborted' WHERE status = 'running'")
+        return cursor.execute("INSERT INTO inventory_runs (started_at, status) OUTPUT INSERTED.run_id "
+                              "VALUES (?, 'running')", now).fetchone()[0]
+
+    def get_runs(self, cursor, limit):
+        return fetch_dicts(cursor, "SELECT TOP (?) run_id, started_at, finished_at, status, hosts "
+                                   "FROM inventory_runs ORDER BY run_id DESC", [limit])
+
+    def prune_history(self, conn, keep_runs, batch_size):
+        cursor = conn.cursor()
+        row = cursor.execute("SELECT MIN(run_id) FROM (SELECT TOP (?) run_id FROM inventory_runs "
+                             "ORDER BY run_id DESC) newest", keep_runs).fetchone()
+        oldest_kept = row[0] if row else None
+        if oldest_kept is None:
+            return 0, 0, None
+
+        # Einträge, die vor dem ältesten behaltenen Lauf geschlossen wurden, sieht kein behaltener Lauf mehr
+        deleted = 0
+        while True:
+            cursor.execute(f"DELETE TOP (?) FROM [{self.history_table}] WHERE valid_to_run <= ?",
+                           batch_size, oldest_kept)
+            count = cursor.rowcount
+            conn.commit()
+            deleted += max(count, 0)
+            if count < batch_size:
+                break
+
+        cursor.execute("DELETE FROM inventory_runs WHERE run_id < ?", oldest_kept)
+        runs = cursor.rowcount
+        conn.commit()
+        return deleted, runs, oldest_kept
+
+    def write_summary(self, cursor, source, counts):
+        values = [counts['hosts'], counts['software'], counts['software_all'], counts['publisher'],
+                  counts['updated_at']]
+        cursor.execute("""
+            MERGE inventory_summary WITH (HOLDLOCK) AS t
+            USING (SELECT ? AS source) AS s ON t.source = s.source
+            WHEN MATCHED THEN
+                UPDATE SET hosts = ?, software = ?, software_all = ?, publisher = ?, updated_at = ?
+            WHEN NOT MATCHED THEN
+                INSERT (source, hosts, software, software_all, publisher, updated_at)
+                VALUES (s.source, ?, ?, ?, ?, ?);
+            """, source, *values, *values)
+
+
+def merge_actions(cursor):
+    """
+    Reads the ``OUTPUT $action`` rows of the preceding MERGE
+
+    :param cursor:
+    :return: ``tuple`` (inserted, updated, deleted)
+    """
+    actions = [row[0] for row in cursor.fetchall()]
+    return actions.count('INSERT'), actions.count('UPDATE'), actions.count('DELETE')
+
+
+def queries(table):
+    """
+    Generates sql-query. Creates a new table if the given name is not existing
+
+    :param table:
+    :return: ``str``
+    """
+    # Ensure that the table name is valid
+    check_table_name(table)
+
+    query = f"""
+    IF NOT EXISTS (
+        SELECT * FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_NAME = '{table}' AND TABLE_SCHEMA = 'dbo'
+    )
+    BEGIN
+        CREATE TABLE dbo.{table} (
+            name VARCHAR(90),
+            publisher VARCHAR(90),
+            installDate DATE,
+            programSize INT,
+            version NVARCHAR(50),
+            hostname VARCHAR(80),
+            isNew BIT NOT NULL
+        );
+    END
+    """
+    return query
+
+
+def natural_key_index_query(table):
+    """
+    Generates sql-query for the index on the natural key (hostname, name, version) of a software table
+
+    :param table:
+    :return: ``str``
+    """
+    check_table_name(table)
+
+    return f"""
+    IF NOT EXISTS (
+        SELECT * FROM sys.indexes
+        WHERE name = 'IX_{table}_hostname_name_version' AND object_id = OBJECT_ID('dbo.{table}')
+    )
+    BEGIN
+        CREATE INDEX IX_{table}_hostname_name_version ON dbo.{table} (hostname, name, version);
+    END
+    """
+
+
+def normalised_queries(table):
+    """
+    Generates the sql-queries for the normalised schema: host, publisher and title dimensions, the installation
+    fact table clustered on (host, title, version) and a view returning the columns of the flat table
+
+    :param table: prod table name the other names are derived from
+    :return: ``list`` of ``str``
+    """
+    t = normalised_table_names(table)
+    return [f"""
+    IF OBJECT_ID('dbo.{t['hosts']}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.{t['hosts']} (
+            host_id INT IDENTITY(1,1) NOT NULL CONSTRAINT PK_{t['hosts']} PRIMARY KEY CLUSTERED,
+            hostname VARCHAR(80) NOT NULL CONSTRAINT UQ_{t['hosts']}_hostname UNIQUE
+        );
+    END
+    """, f"""
+    IF OBJECT_ID('dbo.{t['publishers']}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.{t['publishers']} (
+            publisher_id INT IDENTITY(1,1) NOT NULL CONSTRAINT PK_{t['publishers']} PRIMARY KEY CLUSTERED,
+            name VARCHAR(90) NOT NULL CONSTRAINT UQ_{t['publishers']}_name UNIQUE
+        );
+    END
+    """, f"""
+    IF OBJECT_ID('dbo.{t['titles']}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.{t['titles']} (
+            title_id INT IDENTITY(1,1) NOT NULL CONSTRAINT PK_{t['titles']} PRIMARY KEY CLUSTERED,
+            name VARCHAR(90) NOT NULL,
+            publisher_id INT NOT NULL CONSTRAINT FK_{t['titles']}_publisher
+                REFERENCES dbo.{t['publishers']} (publisher_id),
+            CONSTRAINT UQ_{t['titles']}_name_publisher UNIQUE (name, publisher_id)
+        );
+        CREATE INDEX IX_{t['titles']}_publisher ON dbo.{t['titles']} (publisher_id);
+    END
+    """, f"""
+    IF OBJECT_ID('dbo.{t['installations']}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.{t['installations']} (
+            host_id INT NOT NULL CONSTRAINT FK_{t['installations']}_host REFERENCES dbo.{t['hosts']} (host_id),
+            title_id INT NOT NULL CONSTRAINT FK_{t['installations']}_title REFERENCES dbo.{t['titles']} (title_id),
+            version NVARCHAR(50) NOT NULL,
+            installDate DATE,
+            programSize INT,
+            isNew BIT NOT NULL,
+            CONSTRAINT PK_{t['installations']} PRIMARY KEY CLUSTERED (host_id, title_id, version)
+        );
+        CREATE INDEX IX_{t['installations']}_title ON dbo.{t['installations']} (title_id) INCLUDE (version);
+    END
+    """, f"""
+    IF OBJECT_ID('dbo.{t['view']}', 'V') IS NULL
+    BEGIN
+        EXEC('CREATE VIEW dbo.{t['view']} AS
+              SELECT ti.name, p.name AS publisher, i.installDate, i.programSize, i.version, h.hostname, i.isNew
+              FROM dbo.{t['installations']} i
+              JOIN dbo.{t['hosts']} h ON h.host_id = i.host_id
+              JOIN dbo.{t['titles']} ti ON ti.title_id = i.title_id
+              JOIN dbo.{t['publishers']} p ON p.publisher_id = ti.publisher_id');
+    END
+    """]
+
+
+def migration_queries(table):
+    """
+    Generates the sql-queries copying the flat prod table into the normalised tables. Already migrated entries are
+    skipped, duplicates of the append mode collapse to one installation. The last query inserts the installations.
+
+    :param table:
+    :return: ``list`` of ``str``
+    """
+    t = normalised_table_names(table)
+    return [f"""
+    INSERT INTO dbo.{t['hosts']} (hostname)
+    SELECT DISTINCT f.hostname FROM dbo.{table} f
+    WHERE f.hostname IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM dbo.{t['hosts']} h WHERE h.hostname = f.hostname)
+    """, f"""
+    INSERT INTO dbo.{t['publishers']} (name)
+    SELECT DISTINCT ISNULL(f.publisher, '') FROM dbo.{table} f
+    WHERE NOT EXISTS (SELECT 1 FROM dbo.{t['publishers']} p WHERE p.name = ISNULL(f.publisher, ''))
+    """, f"""
+    INSERT INTO dbo.{t['titles']} (name, publisher_id)
+    SELECT DISTINCT f.name, p.publisher_id FROM dbo.{table} f
+    JOIN dbo.{t['publishers']} p ON p.name = ISNULL(f.publisher, '')
+    WHERE f.name IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM dbo.{t['titles']} ti WHERE ti.name = f.name AND ti.publisher_id = p.publisher_id)
+    """, f"""
+    INSERT INTO dbo.{t['installations']} (host_id, title_id, version, installDate, programSize, isNew)
+    SELECT h.host_id, ti.title_id, ISNULL(f.version, '0.0.0'), MAX(f.installDate), MAX(f.programSize),
+           MAX(CAST(f.isNew AS INT))
+    FROM dbo.{table} f
+    JOIN dbo.{t['hosts']} h ON h.hostname = f.hostname
+    JOIN dbo.{t['publishers']} p ON p.name = ISNULL(f.publisher, '')
+    JOIN dbo.{t['titles']} ti ON ti.name = f.name AND ti.publisher_id = p.publisher_id
+    WHERE NOT EXISTS (SELECT 1 FROM dbo.{t['installations']} i
+                      WHERE i.host_id = h.host_id AND i.title_id = ti.title_id
+                        AND i.version = ISNULL(f.version, '0.0.0'))
+    GROUP BY h.host_id, ti.title_id, ISNULL(f.version, '0.0.0')
+    """]
+
+
+def run_queries():
+    """
+    Generates sql-query for the table of inventory runs, whose ids tag the history
+
+    :return: ``str``
+    """
+    return """
+    IF OBJECT_ID('dbo.inventory_runs', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.inventory_runs (
+            run_id INT IDENTITY(1,1) NOT NULL CONSTRAINT PK_inventory_runs PRIMARY KEY CLUSTERED,
+            started_at DATETIME NOT NULL,
+            finished_at DATETIME NULL,
+            status VARCHAR(20) NOT NULL,
+            hosts INT NULL
+        );
+    END
+    """
+
+
+def history_queries(table):
+    """
+    Generates the sql-queries for the history table. Every entry is valid from the run it appeared in up to the run
+    it vanished or changed in (``NULL`` while it is still installed).
+
+    The clustered index on ``valid_to_run`` keeps closed entries of old runs together for cheap range deletes, the
+    filtered index covers the open entries the write path compares against.
+
+    :param table:
+    :return: ``list`` of ``str``
+    """
+    check_table_name(table)
+
+    return [f"""
+    IF OBJECT_ID('dbo.{table}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.{table} (
+            hostname VARCHAR(80) NOT NULL,
+            name VARCHAR(90),
+            publisher VARCHAR(90),
+            installDate DATE,
+            programSize INT,
+            version NVARCHAR(50),
+            valid_from_run INT NOT NULL,
+            valid_to_run INT NULL
+        );
+        CREATE CLUSTERED INDEX CIX_{table}_valid_to_run ON dbo.{table} (valid_to_run, hostname);
+    END
+    """, f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{table}_open' AND object_id = OBJECT_ID('dbo.{table}'))
+    BEGIN
+        CREATE INDEX IX_{table}_open ON dbo.{table} (hostname, name, version)
+            INCLUDE (publisher, installDate, programSize) WHERE valid_to_run IS NULL;
+    END
+    """, f"""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{table}_valid_from_run'
+                   AND object_id = OBJECT_ID('dbo.{table}'))
+    BEGIN
+        CREATE INDEX IX_{table}_valid_from_run ON dbo.{table} (valid_from_run) INCLUDE (valid_to_run, hostname);
+    END
+    """]
+
+
+def summary_queries():
+    """
+    Generates sql-query for the table holding the dashboard counts, one row per inventory source (prod table or
+    view of the normalised schema)
+
+    :return: ``str``
+    """
+    return """
+    IF OBJECT_ID('dbo.inventory_summary', 'U') IS NULL
+    BEGIN
+        CREATE TABLE dbo.inventory_summary (
+            source VARCHAR(128) NOT NULL CONSTRAINT PK_inventory_summary PRIMARY KEY,
+            hosts INT NOT NULL,
+            software INT NOT NULL,
+            software_all INT NOT NULL,
+            publisher INT NOT NULL,
+            updated_at DATETIME NOT NULL
+        );
+    END
+    """
+
+
+def fingerprint_queries():
+    """
+    Generates sql-query for the table holding the software fingerprint and last contact of every host
+
+    :return: ``str``
+    """
+    return """
+    IF NOT EXISTS (
+        SELECT * FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_NAME = 'host_fingerprints' AND TABLE_SCHEMA = 'dbo'
+    )
+    BEGIN
+        CREATE TABLE dbo.host_fingerprints (
+            hostname VARCHAR(80) NOT NULL PRIMARY KEY,
+            fingerprint CHAR(64) NOT NULL,
+            last_seen DATETIME NOT NULL,
+            last_changed DATETIME NOT NULL
+        );
+    END
+    """
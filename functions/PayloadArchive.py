@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+
+DEFAULT_ARCHIVE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "json"))
+DEFAULT_QUEUE_SIZE = 256
+
+
+def archive_file_name(hostname, timestamp):
+    """
+    :param hostname:
+    :param timestamp: ``datetime`` the payload was collected
+    :return: ``str`` unique file name of one archived payload
+    """
+    return f"{hostname}_{timestamp.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.json.gz"
+
+
+class PayloadArchive:
+    """
+    Optional archive of the collected software lists as ``<archive_dir>/<host>_<timestamp>_<suffix>.json.gz``.
+    The random suffix keeps two payloads of one host within the same second (retry, manual run during a
+    scheduled one) apart.
+
+    The files are written by a background thread, so archiving never delays the collection or the database
+    writes. If the writer falls behind and the queue is full, payloads are dropped with a warning.
+    """
+
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR, queue_size=DEFAULT_QUEUE_SIZE):
+        self.archive_dir = archive_dir
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._write_loop, name="payload_archive_writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, hostname, software_list):
+        """
+        Queues ``software_list`` of ``hostname`` for archiving, returns immediately
+
+        :param hostname:
+        :param software_list:
+        :return: ``bool`` False if the payload was dropped
+        """
+        try:
+            self._queue.put_nowait((hostname, datetime.now(), software_list))
+            return True
+        except queue.Full:
+            logging.warning(f"Payload archive queue full, dropping payload of {hostname}")
+            return False
+
+    def close(self):
+        """
+        Writes all queued payloads and stops the writer thread
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            hostname, timestamp, software_list = item
+            file_name = os.path.join(self.archive_dir, archive_file_name(hostname, timestamp))
+            try:
+                with gzip.open(file_name, "wt", encoding="utf-8") as f:
+                    json.dump(software_list, f, ensure_ascii=False)
+            except Exception as e:
+                logging.error(f"Archiving payload of {hostname} failed: {e}")
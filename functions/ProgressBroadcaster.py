@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+from collections import deque
+
+# Ereignisse, die ein Client nach einem Verbindungsabbruch nachgeliefert bekommt
+DEFAULT_BUFFER_SIZE = 512
+# Sekunden ohne Ereignis, nach denen ein Kommentar gesendet wird (erkennt getrennte Clients, hält Proxys offen)
+DEFAULT_HEARTBEAT = 15.0
+
+
+def format_sse(event_id, event, data):
+    """
+    One Server-Sent Event
+
+    :param event_id: ``int`` or ``None``
+    :param event: event type, ``addEventListener`` name in the browser
+    :param data: ``dict`` sent as JSON
+    :return: ``str``
+    """
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class ProgressBroadcaster:
+    """
+    Fans the progress events of the inventory out to any number of viewers.
+
+    The producer (``report_progress``) publishes every event once into a bounded ring buffer and wakes the
+    waiting viewers; each viewer only remembers the id of the last event it sent. Viewers cost neither a queue
+    nor a request per second, and a slow or reconnecting viewer gets the missed events from the buffer or, if they
+    are gone already, a fresh snapshot.
+    """
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        self._events = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._condition = threading.Condition()
+        self._viewers = 0
+
+    def publish(self, event, data):
+        """
+        :param event: event type, e.g. ``host`` or ``run``
+        :param data: ``dict``
+        :return: ``int`` id of the event
+        """
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, event, data))
+            self._condition.notify_all()
+            return self._last_id
+
+    def stats(self):
+        with self._condition:
+            return {'viewers': self._viewers, 'last_id': self._last_id, 'buffered': len(self._events)}
+
+    def _wait(self, position, timeout):
+        """
+        Waits up to ``timeout`` seconds for events after ``position``
+
+        :return: ``tuple`` (events after ``position``, ``True`` if some of them have already left the buffer,
+                 new position)
+        """
+        with self._condition:
+            if self._last_id == position:
+                self._condition.wait(timeout)
+            oldest = self._events[0][0] if self._events else self._last_id + 1
+            missed = position + 1 < oldest and position < self._last_id
+            events = [entry for entry in self._events if entry[0] > position]
+            return events, missed, self._last_id
+
+    def stream(self, snapshot, last_id=None, heartbeat=DEFAULT_HEARTBEAT):
+        """
+        Generator of Server-Sent Events for one viewer: a ``snapshot`` event with the current state, then every
+        published event. Ends when the viewer disconnects (the server closes the generator).
+
+        :param snapshot: callable returning the current state as ``dict``
+        :param last_id: ``Last-Event-ID`` of a reconnecting browser, the events after it are sent instead of a
+                        snapshot if they are still buffered
+        :param heartbeat: seconds between keep-alive comments
+        :return: generator of ``str``
+        """
+        with self._condition:
+            self._viewers += 1
+            current = self._last_id
+        try:
+            if last_id is None or last_id > current:
+                position = current
+                yield format_sse(position, "snapshot", snapshot())
+            else:
+                position = last_id
+            while True:
+                events, missed, latest = self._wait(position, heartbeat)
+                if missed:
+                    # Zu langsam oder zu lange getrennt: Zustand neu senden statt Lücken
+                    position = latest
+                    yield format_sse(position, "snapshot", snapshot())
+                    continue
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                for event_id, event, data in events:
+                    yield format_sse(event_id, event, data)
+                position = events[-1][0]
+        finally:
+            with self._condition:
+                self._viewers -= 1
+
+
+progress_broadcaster = ProgressBroadcaster()
@@ -1,14 +1,17 @@
-import os
+import time
 import warnings
 
 from json import JSONDecodeError
 
 import re
-import winrm
 import functions.DatabaseManager as dm
+from functions.HostStateCache import host_state
+from functions.WinRMSessionPool import winrm_pool
 import json
 import base64
-import configparser
+import gzip
+
+from config.config_manager import get_settings
 
 
 
@@ -37,14 +40,227 @@ def parse_txt_to_json(raw_text: str):
     return software_list
 
 
+PWSH_SCRIPT = r"""
+            $software = Get-ItemProperty HKLM:\Software\Wow6432Node\Microsoft\Windows\CurrentVersion\Uninstall\* |
+            Select-Object DisplayName, DisplayVersion, Publisher, InstallDate
+
+            $software += Get-ItemProperty HKLM:\Software\Microsoft\Windows\CurrentVersion\Uninstall\* |
+            Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
+
+            $software = $software | Where-Object { $_.DisplayName -ne $null} | 
+                ForEach-Object {
+                    [PSCustomObject]@{
+                        Name = if ($_.DisplayName) {$_.DisplayName} else { $null }
+                        Publisher   = if ($_.Publisher) { $_.Publisher } else { $null }
+                        InstallDate = if ($_.InstallDate) { $_.InstallDate } else { $null }
+                        Size        = if ($_.EstimatedSize) { $_.EstimatedSize } else { 0 }
+                        Version     = if ($_.DisplayVersion) {$_.DisplayVersion} else { $null }}
+                    } |
+                Sort-Object DisplayName
+
+            $json = $software | ConvertTo-Json -Depth 3
+            $bytes = [System.Text.Encoding]::UTF8.GetBytes($json)
+            [Convert]::ToBase64String($bytes)
+            """
+
+PWSH_SCRIPT_2008 = r"""$lines = @()
+            $software = Get-ItemProperty HKLM:\Software\Wow6432Node\Microsoft\Windows\CurrentVersion\Uninstall\* |
+                Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
+            $software += Get-ItemProperty HKLM:\Software\Microsoft\Windows\CurrentVersion\Uninstall\* |
+                Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
+            $software = $software | Where-Object { $_.DisplayName -ne $null } | Sort-Object DisplayName
+            foreach ($item in $software) {
+                $lines += "Name       : $($item.DisplayName)"
+                $lines += "Version    : $($item.DisplayVersion)"
+                $lines += "Publisher  : $($item.Publisher)"
+                $lines += "Installiert: $($item.InstallDate)"
+                $lines += "Größe      : $($item.EstimatedSize) KB"
+                $lines += "-------------------------------"
+            }
+            $fullText = $lines -join "`r`n"
+            $bytes = [System.Text.Encoding]::UTF8.GetBytes($fullText)
+            [Convert]::ToBase64String($bytes)
+            """
+
+
+def compact_script(script: str):
+    """
+    Strips indentation and empty lines. ``-encodedcommand`` is limited by the command line length of the remote
+    shell (8191 chars), the UTF-16 + base64 encoding makes every character count almost three times.
+
+    :param script:
+    :return: ``str``
+    """
+    return "\n".join(line.strip() for line in script.splitlines() if line.strip())
+
+
+# Ermittelt die Fähigkeiten des Hosts und liefert das Inventar im selben Aufruf.
+# Erste Zeile: "PAYLOAD:<json|text>|<OS-Caption>", zweite Zeile: Base64-Payload
+PWSH_SCRIPT_DETECT = compact_script(r"""
+            $caption = (Get-WmiObject Win32_OperatingSystem).Caption
+            $software = Get-ItemProperty HKLM:\Software\Wow6432Node\Microsoft\Windows\CurrentVersion\Uninstall\* |
+                Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
+            $software += Get-ItemProperty HKLM:\Software\Microsoft\Windows\CurrentVersion\Uninstall\* |
+                Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
+            $software = $software | Where-Object { $_.DisplayName -ne $null } | Sort-Object DisplayName
+
+            if (Get-Command ConvertTo-Json -ErrorAction SilentlyContinue) {
+                $format = "json"
+                $payload = $software |
+                    ForEach-Object {
+                        [PSCustomObject]@{
+                            Name = if ($_.DisplayName) {$_.DisplayName} else { $null }
+                            Publisher   = if ($_.Publisher) { $_.Publisher } else { $null }
+                            InstallDate = if ($_.InstallDate) { $_.InstallDate } else { $null }
+                            Size        = if ($_.EstimatedSize) { $_.EstimatedSize } else { 0 }
+                            Version     = if ($_.DisplayVersion) {$_.DisplayVersion} else { $null }}
+                        } |
+                    ConvertTo-Json -Depth 3
+            } else {
+                $format = "text"
+                $lines = @()
+                foreach ($item in $software) {
+                    $lines += "Name       : $($item.DisplayName)"
+                    $lines += "Version    : $($item.DisplayVersion)"
+                    $lines += "Publisher  : $($item.Publisher)"
+                    $lines += "Installiert: $($item.InstallDate)"
+                    $lines += "Größe      : $($item.EstimatedSize) KB"
+                    $lines += "-------------------------------"
+                }
+                $payload = $lines -join "`r`n"
+            }
+            "PAYLOAD:$format|$caption"
+            $bytes = [System.Text.Encoding]::UTF8.GetBytes($payload)
+            [Convert]::ToBase64String($bytes)
+            """)
+
+# GZip vor der Base64-Kodierung (.NET 2.0, läuft auch unter PowerShell 2.0 / Server 2008).
+# Schlägt die Komprimierung fehl, bleibt $bytes unverändert und wird unkomprimiert gesendet.
+PWSH_GZIP = r"""
+            try {
+                $ms = New-Object System.IO.MemoryStream
+                $gz = New-Object System.IO.Compression.GZipStream($ms, [System.IO.Compression.CompressionMode]::Compress)
+                $gz.Write($bytes, 0, $bytes.Length)
+                $gz.Close()
+                $bytes = $ms.ToArray()
+            } catch { }
+            """
+
+PAYLOAD_HEADER = "PAYLOAD:"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def with_compression(script: str):
+    """
+    Inserts ``PWSH_GZIP`` in front of the final base64 encoding of an inventory script
+
+    :param script:
+    :return: ``str``
+    """
+    return script.replace("[Convert]::ToBase64String($bytes)",
+                          compact_script(PWSH_GZIP) + "\n[Convert]::ToBase64String($bytes)")
+
+
+PAYLOAD_SCRIPTS = {"json": PWSH_SCRIPT, "text": PWSH_SCRIPT_2008, None: PWSH_SCRIPT_DETECT}
+PAYLOAD_SCRIPTS_GZIP = {payload_format: with_compression(script) for payload_format, script in PAYLOAD_SCRIPTS.items()}
+
+
+def select_script(host: str):
+    """
+    Picks the inventory script for ``host``. Hosts with a cached ``payload_format`` get the matching script
+    directly, unknown hosts get ``PWSH_SCRIPT_DETECT``. Either way it is a single WinRM call.
+    With ``[inventory] compress_payload`` the host gzips the payload before encoding it.
+
+    :param host:
+    :return: ``tuple`` (script, cached payload format or ``None``)
+    """
+    payload_format = host_state.get(host).get("payload_format")
+    if payload_format not in PAYLOAD_SCRIPTS:
+        payload_format = None
+    if get_settings().getboolean('inventory', 'compress_payload', fallback=True):
+        return PAYLOAD_SCRIPTS_GZIP[payload_format], payload_format
+    return PAYLOAD_SCRIPTS[payload_format], payload_format
+
+
+def split_payload_header(output: str):
+    """
+    Splits the ``PAYLOAD:`` line written by ``PWSH_SCRIPT_DETECT`` from the base64 payload.
+
+    :param output:
+    :return: ``tuple`` (payload format or ``None``, OS caption or ``None``, base64 payload)
+    """
+    lines = output.strip().splitlines()
+    if lines and lines[0].startswith(PAYLOAD_HEADER):
+        payload_format, _, os_name = lines[0][len(PAYLOAD_HEADER):].partition("|")
+        return payload_format.strip(), os_name.strip(), "".join(lines[1:]).strip()
+    return None, None, output.strip()
+
+
+def decode_payload(base64_output: str, host: str, log, payload_format=None):
+    """
+    Decodes the base64 output of an inventory script into a software list.
+
+    Payloads gzipped on the host (``[inventory] compress_payload``) are recognised by the gzip magic bytes and
+    inflated, uncompressed payloads are taken as they are.
+    Falls back to ``parse_txt_to_json`` if the payload is not valid JSON (Windows Server 2008 text format).
+    ``log`` is the ``DatabaseManager`` used for the print prefixes.
+
+    :param base64_output:
+    :param host:
+    :param log:
+    :param payload_format: ``json``, ``text`` or ``None`` if unknown
+    :return: ``list``
+    """
+    payload = base64.b64decode(base64_output)
+    # Komprimierung kann auf dem Host fehlschlagen, dann kommt der Payload unkomprimiert
+    if payload[:2] == GZIP_MAGIC:
+        payload = gzip.decompress(payload)
+    decoded_json = payload.decode('utf-8', errors='ignore')
+    if not decoded_json.strip():
+        print(f"{log.get_logprint_debug()} Leere JSON-Ausgabe von Host {host}")
+        print(f"{log.get_logprint_debug()} PowerShell-Ausgabe: {base64_output}")
+        raise ValueError("Base64-Dekodierung war leer oder ungültig.")
+
+    if payload_format == "text":
+        software_list = parse_txt_to_json(decoded_json)
+    else:
+        try:
+            software_list = json.loads(decoded_json)
+        except JSONDecodeError as e:
+            print(f"{log.get_logprint_warning()} JSON-Parsingerror: {e}")
+            print(f"{log.get_logprint_debug()} Initial output:\n{decoded_json[:500]}...")
+            # Fallback zu Text-Parser
+            software_list = parse_txt_to_json(decoded_json)
+
+    # Write hostname into software_list
+    if isinstance(software_list, dict):
+        software_list = [software_list]
+    for entry in software_list:
+        entry["Hostname"] = host
+    return software_list
+
+
+def handle_output(output: str, host: str, log, payload_format=None):
+    """
+    Decodes the stdout of an inventory script and remembers the detected capabilities of ``host``.
+
+    :param output:
+    :param host:
+    :param log:
+    :param payload_format: cached format the script was chosen by
+    :return: ``list``
+    """
+    detected_format, os_name, base64_output = split_payload_header(output)
+    if detected_format:
+        host_state.update(host, payload_format=detected_format, os=os_name)
+        print(f"{log.get_logprint_info()} {host} ({os_name}) liefert {detected_format}-Ausgabe, Ergebnis gespeichert.")
+        payload_format = detected_format
+    return decode_payload(base64_output, host, log, payload_format)
+
+
 class SoftwareInventoryWinRM:
     def __init__(self, host, config_file=None, transport='ntlm'):
-        if config_file is None:
-            # Pfad relativ zur aktuellen Datei (SoftwareInventoryWinRM.py)
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            config_file = os.path.join(current_dir, "..", "config", "config.ini")
-            config_file = os.path.normpath(config_file)
-            self.config_file = config_file
+        self.config_file = config_file
         self.log = dm.DatabaseManager()
 
         # No more static strings up here
@@ -59,133 +275,89 @@ class SoftwareInventoryWinRM:
         self.get_logprint_warning = self.log.get_logprint_warning
         self.get_logprint_error = self.log.get_logprint_error
 
-        self.output_file = None
-
-        pwsh_script = r"""
-                    $software = Get-ItemProperty HKLM:\Software\Wow6432Node\Microsoft\Windows\CurrentVersion\Uninstall\* |
-                    Select-Object DisplayName, DisplayVersion, Publisher, InstallDate
-
-                    $software += Get-ItemProperty HKLM:\Software\Microsoft\Windows\CurrentVersion\Uninstall\* |
-                    Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
-
-                    $software = $software | Where-Object { $_.DisplayName -ne $null} | 
-                        ForEach-Object {
-                            [PSCustomObject]@{
-                                Name = if ($_.DisplayName) {$_.DisplayName} else { $null }
-                                Publisher   = if ($_.Publisher) { $_.Publisher } else { $null }
-                                InstallDate = if ($_.InstallDate) { $_.InstallDate } else { $null }
-                                Size        = if ($_.EstimatedSize) { $_.EstimatedSize } else { 0 }
-                                Version     = if ($_.DisplayVersion) {$_.DisplayVersion} else { $null }}
-                            } |
-                        Sort-Object DisplayName
-
-                    $json = $software | ConvertTo-Json -Depth 3
-                    $bytes = [System.Text.Encoding]::UTF8.GetBytes($json)
-                    [Convert]::ToBase64String($bytes)
-                    """
-        pwsh_script_2008 = r"""$lines = @()
-                    $software = Get-ItemProperty HKLM:\Software\Wow6432Node\Microsoft\Windows\CurrentVersion\Uninstall\* |
-                        Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
-                    $software += Get-ItemProperty HKLM:\Software\Microsoft\Windows\CurrentVersion\Uninstall\* |
-                        Select-Object DisplayName, DisplayVersion, Publisher, InstallDate, EstimatedSize
-                    $software = $software | Where-Object { $_.DisplayName -ne $null } | Sort-Object DisplayName
-                    foreach ($item in $software) {
-                        $lines += "Name       : $($item.DisplayName)"
-                        $lines += "Version    : $($item.DisplayVersion)"
-                        $lines += "Publisher  : $($item.Publisher)"
-                        $lines += "Installiert: $($item.InstallDate)"
-                        $lines += "Größe      : $($item.EstimatedSize) KB"
-                        $lines += "-------------------------------"
-                    }
-                    $fullText = $lines -join "`r`n"
-                    $bytes = [System.Text.Encoding]::UTF8.GetBytes($fullText)
-                    [Convert]::ToBase64String($bytes)
-                    """
-
-        self.pwsh_script = pwsh_script
-        self.pwsh_script_2008 = pwsh_script_2008
-
-        config = configparser.ConfigParser()
-        config.read(self.config_file)
-
-        encrypted_pwd_ps = config.get('ps-auth', 'pwd_ps')
-        self.user = config.get('ps-auth', 'user_ps')
-        self.pwd = dm.decrypt_password(encrypted_pwd_ps)
+        self.pwsh_script = PWSH_SCRIPT
+        self.pwsh_script_2008 = PWSH_SCRIPT_2008
+
+        # Zugangsdaten einmal pro Prozess entschlüsselt, nicht pro Host
+        settings = get_settings(self.config_file)
+        self.user = settings.ps_user
+        self.pwd = settings.ps_password
         self.host = host
+        self.transport = transport
+        # Dauer in Sekunden je Phase, für die Planung der nächsten Läufe
+        self.timings = {'connect': 0.0, 'script': 0.0}
 
-        try:
-            self.session = winrm.Session(
-                target=self.host,
-                auth=(self.user, self.pwd),
-                transport=transport,
-                read_timeout_sec=15,  # Timeout hinzufügen
-                operation_timeout_sec=10
-            )
-        except Exception as e:
-            self.log.logger.error(f"WinRM connection error to {host}: {str(e)}")
-            raise ConnectionError(f"WinRM connection failed: {str(e)}")
+    def run_ps(self, script):
+        """
+        Runs ``script`` in a pooled shell of the host. The connection and the shell stay open for follow-up
+        commands, so only the first call per host pays for the TCP setup and the NTLM handshake.
+        If a shell taken from the pool fails, the server may have closed it (idle timeout, reboot, WinRM restart);
+        the script is then run once more in a freshly opened shell.
+
+        :param script:
+        :return: ``winrm.Response``
+        """
+        for reuse in (True, False):
+            start = time.monotonic()
+            shell = None
+            try:
+                with winrm_pool.shell(
+                        self.host,
+                        self.user,
+                        self.pwd,
+                        transport=self.transport,
+                        reuse=reuse,
+                        read_timeout_sec=15,  # Timeout hinzufügen
+                        operation_timeout_sec=10
+                ) as shell:
+                    connected = time.monotonic()
+                    self.timings['connect'] += connected - start
+                    try:
+                        return shell.run_ps(script)
+                    finally:
+                        self.timings['script'] += time.monotonic() - connected
+            except Exception as e:
+                if shell is None or not shell.reused:
+                    raise
+                print(f"{self.get_logprint_warning()} Pooled WinRM shell on {self.host} failed ({e}), "
+                      f"retrying with a new shell")
+
+    def get_installed_software(self):
+        """
+        Collects the installed software of the host
 
-    def get_installed_software(self, output_file: str):
+        :return: ``list`` parsed software entries, each with ``Hostname`` set
+        """
         # Supress warnings for WinRM-parser
         warnings.filterwarnings("ignore", category=UserWarning, module="winrm")
 
-        # Due to incompatibility for win server 2008 in the powershell_script its necessary to check the OS-version.
-        os_check_script = "(Get-WmiObject Win32_OperatingSystem).Caption"
-        os_result = self.session.run_ps(os_check_script)
-        os_name = os_result.std_out.decode('utf-8', errors='ignore').strip()
-
-        if "2008" in os_name:
+        # Due to incompatibility for win server 2008 in the powershell_script the script depends on the host's
+        # capabilities. They are detected in the same call and cached, so there is no separate OS-check call.
+        script, payload_format = select_script(self.host)
+        if payload_format == "text":
             print(f"{self.get_logprint_info()} {self.host} is a windows server 2008 system.\n"
                   f"{self.get_logprint_info()} Nutze Text-Ausgabe Methode.")
-            try:
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                output_file = os.path.join(current_dir, "..", "json", f"{self.host}_output.json")
-                json_dir = os.path.normpath(output_file)
-                # Temporarily disable warnings
-                self.warn_catch(self.pwsh_script_2008, output_file=f"{json_dir}")
-            except Exception as e:
-                raise ValueError(f"{self.get_logprint_error()} Processing or saving error: {e}")
-        else:
+        elif payload_format == "json":
             print(f"{self.get_logprint_info()} {self.host} is using modern windows OS. Using direct JSON-output")
-            try:
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                output_file = os.path.join(current_dir, "..", "json", f"{self.host}_output.json")
-                json_dir = os.path.normpath(output_file)
-                # Temporarily disable warnings
-                self.warn_catch(self.pwsh_script, output_file=f"{json_dir}")
-            except Exception as e:
-                raise ValueError(f"{self.get_logprint_error()} Processing or saving error: {e}")
+        else:
+            print(f"{self.get_logprint_info()} {self.host} is unknown. Detecting capabilities with the inventory call")
+
+        try:
+            # Temporarily disable warnings
+            return self.warn_catch(script, payload_format=payload_format)
+        except Exception as e:
+            if payload_format:
+                # Host evtl. neu aufgesetzt - beim nächsten Lauf neu erkennen
+                host_state.discard(self.host, "payload_format", "os")
+            raise ValueError(f"{self.get_logprint_error()} Processing error: {e}")
 
-    def warn_catch(self, script, output_file: str):
+    def warn_catch(self, script, payload_format=None):
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            result = self.session.run_ps(script)
+            result = self.run_ps(script)
 
         if result.status_code != 0:
             raise RuntimeError(
                 f"Fehler beim Ausführen des Skripts: {result.std_err.decode(errors='ignore')}")
-        base64_output = result.std_out.decode('utf-8').strip()
-        decoded_json = base64.b64decode(base64_output).decode('utf-8', errors='ignore')
-        if not decoded_json.strip():
-            print(f"{self.get_logprint_debug()} Leere JSON-Ausgabe von Host {self.host}")
-            print(f"{self.get_logprint_debug()} PowerShell-Ausgabe: {base64_output}")
-            raise ValueError("Base64-Dekodierung war leer oder ungültig.")
-
-        try:
-            software_list = json.loads(decoded_json)
-        except JSONDecodeError as e:
-            print(f"{self.get_logprint_warning()} JSON-Parsingerror: {e}")
-            print(f"{self.get_logprint_debug()} Initial output:\n{decoded_json[:500]}...")
-            # Fallback zu Text-Parser
-            software_list = parse_txt_to_json(decoded_json)
-
-        # Write hostname into software_list
-        if isinstance(software_list, dict):
-            software_list = [software_list]
-        for entry in software_list:
-            entry["Hostname"] = self.host
-
-        # Write data only ONCE
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(software_list, f, indent=2, ensure_ascii=False)
-            print(f"{self.get_logprint_info()} Software with hostname has been saved to '{output_file}'")
+        output = result.std_out.decode('utf-8').strip()
+        return handle_output(output, self.host, self.log, payload_format)
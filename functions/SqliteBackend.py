@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+from datetime import date, datetime
+
+from functions.StorageBackend import StorageBackend, fetch_dicts
+
+DEFAULT_SQLITE_PATH = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "inventory.sqlite3"))
+# Sekunden, die eine Verbindung auf die Schreibsperre einer anderen wartet
+DEFAULT_BUSY_TIMEOUT = 30.0
+
+# Datums-Spalten als ISO-Text speichern und mit dem deklarierten Typ wieder als date/datetime lesen
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda raw: datetime.fromisoformat(raw.decode()))
+
+
+class SqliteBackend(StorageBackend):
+    """
+    SQLite file database for small sites, tests and benchmarks.
+
+    The file runs in WAL mode, so the web interface keeps reading while the inventory writes; writers are
+    serialised by SQLite and wait up to ``[db] sqlite_busy_timeout`` seconds for each other. Rows are sent with
+    ``executemany``, snapshots are written with ``DELETE``/``UPDATE ... FROM``/``INSERT`` instead of ``MERGE``.
+    Needs SQLite 3.33 or newer.
+    """
+    engine = "sqlite"
+
+    def __init__(self, settings, table, batch_size):
+        super().__init__(settings, table, batch_size)
+        self.path = settings.get('db', 'sqlite_path', fallback='') or DEFAULT_SQLITE_PATH
+        self.busy_timeout = settings.getfloat('db', 'sqlite_busy_timeout', fallback=DEFAULT_BUSY_TIMEOUT)
+
+    def describe(self):
+        return self.path
+
+    def connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # IMMEDIATE: die Schreibsperre wird mit dem ersten Schreibzugriff einer Transaktion geholt
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                               isolation_level="IMMEDIATE", check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def create_tables(self, cursor, schema):
+        for table in (self.table, self.staging_table):
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    name VARCHAR(90),
+                    publisher VARCHAR(90),
+                    installDate DATE,
+                    programSize INT,
+                    version NVARCHAR(50),
+                    hostname VARCHAR(80),
+                    isNew BIT NOT NULL
+                )""")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS IX_{table}_hostname_name_version "
+                           f"ON {table} (hostname, name, version)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS host_fingerprints (
+                hostname VARCHAR(80) NOT NULL PRIMARY KEY,
+                fingerprint CHAR(64) NOT NULL,
+                last_seen TIMESTAMP NOT NULL,
+                last_changed TIMESTAMP NOT NULL
+            )""")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS inventory_summary (
+                source VARCHAR(128) NOT NULL PRIMARY KEY,
+                hosts INT NOT NULL,
+                software INT NOT NULL,
+                software_all INT NOT NULL,
+                publisher INT NOT NULL,
+                updated_at TIMESTAMP NOT NULL
+            )""")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS inventory_runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TIMESTAMP NOT NULL,
+                finished_at TIMESTAMP NULL,
+                status VARCHAR(20) NOT NULL,
+                hosts INT NULL
+            )""")
+        history = self.history_table
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {history} (
+                hostname VARCHAR(80) NOT NULL,
+                name VARCHAR(90),
+                publisher VARCHAR(90),
+                installDate DATE,
+                programSize INT,
+                version NVARCHAR(50),
+                valid_from_run INT NOT NULL,
+                valid_to_run INT NULL
+            )""")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS IX_{history}_valid_to_run ON {history} (valid_to_run, hostname)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS IX_{history}_open ON {history} (hostname, name, version) "
+                       f"WHERE valid_to_run IS NULL")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS IX_{history}_valid_from_run ON {history} (valid_from_run)")
+
+        if schema == "normalised":
+            t = self.schema_tables
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {t['hosts']} (
+                    host_id INTEGER PRIMARY KEY,
+                    hostname VARCHAR(80) NOT NULL UNIQUE
+                )""")
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {t['publishers']} (
+                    publisher_id INTEGER PRIMARY KEY,
+                    name VARCHAR(90) NOT NULL UNIQUE
+                )""")
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {t['titles']} (
+                    title_id INTEGER PRIMARY KEY,
+                    name VARCHAR(90) NOT NULL,
+                    publisher_id INT NOT NULL REFERENCES {t['publishers']} (publisher_id),
+                    UNIQUE (name, publisher_id)
+                )""")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS IX_{t['titles']}_publisher ON {t['titles']} (publisher_id)")
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {t['installations']} (
+                    host_id INT NOT NULL REFERENCES {t['hosts']} (host_id),
+                    title_id INT NOT NULL REFERENCES {t['titles']} (title_id),
+                    version NVARCHAR(50) NOT NULL,
+                    installDate DATE,
+                    programSize INT,
+                    isNew BIT NOT NULL,
+                    PRIMARY KEY (host_id, title_id, version)
+                ) WITHOUT ROWID""")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS IX_{t['installations']}_title "
+                           f"ON {t['installations']} (title_id, version)")
+            cursor.execute(f"""
+                CREATE VIEW IF NOT EXISTS {t['view']} AS
+                SELECT ti.name, p.name AS publisher, i.installDate, i.programSize, i.version, h.hostname, i.isNew
+                FROM {t['installations']} i
+                JOIN {t['hosts']} h ON h.host_id = i.host_id
+                JOIN {t['titles']} ti ON ti.title_id = i.title_id
+                JOIN {t['publishers']} p ON p.publisher_id = ti.publisher_id""")
+
+    def create_metadata_table(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS service_metadata (
+                service_active INT,
+                last_inventory_start TIMESTAMP,
+                next_inventory_run TIMESTAMP,
+                interval_weeks INT,
+                last_end_time TIMESTAMP,
+                identifier INT
+            )""")
+        cursor.execute("""
+            INSERT INTO service_metadata (service_active, last_inventory_start, next_inventory_run, interval_weeks,
+                                          last_end_time, identifier)
+            SELECT 0, NULL, datetime('now', 'localtime', '+14 days'), 2, NULL, 1
+            WHERE NOT EXISTS (SELECT 1 FROM service_metadata)""")
+
+    def migrate_to_normalised(self, cursor, force):
+        t = self.schema_tables
+        if not force and cursor.execute(f"SELECT 1 FROM {t['installations']} LIMIT 1").fetchone():
+            return 0
+        if not cursor.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone():
+            return 0
+
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {t['hosts']} (hostname)
+            SELECT DISTINCT hostname FROM {self.table} WHERE hostname IS NOT NULL""")
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {t['publishers']} (name)
+            SELECT DISTINCT IFNULL(publisher, '') FROM {self.table}""")
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {t['titles']} (name, publisher_id)
+            SELECT DISTINCT f.name, p.publisher_id FROM {self.table} f
+            JOIN {t['publishers']} p ON p.name = IFNULL(f.publisher, '')
+            WHERE f.name IS NOT NULL""")
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {t['installations']} (host_id, title_id, version, installDate, programSize, isNew)
+            SELECT h.host_id, ti.title_id, IFNULL(f.version, '0.0.0'), MAX(f.installDate), MAX(f.programSize),
+                   MAX(f.isNew)
+            FROM {self.table} f
+            JOIN {t['hosts']} h ON h.hostname = f.hostname
+            JOIN {t['publishers']} p ON p.name = IFNULL(f.publisher, '')
+            JOIN {t['titles']} ti ON ti.name = f.name AND ti.publisher_id = p.publisher_id
+            GROUP BY h.host_id, ti.title_id, IFNULL(f.version, '0.0.0')""")
+        return cursor.rowcount
+
+    def load_metadata_row(self, cursor):
+        row = cursor.execute("SELECT * FROM service_metadata LIMIT 1").fetchone()
+        if row is None:
+            return None
+        return {column[0]: value for column, value in zip(cursor.description, row)}
+
+    def _staged(self, alias="s"):
+        return f"""(SELECT name, version, MAX(publisher) AS publisher, MAX(installDate) AS installDate,
+                           MAX(programSize) AS programSize
+                    FROM {self.staging_table} WHERE hostname = ?
+                    GROUP BY name, version) AS {alias}"""
+
+    def write_snapshot(self, cursor, hostname):
+        """
+        Same result as the ``MERGE`` of ``MssqlBackend.write_snapshot``: duplicates of the append mode are removed,
+        vanished software is deleted, changed and formerly new rows are updated and new software is inserted with
+        ``isNew = 1``.
+        """
+        table = self.table
+        cursor.execute(f"""
+            DELETE FROM {table} WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (PARTITION BY name, version ORDER BY isNew DESC) AS rn
+                    FROM {table} WHERE hostname = ?
+                ) WHERE rn > 1)""", (hostname,))
+
+        cursor.execute(f"""
+            DELETE FROM {table} WHERE hostname = ? AND NOT EXISTS (
+                SELECT 1 FROM {self.staging_table} s
+                WHERE s.hostname = ? AND s.name = {table}.name AND s.version = {table}.version)""",
+                       (hostname, hostname))
+        deleted = cursor.rowcount
+
+        cursor.execute(f"""
+            UPDATE {table} SET publisher = s.publisher, installDate = s.installDate, programSize = s.programSize,
+                               isNew = 0
+            FROM {self._staged()}
+            WHERE {table}.hostname = ? AND {table}.name = s.name AND {table}.version = s.version
+              AND ({table}.isNew = 1 OR {table}.publisher IS NOT s.publisher
+                   OR {table}.installDate IS NOT s.installDate OR {table}.programSize IS NOT s.programSize)""",
+                       (hostname, hostname))
+        updated = cursor.rowcount
+
+        cursor.execute(f"""
+            INSERT INTO {table} (name, publisher, installDate, programSize, version, hostname, isNew)
+            SELECT s.name, s.publisher, s.installDate, s.programSize, s.version, ?, 1
+            FROM {self._staged()}
+            WHERE NOT EXISTS (SELECT 1 FROM {table} t
+                              WHERE t.hostname = ? AND t.name = s.name AND t.version = s.version)""",
+                       (hostname, hostname, hostname))
+        return cursor.rowcount, updated, deleted
+
+    def write_normalised(self, cursor, hostname):
+        t = self.schema_tables
+        cursor.execute(f"INSERT OR IGNORE INTO {t['hosts']} (hostname) VALUES (?)", (hostname,))
+        host_id = cursor.execute(f"SELECT host_id FROM {t['hosts']} WHERE hostname = ?", (hostname,)).fetchone()[0]
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {t['publishers']} (name)
+            SELECT DISTINCT publisher FROM {self.staging_table} WHERE hostname = ?""", (hostname,))
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {t['titles']} (name, publisher_id)
+            SELECT DISTINCT s.name, p.publisher_id FROM {self.staging_table} s
+            JOIN {t['publishers']} p ON p.name = s.publisher
+            WHERE s.hostname = ?""", (hostname,))
+
+        staged = f"""(SELECT ti.title_id, s.version, MAX(s.installDate) AS installDate,
+                             MAX(s.programSize) AS programSize
+                      FROM {self.staging_table} s
+                      JOIN {t['publishers']} p ON p.name = s.publisher
+                      JOIN {t['titles']} ti ON ti.name = s.name AND ti.publisher_id = p.publisher_id
+                      WHERE s.hostname = ?
+                      GROUP BY ti.title_id, s.version) AS s"""
+        installations = t['installations']
+        cursor.execute(f"""
+            DELETE FROM {installations} WHERE host_id = ? AND NOT EXISTS (
+                SELECT 1 FROM {staged}
+                WHERE s.title_id = {installations}.title_id AND s.version = {installations}.version)""",
+                       (host_id, hostname))
+        deleted = cursor.rowcount
+        cursor.execute(f"""
+            UPDATE {installations} SET installDate = s.installDate, programSize = s.programSize, isNew = 0
+            FROM {staged}
+            WHERE {installations}.host_id = ? AND {installations}.title_id = s.title_id
+              AND {installations}.version = s.version
+              AND ({installations}.isNew = 1 OR {installations}.installDate IS NOT s.installDate
+                   OR {installations}.programSize IS NOT s.programSize)""", (hostname, host_id))
+        updated = cursor.rowcount
+        cursor.execute(f"""
+            INSERT INTO {installations} (host_id, title_id, version, installDate, programSize, isNew)
+            SELECT ?, s.title_id, s.version, s.installDate, s.programSize, 1
+            FROM {staged}
+            WHERE NOT EXISTS (SELECT 1 FROM {installations} i
+                              WHERE i.host_id = ? AND i.title_id = s.title_id AND i.version = s.version)""",
+                       (host_id, hostname, host_id))
+        return cursor.rowcount, updated, deleted
+
+    def write_history(self, cursor, hostname, run_id):
+        history = self.history_table
+        cursor.execute(f"""
+            UPDATE {history} SET valid_to_run = ?
+            WHERE hostname = ? AND valid_to_run IS NULL AND NOT EXISTS (
+                SELECT 1 FROM {self._staged()}
+                WHERE s.name = {history}.name AND s.version = {history}.version
+                  AND s.publisher IS {history}.publisher AND s.installDate IS {history}.installDate
+                  AND s.programSize IS {history}.programSize)""", (run_id, hostname, hostname))
+        closed = cursor.rowcount
+        # Zweiter Schreibvorgang im selben Lauf: Einträge ohne Gültigkeitsdauer entfernen
+        cursor.execute(f"DELETE FROM {history} WHERE hostname = ? AND valid_from_run = ? AND valid_to_run = ?",
+                       (hostname, run_id, run_id))
+        cursor.execute(f"""
+            INSERT INTO {history} (hostname, name, publisher, installDate, programSize, version, valid_from_run)
+            SELECT ?, s.name, s.publisher, s.installDate, s.programSize, s.version, ?
+            FROM {self._staged()}
+            WHERE NOT EXISTS (SELECT 1 FROM {history} h
+                              WHERE h.hostname = ? AND h.valid_to_run IS NULL
+                                AND h.name = s.name AND h.version = s.version)""",
+                       (hostname, run_id, hostname, hostname))
+        return cursor.rowcount, closed
+
+    def start_run(self, cursor, now):
+        cursor.execute("UPDATE inventory_runs SET status = 'aborted' WHERE status = 'running'")
+        cursor.execute("INSERT INTO inventory_runs (started_at, status) VALUES (?, 'running')", (now,))
+        return cursor.lastrowid
+
+    def get_runs(self, cursor, limit):
+        return fetch_dicts(cursor, "SELECT run_id, started_at, finished_at, status, hosts FROM inventory_runs "
+                                   "ORDER BY run_id DESC LIMIT ?", [limit])
+
+    def prune_history(self, conn, keep_runs, batch_size):
+        cursor = conn.cursor()
+        row = cursor.execute("SELECT MIN(run_id) FROM (SELECT run_id FROM inventory_runs "
+                             "ORDER BY run_id DESC LIMIT ?)", (keep_runs,)).fetchone()
+        oldest_kept = row[0] if row else None
+        if oldest_kept is None:
+            return 0, 0, None
+
+        deleted = 0
+        while True:
+            cursor.execute(f"DELETE FROM {self.history_table} WHERE rowid IN ("
+                           f"SELECT rowid FROM {self.history_table} WHERE valid_to_run <= ? LIMIT ?)",
+                           (oldest_kept, batch_size))
+            count = cursor.rowcount
+            conn.commit()
+            deleted += count
+            if count < batch_size:
+                break
+
+        cursor.execute("DELETE FROM inventory_runs WHERE run_id < ?", (oldest_kept,))
+        runs = cursor.rowcount
+        conn.commit()
+        return deleted, runs, oldest_kept
+
+    def write_summary(self, cursor, source, counts):
+        cursor.execute("""
+            INSERT INTO inventory_summary (source, hosts, software, software_all, publisher, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (source) DO UPDATE SET
+                hosts = excluded.hosts, software = excluded.software, software_all = excluded.software_all,
+                publisher = excluded.publisher, updated_at = excluded.updated_at""",
+                       (source, counts['hosts'], counts['software'], counts['software_all'], counts['publisher'],
+                        counts['updated_at']))
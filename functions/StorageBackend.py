@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+import importlib
+import re
+from abc import ABC, abstractmethod
+
+# Engine -> Modul und Klasse, importiert erst bei Bedarf (pyodbc wird nur für mssql gebraucht)
+ENGINES = {
+    "mssql": ("functions.MssqlBackend", "MssqlBackend"),
+    "sqlite": ("functions.SqliteBackend", "SqliteBackend"),
+}
+
+# Spalten der Inventar-API, Sortier- und Filterspalten sowie der natürliche Schlüssel als Tie-Breaker
+INVENTORY_COLUMNS = ("hostname", "name", "version", "publisher", "installDate", "programSize")
+SORT_COLUMNS = ("hostname", "name", "publisher", "version", "installDate")
+FILTER_COLUMNS = ("hostname", "name", "publisher", "version")
+KEY_COLUMNS = ("hostname", "name", "publisher", "version")
+
+
+def check_table_name(table):
+    """
+    Ensures that ``table`` is a plain identifier, table names are inserted into the sql text
+
+    :param table:
+    :return: ``str`` table
+    """
+    if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', table):
+        raise ValueError(f"Invalid table name: {table}")
+    return table
+
+
+def normalised_table_names(table):
+    """
+    Names of the normalised tables and the flat view derived from the prod table name
+
+    :param table:
+    :return: ``dict`` with the keys hosts, publishers, titles, installations and view
+    """
+    check_table_name(table)
+    return {
+        'hosts': f"{table}_hosts",
+        'publishers': f"{table}_publishers",
+        'titles': f"{table}_titles",
+        'installations': f"{table}_installations",
+        'view': f"{table}_view",
+    }
+
+
+def inventory_order(sort):
+    """
+    Columns of the page order: ``sort`` followed by the natural key, which makes the order total
+
+    :param sort: one of ``SORT_COLUMNS``
+    :return: ``list``
+    """
+    return [sort] + [column for column in KEY_COLUMNS if column != sort]
+
+
+def escape_like(value):
+    """
+    Escapes the wildcards of ``LIKE`` (``[`` is one in sql server), to be used with ``ESCAPE '\\'``
+
+    :param value:
+    :return: ``str``
+    """
+    for char in ('\\', '%', '_', '['):
+        value = value.replace(char, '\\' + char)
+    return value
+
+
+def keyset_condition(order, after, descending):
+    """
+    Condition selecting the rows behind ``after`` in the order ``order``, without OFFSET.
+    NULL sorts first in both engines, so it is the smallest value ascending and the largest descending.
+
+    :param order: columns of the order
+    :param after: values of the last row of the previous page, same length as ``order``
+    :param descending:
+    :return: ``tuple`` (sql, params)
+    """
+    alternatives, params = [], []
+    for position, column in enumerate(order):
+        parts, part_params = [], []
+        for previous, value in zip(order[:position], after[:position]):
+            if value is None:
+                parts.append(f"{previous} IS NULL")
+            else:
+                parts.append(f"{previous} = ?")
+                part_params.append(value)
+        value = after[position]
+        if not descending:
+            if value is None:
+                parts.append(f"{column} IS NOT NULL")
+            else:
+                parts.append(f"{column} > ?")
+                part_params.append(value)
+        else:
+            if value is None:
+                # Nach NULL folgt absteigend nichts mehr in dieser Spalte
+                continue
+            parts.append(f"({column} < ? OR {column} IS NULL)")
+            part_params.append(value)
+        alternatives.append("(" + " AND ".join(parts) + ")")
+        params.extend(part_params)
+    if not alternatives:
+        return "1 = 0", []
+    return "(" + " OR ".join(alternatives) + ")", params
+
+
+def create_backend(engine, settings, table, batch_size):
+    """
+    Creates the storage backend of ``engine`` (``[db] engine``)
+
+    :param engine: ``mssql`` or ``sqlite``
+    :param settings: ``Settings``
+    :param table: prod table name
+    :param batch_size: rows per ``executemany`` call
+    :return: ``StorageBackend``
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Invalid engine '{engine}', expected one of {tuple(ENGINES)}")
+    module_name, class_name = ENGINES[engine]
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(settings, table, batch_size)
+
+
+class StorageBackend(ABC):
+    """
+    The sql of one database engine.
+
+    ``DatabaseManager`` owns the connections, transactions, logging and decisions (fingerprints, runs, caches) and
+    hands a cursor of its transaction to the backend. The backend only runs statements and never commits, except
+    ``prune_history`` which commits every chunk.
+
+    The methods implemented here use portable sql; engines override them where their dialect differs and
+    implement the abstract ones.
+    """
+    engine = None
+    schemas = ("flat", "normalised")
+    # Schema-Präfix der Tabellen in den Zählabfragen
+    schema_prefix = ""
+
+    def __init__(self, settings, table, batch_size):
+        self.table = check_table_name(table)
+        self.staging_table = f"{table}_staging"
+        self.history_table = f"{table}_history"
+        self.schema_tables = normalised_table_names(table)
+        self.batch_size = batch_size
+
+    @abstractmethod
+    def describe(self):
+        """
+        :return: ``str`` database shown in logs and messages
+        """
+
+    @abstractmethod
+    def connect(self):
+        """
+        Opens a new connection with autocommit off
+
+        :return: DB-API connection
+        """
+
+    # --- Schema ---
+
+    @abstractmethod
+    def create_tables(self, cursor, schema):
+        """
+        Creates the missing prod, staging, fingerprint, summary, run and history tables and, with
+        ``schema = normalised``, the normalised tables and their view
+        """
+
+    @abstractmethod
+    def create_metadata_table(self, cursor):
+        """
+        Creates ``service_metadata`` with its single row if it doesn't exist
+        """
+
+    @abstractmethod
+    def migrate_to_normalised(self, cursor, force):
+        """
+        Copies the flat prod table into the normalised tables
+
+        :return: ``int`` number of migrated installations, 0 if there was nothing to do
+        """
+
+    # --- service_metadata ---
+
+    @abstractmethod
+    def load_metadata_row(self, cursor):
+        """
+        :return: ``dict`` column -> value of the ``service_metadata`` row, ``None`` if the table is empty
+        """
+
+    def update_metadata(self, cursor, key, value):
+        cursor.execute(f"UPDATE service_metadata SET {key} = ? WHERE identifier = 1", (value,))
+
+    def insert_metadata(self, cursor, key, value):
+        cursor.execute(f"INSERT INTO service_metadata ({key}, identifier) VALUES (?, 1)", (value,))
+
+    # --- Schreibpfad ---
+
+    def read_fingerprint(self, cursor, hostname):
+        """
+        :return: ``str`` stored fingerprint of ``hostname`` or ``None``
+        """
+        row = cursor.execute("SELECT fingerprint FROM host_fingerprints WHERE hostname = ?", (hostname,)).fetchone()
+        return row[0] if row else None
+
+    def touch_fingerprint(self, cursor, hostname, now):
+        cursor.execute("UPDATE host_fingerprints SET last_seen = ? WHERE hostname = ?", (now, hostname))
+
+    def store_fingerprint(self, cursor, hostname, fingerprint, now, exists):
+        if exists:
+            cursor.execute(
+                "UPDATE host_fingerprints SET fingerprint = ?, last_seen = ?, last_changed = ? WHERE hostname = ?",
+                (fingerprint, now, now, hostname))
+        else:
+            cursor.execute(
+                "INSERT INTO host_fingerprints (hostname, fingerprint, last_seen, last_changed) VALUES (?, ?, ?, ?)",
+                (hostname, fingerprint, now, now))
+
+    def insert_rows(self, cursor, table, rows, hostname):
+        """
+        Inserts the normalised ``rows`` of ``hostname`` into ``table`` with ``isNew = True``, ``batch_size`` rows
+        per ``executemany`` call
+
+        :return: ``int`` number of rows
+        """
+        query = f"""
+                INSERT INTO {table} (name, publisher, installDate, programSize, version, hostname, isNew)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """
+        params = [(*row, hostname, True) for row in rows]  # isNew = True
+        for start in range(0, len(params), self.batch_size):
+            cursor.executemany(query, params[start:start + self.batch_size])
+        return len(params)
+
+    def load_staging(self, cursor, rows, hostname):
+        self.clear_staging(cursor, hostname)
+        self.insert_rows(cursor, self.staging_table, rows, hostname)
+
+    def clear_staging(self, cursor, hostname):
+        cursor.execute(f"DELETE FROM {self.staging_table} WHERE hostname = ?", (hostname,))
+
+    @abstractmethod
+    def write_snapshot(self, cursor, hostname):
+        """
+        Replaces the software of ``hostname`` in the prod table with its staged rows, see
+        ``DatabaseManager._write_host``
+
+        :return: ``tuple`` (inserted, updated, deleted)
+        """
+
+    @abstractmethod
+    def write_normalised(self, cursor, hostname):
+        """
+        Replaces the installations of ``hostname`` in the normalised schema with its staged rows
+
+        :return: ``tuple`` (inserted, updated, deleted)
+        """
+
+    # --- Historie ---
+
+    def has_open_history(self, cursor, hostname):
+        return cursor.execute(f"SELECT 1 FROM {self.history_table} WHERE hostname = ? AND valid_to_run IS NULL",
+                              (hostname,)).fetchone() is not None
+
+    @abstractmethod
+    def write_history(self, cursor, hostname, run_id):
+        """
+        Closes the open history entries of ``hostname`` that vanished or changed and adds the new staged software,
+        both tagged with ``run_id``
+
+        :return: ``tuple`` (added, closed)
+        """
+
+    @abstractmethod
+    def start_run(self, cursor, now):
+        """
+        Sets runs still marked as running to ``aborted`` and registers a new run
+
+        :return: ``int`` run id
+        """
+
+    def finish_run(self, cursor, run_id, now, status, hosts):
+        cursor.execute("UPDATE inventory_runs SET finished_at = ?, status = ?, hosts = ? WHERE run_id = ?",
+                       (now, status, hosts, run_id))
+
+    @abstractmethod
+    def get_runs(self, cursor, limit):
+        """
+        :return: ``list`` of ``dict`` the newest ``limit`` runs, newest first
+        """
+
+    def run_exists(self, cursor, run_id):
+        return cursor.execute("SELECT 1 FROM inventory_runs WHERE run_id = ?", (run_id,)).fetchone() is not None
+
+    def get_software_at_run(self, cursor, run_id, hostname=None):
+        query = f"""
+                SELECT name, publisher, installDate, programSize, version, hostname
+                FROM {self.history_table}
+                WHERE valid_from_run <= ? AND (valid_to_run IS NULL OR valid_to_run > ?)
+                """
+        params = [run_id, run_id]
+        if hostname:
+            query += " AND hostname = ?"
+            params.append(hostname)
+        return fetch_dicts(cursor, query + " ORDER BY hostname, name, version", params)
+
+    def diff_runs(self, cursor, from_run, to_run, hostname=None):
+        columns = "hostname, name, publisher, installDate, programSize, version, valid_from_run, valid_to_run"
+        host_filter = " AND hostname = ?" if hostname else ""
+        host_params = [hostname] if hostname else []
+        # Ohne Mengenvergleich: Beginn bzw. Ende der Gültigkeit liegt zwischen den beiden Läufen
+        added = fetch_dicts(cursor, f"""
+                SELECT {columns} FROM {self.history_table}
+                WHERE valid_from_run > ? AND valid_from_run <= ? AND (valid_to_run IS NULL OR valid_to_run > ?)
+                {host_filter} ORDER BY hostname, name, version
+                """, [from_run, to_run, to_run] + host_params)
+        removed = fetch_dicts(cursor, f"""
+                SELECT {columns} FROM {self.history_table}
+                WHERE valid_from_run <= ? AND valid_to_run > ? AND valid_to_run <= ?
+                {host_filter} ORDER BY hostname, name, version
+                """, [from_run, from_run, to_run] + host_params)
+        return {'added': added, 'removed': removed}
+
+    @abstractmethod
+    def prune_history(self, conn, keep_runs, batch_size):
+        """
+        Deletes the history only visible in runs older than the newest ``keep_runs`` runs, together with those
+        runs, in chunks of ``batch_size`` rows with one commit each
+
+        :return: ``tuple`` (deleted entries, deleted runs, oldest kept run id or ``None``)
+        """
+
+    # --- Inventar-API ---
+
+    # Begrenzung der Zeilenzahl nach dem ORDER BY, der Parameter ist die Seitengröße
+    limit_clause = " LIMIT ?"
+
+    def inventory_query(self, source, filters, sort, descending, after=None, run_id=None):
+        """
+        Query of the inventory in the order of ``inventory_order(sort)``, filtered and sorted by the database
+
+        :param source: prod table or view of the normalised schema
+        :param filters: ``dict`` column -> text the column has to contain, columns of ``FILTER_COLUMNS``
+        :param sort: one of ``SORT_COLUMNS``
+        :param descending:
+        :param after: values of the order columns of a row, only rows behind it are selected (keyset)
+        :param run_id: read the state after this run from the history table instead of ``source``
+        :return: ``tuple`` (sql, params)
+        """
+        order = inventory_order(sort)
+        where, params = [], []
+        if run_id is not None:
+            source = self.history_table
+            where.append("valid_from_run <= ? AND (valid_to_run IS NULL OR valid_to_run > ?)")
+            params.extend([run_id, run_id])
+        for column, value in filters.items():
+            where.append(f"{column} LIKE ? ESCAPE '\\'")
+            params.append(f"%{escape_like(value)}%")
+        if after is not None:
+            condition, condition_params = keyset_condition(order, after, descending)
+            where.append(condition)
+            params.extend(condition_params)
+        direction = "DESC" if descending else "ASC"
+        query = f"SELECT {', '.join(INVENTORY_COLUMNS)} FROM {self.schema_prefix}{source}"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY " + ", ".join(f"{column} {direction}" for column in order)
+        return query, params
+
+    def inventory_page(self, cursor, source, filters, sort, descending, after, limit):
+        """
+        One page of ``inventory_query`` starting behind the row ``after``, so every page costs the same however
+        deep it is
+
+        :param limit: maximum number of rows
+        :return: ``list`` of ``dict``
+        """
+        query, params = self.inventory_query(source, filters, sort, descending, after)
+        return fetch_dicts(cursor, query + self.limit_clause, params + [limit])
+
+    # --- Dashboard ---
+
+    def count_inventory(self, cursor, schema):
+        """
+        Full counts over the inventory: hosts, distinct software names, installations and publishers
+
+        :return: ``dict``
+        """
+        prefix = self.schema_prefix
+        if schema == "normalised":
+            t = self.schema_tables
+            count_queries = {
+                'hosts': f"SELECT COUNT(DISTINCT host_id) FROM {prefix}{t['installations']}",
+                'software': f"SELECT COUNT(DISTINCT name) FROM {prefix}{t['titles']}",
+                'software_all': f"SELECT COUNT(*) FROM {prefix}{t['installations']}",
+                'publisher': f"SELECT COUNT(*) FROM {prefix}{t['publishers']}",
+            }
+        else:
+            count_queries = {
+                'hosts': f"SELECT COUNT(DISTINCT hostname) FROM {prefix}{self.table}",
+                'software': f"SELECT COUNT(DISTINCT name) FROM {prefix}{self.table}",
+                'software_all': f"SELECT COUNT(name) FROM {prefix}{self.table}",
+                'publisher': f"SELECT COUNT(DISTINCT publisher) FROM {prefix}{self.table}",
+            }
+        return {key: cursor.execute(query).fetchone()[0] for key, query in count_queries.items()}
+
+    def read_summary(self, cursor, source):
+        """
+        :return: ``dict`` stored counts of ``source`` with ``updated_at``, ``None`` without a summary row
+        """
+        row = cursor.execute("SELECT hosts, software, software_all, publisher, updated_at FROM inventory_summary "
+                             "WHERE source = ?", (source,)).fetchone()
+        if row is None:
+            return None
+        return {'hosts': row[0], 'software': row[1], 'software_all': row[2], 'publisher': row[3],
+                'updated_at': row[4]}
+
+    @abstractmethod
+    def write_summary(self, cursor, source, counts):
+        """
+        Stores ``counts`` (see ``count_inventory``) as summary row of ``source``
+        """
+
+
+def fetch_dicts(cursor, query, params=()):
+    """
+    Runs ``query`` and returns the rows as ``dict`` column -> value
+
+    :param cursor:
+    :param query:
+    :param params:
+    :return: ``list`` of ``dict``
+    """
+    cursor.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+import warnings
+from base64 import b64encode
+from contextlib import contextmanager
+
+import winrm
+
+DEFAULT_MAX_SESSIONS = 64
+DEFAULT_IDLE_TIMEOUT = 300
+
+
+class PooledShell:
+    """
+    An open remote shell on one host together with its ``winrm.Session``.
+
+    The session's transport keeps the HTTP connection (and with it the NTLM authentication) alive, the shell is
+    reused for every command until it is evicted. A shell is only ever used by the thread that checked it out.
+    """
+
+    def __init__(self, host, session):
+        self.host = host
+        self.session = session
+        self.shell_id = session.protocol.open_shell()
+        self.created = time.monotonic()
+        self.last_used = self.created
+        # True, wenn die Shell schon einmal im Pool lag - der Server kann sie inzwischen geschlossen haben
+        self.reused = False
+
+    def run_ps(self, script):
+        """
+        Same as ``winrm.Session.run_ps``, but in the already open shell
+
+        :param script:
+        :return: ``winrm.Response``
+        """
+        protocol = self.session.protocol
+        encoded_ps = b64encode(script.encode('utf_16_le')).decode('ascii')
+        command_id = protocol.run_command(self.shell_id, f"powershell -encodedcommand {encoded_ps}")
+        try:
+            rs = winrm.Response(protocol.get_command_output(self.shell_id, command_id))
+        finally:
+            protocol.cleanup_command(self.shell_id, command_id)
+        if len(rs.std_err):
+            rs.std_err = self.session._clean_error_msg(rs.std_err)
+        self.last_used = time.monotonic()
+        return rs
+
+    def close(self):
+        try:
+            self.session.protocol.close_shell(self.shell_id)
+        except Exception as e:
+            logging.debug(f"Closing WinRM shell on {self.host} failed: {e}")
+
+
+class WinRMSessionPool:
+    """
+    Pool of open WinRM shells, keyed by host.
+
+    ``max_sessions`` caps the number of shells over all hosts; if the cap is reached the least recently used idle
+    shell is closed, or the caller waits until a shell is returned. Shells idle for more than ``idle_timeout``
+    seconds are closed by a background reaper.
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._count = 0
+        self._cond = threading.Condition()
+        self._reaper = None
+
+    def configure(self, max_sessions=None, idle_timeout=None):
+        with self._cond:
+            if max_sessions is not None:
+                self.max_sessions = max(1, max_sessions)
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+            self._cond.notify_all()
+
+    @contextmanager
+    def shell(self, host, user, pwd, transport='ntlm', reuse=True, **session_kwargs):
+        """
+        Checks out a shell for ``host``, opens a new one if none is idle.
+        A shell that raised an error is closed instead of being returned to the pool.
+
+        :param host:
+        :param user:
+        :param pwd:
+        :param transport:
+        :param reuse: ``False`` always opens a new shell, e.g. to retry after a pooled shell went stale
+        :param session_kwargs: passed on to ``winrm.Session``
+        """
+        pooled = self._checkout(host, reuse)
+        if pooled is None:
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    pooled = PooledShell(host, winrm.Session(target=host, auth=(user, pwd), transport=transport,
+                                                             **session_kwargs))
+            except Exception as e:
+                self._release_slot()
+                logging.error(f"WinRM connection error to {host}: {str(e)}")
+                raise ConnectionError(f"WinRM connection failed: {str(e)}")
+        try:
+            yield pooled
+        except BaseException:
+            pooled.close()
+            self._release_slot()
+            raise
+        self._checkin(pooled)
+
+    def evict_idle(self, max_idle=None):
+        """
+        Closes all shells idle for longer than ``max_idle`` (default ``idle_timeout``) seconds
+
+        :param max_idle:
+        :return: ``int`` number of closed shells
+        """
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            for host in list(self._idle):
+                keep = [pooled for pooled in self._idle[host] if now - pooled.last_used <= max_idle]
+                expired += [pooled for pooled in self._idle[host] if now - pooled.last_used > max_idle]
+                if keep:
+                    self._idle[host] = keep
+                else:
+                    del self._idle[host]
+            self._count -= len(expired)
+            self._cond.notify_all()
+        for pooled in expired:
+            pooled.close()
+        return len(expired)
+
+    def close_all(self):
+        return self.evict_idle(max_idle=-1)
+
+    def stats(self):
+        with self._cond:
+            idle = sum(len(shells) for shells in self._idle.values())
+            return {'open': self._count, 'idle': idle, 'in_use': self._count - idle, 'hosts': len(self._idle)}
+
+    def _checkout(self, host, reuse=True):
+        """
+        Returns an idle shell of ``host`` or reserves a slot for a new one (then ``None`` is returned)
+        """
+        evicted = None
+        with self._cond:
+            while True:
+                shells = self._idle.get(host) if reuse else None
+                if shells:
+                    pooled = shells.pop()
+                    if not shells:
+                        del self._idle[host]
+                    pooled.reused = True
+                    return pooled
+                if self._count < self.max_sessions:
+                    self._count += 1
+                    break
+                evicted = self._pop_lru()
+                if evicted is not None:
+                    break
+                self._cond.wait()
+            self._start_reaper()
+        if evicted is not None:
+            # Slot des verdrängten Shells wird für den neuen Host weiterverwendet
+            evicted.close()
+        return None
+
+    def _checkin(self, pooled):
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.setdefault(pooled.host, []).append(pooled)
+            self._cond.notify()
+
+    def _release_slot(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+    def _pop_lru(self):
+        oldest_host, oldest = None, None
+        for host, shells in self._idle.items():
+            for pooled in shells:
+                if oldest is None or pooled.last_used < oldest.last_used:
+                    oldest_host, oldest = host, pooled
+        if oldest is None:
+            return None
+        self._idle[oldest_host].remove(oldest)
+        if not self._idle[oldest_host]:
+            del self._idle[oldest_host]
+        return oldest
+
+    def _start_reaper(self):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap, name="winrm_pool_reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1, self.idle_timeout / 2))
+            self.evict_idle()
+            with self._cond:
+                if self._count == 0:
+                    self._reaper = None
+                    return
+
+
+# Gemeinsamer Pool für alle SoftwareInventoryWinRM-Instanzen
+winrm_pool = WinRMSessionPool()
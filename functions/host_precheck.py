@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from datetime import datetime
+
+from functions.HostStateCache import host_state
+
+DEFAULT_PORTS = (5985, 5986)
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_CONCURRENCY = 256
+MAX_SKIP_RUNS = 8
+
+
+async def probe_port(hostname, port, timeout):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(hostname, port), timeout=timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def probe_host(hostname, ports=DEFAULT_PORTS, timeout=DEFAULT_TIMEOUT, retries=0, backoff=0.5):
+    """
+    Tries to open a TCP connection to one of the WinRM ``ports`` of ``hostname``.
+    Retries ``retries`` times, waiting ``backoff`` seconds (doubled per attempt) in between.
+
+    :return: first open port or ``None``
+    """
+    for attempt in range(retries + 1):
+        for port in ports:
+            if await probe_port(hostname, port, timeout):
+                return port
+        if attempt < retries:
+            await asyncio.sleep(backoff * 2 ** attempt)
+    return None
+
+
+def probe_hosts(hostnames, ports=DEFAULT_PORTS, timeout=DEFAULT_TIMEOUT, retries=0, backoff=0.5,
+                concurrency=DEFAULT_CONCURRENCY):
+    """
+    Probes all ``hostnames`` concurrently. The whole phase takes about as long as the slowest host,
+    at most ``(retries + 1) * len(ports) * timeout`` plus the backoff.
+
+    :return: ``dict`` hostname -> open port or ``None``
+    """
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def probe(hostname):
+            async with semaphore:
+                return hostname, await probe_host(hostname, ports, timeout, retries, backoff)
+
+        return dict(await asyncio.gather(*(probe(hostname) for hostname in hostnames)))
+
+    return asyncio.run(run())
+
+
+def precheck_hosts(hostnames, ports=DEFAULT_PORTS, timeout=DEFAULT_TIMEOUT, retries=0, backoff=0.5,
+                   breaker_threshold=3, breaker_skip_runs=1):
+    """
+    Pre-flight phase of an inventory run: sorts out hosts that cannot be reached on WinRM.
+
+    Every host has a circuit breaker in ``host_state``. After ``breaker_threshold`` failed runs in a row the
+    breaker opens and the host is not even probed for the next ``breaker_skip_runs`` runs; each further failure
+    doubles that (up to ``MAX_SKIP_RUNS``). Once the skip runs are used up the host is probed again, a success
+    closes the breaker.
+
+    :return: ``tuple`` (reachable hostnames in input order, ``dict`` of skipped hostname -> reason)
+    """
+    now = datetime.now().isoformat(timespec='seconds')
+    skipped = {}
+    to_probe = []
+    for hostname in hostnames:
+        skip_runs_left = host_state.get(hostname).get("skip_runs_left", 0)
+        if skip_runs_left > 0:
+            host_state.update(hostname, skip_runs_left=skip_runs_left - 1, last_status="skipped")
+            skipped[hostname] = f"circuit breaker open, {skip_runs_left - 1} more run(s) skipped"
+        else:
+            to_probe.append(hostname)
+
+    results = probe_hosts(to_probe, ports, timeout, retries, backoff) if to_probe else {}
+
+    reachable = []
+    for hostname in to_probe:
+        port = results.get(hostname)
+        if port is not None:
+            host_state.update(hostname, failures=0, last_status="reachable", port=port, last_probe=now)
+            reachable.append(hostname)
+            continue
+
+        failures = host_state.get(hostname).get("failures", 0) + 1
+        fields = {"failures": failures, "last_status": "unreachable", "last_probe": now}
+        if failures >= breaker_threshold:
+            fields["skip_runs_left"] = min(MAX_SKIP_RUNS, breaker_skip_runs * 2 ** (failures - breaker_threshold))
+            logging.warning(f"{hostname} unreachable {failures} times in a row, "
+                            f"skipping it for {fields['skip_runs_left']} run(s)")
+        host_state.update(hostname, **fields)
+        skipped[hostname] = f"WinRM ports {', '.join(map(str, ports))} not reachable"
+
+    return reachable, skipped
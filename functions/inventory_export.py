@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+import zlib
+
+from functions.StorageBackend import INVENTORY_COLUMNS
+
+# Format -> Content-Type und Dateiendung
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+def csv_chunks(row_chunks, columns=INVENTORY_COLUMNS):
+    """
+    Encodes the row chunks as CSV, one output chunk per row chunk plus the header
+
+    :param row_chunks: iterable of ``list`` of row tuples, e.g. ``DatabaseManager.export_inventory``
+    :param columns: header line
+    :return: generator of ``bytes``
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in row_chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Header auch ohne Zeilen ausgeben
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(row_chunks, columns=INVENTORY_COLUMNS):
+    """
+    Encodes the row chunks as one JSON object per line, dates as ISO text
+
+    :param row_chunks: iterable of ``list`` of row tuples
+    :param columns: keys of the objects
+    :return: generator of ``bytes``
+    """
+    for rows in row_chunks:
+        lines = [json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False) for row in rows]
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compresses a stream of chunks into one gzip file without holding more than one chunk
+
+    :param chunks: iterable of ``bytes``
+    :param level: compression level 1-9
+    :return: generator of ``bytes``
+    """
+    # wbits 31: gzip-Header und -Prüfsumme statt zlib
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(row_chunks, export_format, compress=False):
+    """
+    Encodes the row chunks in ``export_format`` and optionally compresses them
+
+    :param row_chunks: iterable of ``list`` of row tuples
+    :param export_format: ``csv`` or ``ndjson``
+    :param compress: gzip
+    :return: ``tuple`` (generator of ``bytes``, content type, file extension)
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid export format '{export_format}', expected one of {tuple(EXPORT_FORMATS)}")
+    content_type, extension = EXPORT_FORMATS[export_format]
+    chunks = csv_chunks(row_chunks) if export_format == "csv" else ndjson_chunks(row_chunks)
+    if compress:
+        return gzip_chunks(chunks), "application/gzip", f"{extension}.gz"
+    return chunks, content_type, extension
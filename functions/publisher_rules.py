@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import csv
+import logging
+import os
+import threading
+from collections import deque
+from functools import lru_cache
+
+DEFAULT_RULES_FILE = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "publisher_rules.csv"))
+PUBLISHER_CACHE_SIZE = 8192
+
+# Fallback ohne Regeldatei, entspricht der bisherigen fest codierten Vereinheitlichung
+BUILTIN_RULES = (
+    ("Interflex", "Interflex Datensysteme GmbH & Co. KG", False),
+    ("Microsoft", "Microsoft Corporation", False),
+)
+
+_matcher_lock = threading.Lock()
+_matcher_cache = {}
+
+
+class PublisherMatcher:
+    """
+    Canonicalises publisher names with a rule table of (pattern, canonical name, ignore case).
+
+    A publisher containing a pattern is replaced by the canonical name of that rule; if several patterns occur,
+    the rule listed first wins. All patterns are compiled into one Aho-Corasick automaton (one for the
+    case-sensitive and one for the case-insensitive rules), so a publisher is scanned once no matter how many rules
+    there are. Results are memoised per raw publisher string.
+    """
+
+    def __init__(self, rules, cache_size=PUBLISHER_CACHE_SIZE):
+        self.rules = [(pattern, canonical, bool(ignore_case)) for pattern, canonical, ignore_case in rules if pattern]
+        self._exact = _Automaton([(pattern, priority) for priority, (pattern, _, ignore_case)
+                                  in enumerate(self.rules) if not ignore_case])
+        self._folded = _Automaton([(pattern.casefold(), priority) for priority, (pattern, _, ignore_case)
+                                   in enumerate(self.rules) if ignore_case])
+        self.canonicalise = lru_cache(maxsize=cache_size)(self._canonicalise)
+
+    def _canonicalise(self, publisher):
+        """
+        :param publisher:
+        :return: ``str`` canonical name, or ``publisher`` itself if no rule matches
+        """
+        best = self._exact.first_match(publisher)
+        folded = self._folded.first_match(publisher.casefold())
+        if folded is not None and (best is None or folded < best):
+            best = folded
+        return publisher if best is None else self.rules[best][1]
+
+    def cache_info(self):
+        return self.canonicalise.cache_info()
+
+
+class _Automaton:
+    """
+    Aho-Corasick automaton returning the lowest priority of all patterns occurring in a text
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._best = [None]
+        for pattern, priority in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._best.append(None)
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._best[state] = _lowest(self._best[state], priority)
+
+        # Fehler-Links per Breitensuche, die beste Priorität wird entlang der Links vererbt
+        self._fail = [0] * len(self._goto)
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self._goto[state].items():
+                pending.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._best[child] = _lowest(self._best[child], self._best[self._fail[child]])
+
+    def first_match(self, text):
+        if len(self._goto) == 1:
+            return None
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found = None
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if best[state] is not None:
+                found = _lowest(found, best[state])
+                if found == 0:
+                    break
+        return found
+
+
+def _lowest(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def load_rules(rules_file):
+    """
+    Reads the rule table, a CSV file with the columns ``pattern``, ``canonical`` and optional ``ignore_case``.
+    Empty lines and lines starting with ``#`` are skipped.
+
+    :param rules_file:
+    :return: ``list`` of (pattern, canonical, ignore_case)
+    """
+    rules = []
+    with open(rules_file, newline='', encoding="utf-8") as csvfile:
+        lines = (line for line in csvfile if line.strip() and not line.lstrip().startswith('#'))
+        for row in csv.DictReader(lines):
+            pattern = (row.get('pattern') or '').strip()
+            canonical = (row.get('canonical') or '').strip()
+            if not pattern or not canonical:
+                continue
+            ignore_case = (row.get('ignore_case') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+            rules.append((pattern, canonical, ignore_case))
+    return rules
+
+
+def get_publisher_matcher(rules_file=None):
+    """
+    Returns the compiled matcher of ``rules_file`` (default ``config/publisher_rules.csv``).
+    The matcher is rebuilt when the file changes; without a file the built-in rules are used.
+
+    :param rules_file:
+    :return: ``PublisherMatcher``
+    """
+    rules_file = rules_file or DEFAULT_RULES_FILE
+    try:
+        mtime = os.path.getmtime(rules_file)
+    except OSError:
+        mtime = None
+
+    with _matcher_lock:
+        cached = _matcher_cache.get(rules_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        if mtime is None:
+            logging.warning(f"Publisher rule file {rules_file} not found, using the built-in rules")
+            rules = BUILTIN_RULES
+        else:
+            try:
+                rules = load_rules(rules_file)
+            except Exception as e:
+                logging.error(f"Reading publisher rules from {rules_file} failed, using the built-in rules: {e}")
+                rules = BUILTIN_RULES
+        matcher = PublisherMatcher(rules)
+        _matcher_cache[rules_file] = (mtime, matcher)
+        return matcher
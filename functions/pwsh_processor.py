@@ -1,68 +1,556 @@
 # -*-coding: utf-8 -*-
-import json
+import asyncio
 import csv
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
+from config.config_manager import get_settings
 from functions.DatabaseManager import DatabaseManager
+from functions.DatabaseWriter import DatabaseWriter, DEFAULT_BATCH_HOSTS, DEFAULT_MAX_DELAY, DEFAULT_QUEUE_SIZE
+from functions.HostStateCache import host_state
+from functions.host_precheck import precheck_hosts
+from functions.PayloadArchive import PayloadArchive, DEFAULT_ARCHIVE_DIR
+from functions.ProgressBroadcaster import progress_broadcaster
 from functions.SoftwareInventoryWinRM import SoftwareInventoryWinRM
+from functions.software_normaliser import normaliser_stats
+from functions.WinRMSessionPool import winrm_pool, DEFAULT_MAX_SESSIONS, DEFAULT_IDLE_TIMEOUT
 from vars import global_vars
 
 db_instance: DatabaseManager = DatabaseManager()
 
-def process_csv(db_inst):
+# Defaults, falls die Sektion [inventory] in der config.ini fehlt
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_HOST_TIMEOUT = 120
+DEFAULT_ASYNC_CONCURRENCY = 256
+# Erwartete Dauer in Sekunden für Hosts ohne Historie, solange gar keine Messwerte vorliegen
+DEFAULT_HOST_DURATION = 30.0
+# Gewichtung des letzten Laufs im gleitenden Mittel der Host-Dauer
+DURATION_SMOOTHING = 0.5
+COLLECTION_MODES = ("threads", "async")
+
+
+def read_hostnames():
+    """
+    Reads all hostnames from ``csv/hosts.csv`` in file order
+
+    :return: ``list``
+    """
     hosts_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "csv", "hosts.csv"))
-    first = True
     with open(hosts_dir, newline='', encoding="utf-8") as csvfile:
         reader = csv.DictReader(csvfile)
-        for row in reader:
-            if first:
-                first = False
+        return [row['hostname'] for row in reader if row.get('hostname')]
+
+
+def get_inventory_config(db_inst):
+    """
+    Reads the collection settings from the ``[inventory]`` section of the config file.
+
+    ``mode`` collection backend, ``threads`` (pywinrm in a worker pool) or ``async`` (asyncio WS-Man client)\n
+    ``max_workers`` maximum number of hosts processed in parallel (1 = sequential)\n
+    ``host_timeout`` deadline in seconds for a single host, measured from its start\n
+    ``async_concurrency`` maximum number of hosts in flight in ``async`` mode\n
+    ``winrm_scheme`` ``http`` (5985) or ``https`` (5986) for the ``async`` mode\n
+    ``winrm_verify_ssl`` validate the server certificate with ``https``\n
+    ``winrm_pool_size`` maximum number of open WinRM shells over all hosts\n
+    ``winrm_idle_timeout`` seconds after which an unused pooled shell is closed\n
+    ``archive_payloads`` additionally write every software list gzip-compressed to ``archive_dir``\n
+    ``precheck`` probe the WinRM port of the collector (see ``collector_port``) on all hosts before the collection
+    and skip unreachable ones\n
+    ``precheck_timeout``, ``precheck_retries``, ``precheck_backoff`` probe settings\n
+    ``breaker_threshold`` failed runs in a row after which a host is skipped for ``breaker_skip_runs`` runs\n
+    ``group_commit`` write the results through a ``DatabaseWriter``, ``commit_hosts`` hosts or ``commit_interval``
+    seconds per transaction, at most ``write_queue_size`` hosts waiting
+
+    :param db_inst:
+    :return: ``dict``
+    """
+    settings = get_settings(db_inst.config_file)
+    mode = settings.get('inventory', 'mode', fallback=COLLECTION_MODES[0])
+    if mode not in COLLECTION_MODES:
+        raise ValueError(f"Invalid collection mode '{mode}', expected one of {COLLECTION_MODES}")
+    return {
+        'mode': mode,
+        'max_workers': max(1, settings.getint('inventory', 'max_workers', fallback=DEFAULT_MAX_WORKERS)),
+        'host_timeout': settings.getfloat('inventory', 'host_timeout', fallback=DEFAULT_HOST_TIMEOUT),
+        'async_concurrency': max(1, settings.getint('inventory', 'async_concurrency',
+                                                    fallback=DEFAULT_ASYNC_CONCURRENCY)),
+        'winrm_scheme': settings.get('inventory', 'winrm_scheme', fallback='http'),
+        'winrm_verify_ssl': settings.getboolean('inventory', 'winrm_verify_ssl', fallback=True),
+        'winrm_pool_size': settings.getint('inventory', 'winrm_pool_size', fallback=DEFAULT_MAX_SESSIONS),
+        'winrm_idle_timeout': settings.getfloat('inventory', 'winrm_idle_timeout', fallback=DEFAULT_IDLE_TIMEOUT),
+        'archive_payloads': settings.getboolean('inventory', 'archive_payloads', fallback=False),
+        'archive_dir': settings.get('inventory', 'archive_dir', fallback=None) or DEFAULT_ARCHIVE_DIR,
+        'precheck': settings.getboolean('inventory', 'precheck', fallback=True),
+        'precheck_timeout': settings.getfloat('inventory', 'precheck_timeout', fallback=1.0),
+        'precheck_retries': settings.getint('inventory', 'precheck_retries', fallback=1),
+        'precheck_backoff': settings.getfloat('inventory', 'precheck_backoff', fallback=0.5),
+        'breaker_threshold': max(1, settings.getint('inventory', 'breaker_threshold', fallback=3)),
+        'breaker_skip_runs': max(1, settings.getint('inventory', 'breaker_skip_runs', fallback=1)),
+        'group_commit': settings.getboolean('inventory', 'group_commit', fallback=True),
+        'commit_hosts': settings.getint('inventory', 'commit_hosts', fallback=DEFAULT_BATCH_HOSTS),
+        'commit_interval': settings.getfloat('inventory', 'commit_interval', fallback=DEFAULT_MAX_DELAY),
+        'write_queue_size': settings.getint('inventory', 'write_queue_size', fallback=DEFAULT_QUEUE_SIZE),
+    }
+
+
+def progress_state():
+    """
+    Progress of the current run as shown on the progress page, the caller holds ``processed_hosts_lock``
+
+    :return: ``dict``
+    """
+    start_time = global_vars.inventory_start_time
+    return {
+        'is_running': global_vars.is_running,
+        'total_hosts': global_vars.total_hosts,
+        'processed_hosts': global_vars.processed_hosts,
+        'start_time': start_time.strftime("%Y-%m-%d %H:%M:%S") if start_time else None,
+        'eta_seconds': global_vars.estimate_eta_seconds(),
+    }
+
+
+def publish_progress(event, **fields):
+    """
+    Sends the current progress plus ``fields`` to all viewers of the progress page
+
+    :param event: ``host`` or ``run``
+    :param fields:
+    :return:
+    """
+    with global_vars.processed_hosts_lock:
+        progress_broadcaster.publish(event, dict(progress_state(), **fields))
+
+
+def report_progress(db_inst, hostname, status="ok"):
+    """
+    Counts ``hostname`` as processed and pushes a ``host`` event to the progress page
+
+    :param db_inst:
+    :param hostname:
+    :param status: ``ok``, ``failed``, ``timeout`` or ``skipped``
+    :return:
+    """
+    # Host-Zähler nach jeder Verarbeitung erhöhen
+    with global_vars.processed_hosts_lock:
+        global_vars.processed_hosts += 1
+        global_vars.host_predictions.pop(hostname, None)
+        print(f"{db_inst.get_logprint_info()} Verarbeiteter Host: {hostname} ({global_vars.processed_hosts}/{global_vars.total_hosts}) "
+              f"- {status}")
+        # Unter der Sperre, damit die Ereignisse in der Reihenfolge der Zählerstände ankommen
+        progress_broadcaster.publish("host", dict(progress_state(), hostname=hostname, status=status))
+
+
+def track_write(db_inst, hostname, write):
+    """
+    Checks the queued write of ``hostname`` once its batch is committed. ``report_progress`` has counted the host
+    as ``ok`` when it was queued, a failed write sends a second ``host`` event with status ``failed`` (without
+    counting the host again).
+
+    :param db_inst:
+    :param hostname:
+    :param write: ``Future`` returned by ``DatabaseWriter.submit`` or ``None``
+    :return:
+    """
+    if write is None:
+        return
+
+    def done(future):
+        if future.cancelled():
+            # Vom Writer verworfen, der Host ist bereits als timeout gemeldet
+            return
+        error = future.exception()
+        if error is not None:
+            db_inst.logger.error(f"Writing the software of {hostname} failed: {error}")
+            publish_progress("host", hostname=hostname, status="failed", error=str(error))
+
+    write.add_done_callback(done)
+
+
+def process_csv(db_inst, max_workers=None, host_timeout=None, mode=None):
+    """
+    Collects the software inventory of every host in ``csv/hosts.csv``.
+
+    With ``max_workers`` > 1 the hosts are processed by a bounded worker pool. The run then takes roughly as long
+    as the slowest host instead of the sum of all hosts. ``mode='async'`` uses the asyncio collector instead,
+    which keeps thousands of hosts in flight without one OS thread each. Values not given are read from the
+    config file.
+
+    :param db_inst:
+    :param max_workers:
+    :param host_timeout:
+    :param mode:
+    :return:
+    """
+    inventory_config = get_inventory_config(db_inst)
+    if max_workers is None:
+        max_workers = inventory_config['max_workers']
+    if host_timeout is None:
+        host_timeout = inventory_config['host_timeout']
+    if mode is None:
+        mode = inventory_config['mode']
+
+    hostnames = read_hostnames()
+    # Mindestens ein Shell pro Worker, sonst warten die Worker aufeinander
+    winrm_pool.configure(max_sessions=max(max_workers, inventory_config['winrm_pool_size']),
+                         idle_timeout=inventory_config['winrm_idle_timeout'])
+    archive = PayloadArchive(inventory_config['archive_dir']) if inventory_config['archive_payloads'] else None
+    # Sammeln und Schreiben überlappen, mehrere Hosts pro Transaktion
+    writer = None
+    if inventory_config['group_commit']:
+        writer = DatabaseWriter(db_inst, batch_hosts=inventory_config['commit_hosts'],
+                                max_delay=inventory_config['commit_interval'],
+                                queue_size=inventory_config['write_queue_size'])
+
+    # Lauf-ID für die Historie, alle in diesem Lauf geschriebenen Änderungen werden damit markiert
+    run_id = db_inst.start_run()
+    run_status = "failed"
+    publish_progress("run", status="running", run_id=run_id)
+
+    try:
+        if inventory_config['precheck']:
+            hostnames = precheck(hostnames, db_inst, inventory_config)
+
+        if mode == "async":
+            parallelism = inventory_config['async_concurrency']
+        else:
+            parallelism = max_workers
+        hostnames = plan_hosts(hostnames, parallelism)
+
+        if mode == "async":
+            process_async(hostnames, db_inst, inventory_config['async_concurrency'], host_timeout,
+                          scheme=inventory_config['winrm_scheme'], verify_ssl=inventory_config['winrm_verify_ssl'],
+                          archive=archive, writer=writer)
+        elif max_workers <= 1:
+            for hostname in hostnames:
+                write = None
+                try:
+                    status, write = process_host(hostname, db_inst, archive=archive, writer=writer)
+                except Exception as e:
+                    status = "failed"
+                    print(f"{db_inst.get_logprint_error()} Fehler bei Host {hostname}: {e}")
+                report_progress(db_inst, hostname, status)
+                track_write(db_inst, hostname, write)
+        else:
+            process_concurrent(hostnames, db_inst, max_workers, host_timeout, archive=archive, writer=writer)
+        run_status = "finished"
+    finally:
+        if writer is not None:
+            # Alle Schreib-Futures sind danach erfüllt, fehlgeschlagene Hosts hat track_write gemeldet
+            stats = writer.close()
+            print(f"{db_inst.get_logprint_info()} {stats['hosts']} Hosts in {stats['batches']} Transaktionen "
+                  f"geschrieben, Ø {stats['avg_batch_time']:.3f}s pro Batch, "
+                  f"{stats['backpressure_time']:.1f}s auf die Datenbank gewartet")
+            if stats['failed']:
+                db_inst.logger.error(f"{stats['failed']} of {stats['hosts']} hosts could not be written")
+                print(f"{db_inst.get_logprint_error()} {stats['failed']} von {stats['hosts']} Hosts konnten nicht "
+                      f"geschrieben werden")
+        # Erst nach dem Leeren der Schreib-Warteschlange, sonst fehlt den letzten Hosts die Lauf-ID
+        try:
+            db_inst.finish_run(run_id, run_status, global_vars.processed_hosts)
+        except Exception as e:
+            db_inst.logger.error(f"Finishing inventory run {run_id} failed: {e}")
+        names = normaliser_stats(db_inst.publisher_rules)['names']
+        db_inst.logger.info(f"Name normaliser cache: {names['hits']} hits, {names['misses']} misses "
+                            f"({names['hit_rate']:.1%}), {names['size']}/{names['maxsize']} entries")
+        with global_vars.processed_hosts_lock:
+            global_vars.host_predictions = {}
+        # is_running setzen die Aufrufer erst danach zurück, die Seite soll das Ende aber sofort zeigen
+        publish_progress("run", status=run_status, run_id=run_id, is_running=False)
+        if archive is not None:
+            archive.close()
+        # Erkannte Host-Fähigkeiten für den nächsten Lauf sichern
+        try:
+            host_state.save()
+        except Exception as e:
+            db_inst.logger.error(f"Saving host state cache failed: {e}")
+
+
+def record_timings(hostname, timings, total):
+    """
+    Stores the phase durations of ``hostname`` (connect, script, insert) and updates its smoothed total
+    duration, which ``plan_hosts`` uses in the following runs.
+
+    :param hostname:
+    :param timings:
+    :param total:
+    :return:
+    """
+    previous = host_state.get(hostname).get("duration")
+    duration = total if previous is None else DURATION_SMOOTHING * total + (1 - DURATION_SMOOTHING) * previous
+    host_state.update(hostname, duration=round(duration, 3),
+                      timings={phase: round(seconds, 3) for phase, seconds in timings.items()})
+
+
+def plan_hosts(hostnames, parallelism):
+    """
+    Orders the hosts longest expected duration first (LPT scheduling), so a slow host doesn't start last
+    and stretch the end of the run. Hosts without history get the average of the known ones.
+    Also publishes the expected durations for the ETA in ``global_vars``.
+
+    :param hostnames:
+    :param parallelism: number of hosts processed at the same time
+    :return: ``list``
+    """
+    known = {hostname: host_state.get(hostname).get("duration") for hostname in hostnames}
+    known = {hostname: duration for hostname, duration in known.items() if duration is not None}
+    default = sum(known.values()) / len(known) if known else DEFAULT_HOST_DURATION
+    predictions = {hostname: known.get(hostname, default) for hostname in hostnames}
 
-            hostname = row['hostname']
+    with global_vars.processed_hosts_lock:
+        global_vars.host_predictions = dict(predictions)
+        global_vars.run_parallelism = max(1, min(parallelism, len(hostnames)))
+
+    # sorted() ist stabil - gleich lange Hosts behalten die Reihenfolge der CSV
+    return sorted(hostnames, key=lambda hostname: predictions[hostname], reverse=True)
+
+
+def collector_port(inventory_config):
+    """
+    WinRM port the collection connects to: pywinrm in ``threads`` mode uses http, the ``async`` mode
+    ``winrm_scheme``. A host only reachable on the other port would pass the pre-check and then hang in the
+    collector until its read timeout.
+
+    :param inventory_config:
+    :return: ``int`` 5985 (http) or 5986 (https)
+    """
+    if inventory_config['mode'] == "async" and inventory_config['winrm_scheme'] == "https":
+        return 5986
+    return 5985
+
+
+def precheck(hostnames, db_inst, inventory_config):
+    """
+    Runs the reachability pre-check, reports the skipped hosts as processed and returns the reachable ones
+
+    :param hostnames:
+    :param db_inst:
+    :param inventory_config:
+    :return: ``list``
+    """
+    print(f"{db_inst.get_logprint_info()} Prüfe Erreichbarkeit von {len(hostnames)} Hosts...")
+    reachable, skipped = precheck_hosts(
+        hostnames,
+        ports=(collector_port(inventory_config),),
+        timeout=inventory_config['precheck_timeout'],
+        retries=inventory_config['precheck_retries'],
+        backoff=inventory_config['precheck_backoff'],
+        breaker_threshold=inventory_config['breaker_threshold'],
+        breaker_skip_runs=inventory_config['breaker_skip_runs'])
+
+    for hostname, reason in skipped.items():
+        db_inst.logger.warning(f"Skipping {hostname}: {reason}")
+        print(f"{db_inst.get_logprint_warning()} Überspringe Host {hostname}: {reason}")
+        report_progress(db_inst, hostname, "skipped")
+    print(f"{db_inst.get_logprint_info()} {len(reachable)} Hosts erreichbar, {len(skipped)} übersprungen")
+    return reachable
+
+
+def process_concurrent(hostnames, db_inst, max_workers, host_timeout, archive=None, writer=None):
+    """
+    Runs ``process_host`` for all ``hostnames`` in a thread pool.
+
+    Only the calling thread updates ``global_vars.processed_hosts``, so progress is reported once per host in the
+    order the hosts finish. A host exceeding ``host_timeout`` seconds is reported as failed and its result is
+    discarded; the worker itself ends once the WinRM read timeout hits, and the function waits for it before
+    returning. Each database write checks out its own connection from the ``DatabaseManager`` pool, or is handed
+    to ``writer``.
+
+    A late result is never counted as success. With ``writer`` its queued write is dropped as long as its batch
+    has not been written yet. Without ``writer`` (``group_commit = false``) an ``insert_software`` call that is
+    already running when the deadline passes cannot be stopped: its rows land before the run is finished, while
+    the host stays reported as timeout.
+
+    :param hostnames:
+    :param db_inst:
+    :param max_workers:
+    :param host_timeout:
+    :param archive:
+    :param writer:
+    :return:
+    """
+    started = {}
+    started_lock = threading.Lock()
+
+    def run_host(hostname, cancelled):
+        with started_lock:
+            started[hostname] = time.monotonic()
+        return process_host(hostname, db_inst, cancelled, archive, writer)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inventory_worker")
+    futures = {}
+    try:
+        for hostname in hostnames:
+            cancelled = threading.Event()
+            futures[executor.submit(run_host, hostname, cancelled)] = (hostname, cancelled)
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                hostname, _ = futures[future]
+                write = None
+                try:
+                    status, write = future.result()
+                except Exception as e:
+                    status = "failed"
+                    print(f"{db_inst.get_logprint_error()} Fehler bei Host {hostname}: {e}")
+                report_progress(db_inst, hostname, status)
+                track_write(db_inst, hostname, write)
+
+            if not host_timeout:
+                continue
+            now = time.monotonic()
+            for future in list(pending):
+                hostname, cancelled = futures[future]
+                with started_lock:
+                    start = started.get(hostname)
+                if start is not None and now - start > host_timeout:
+                    cancelled.set()
+                    pending.discard(future)
+                    db_inst.logger.error(f"Timeout after {host_timeout}s on {hostname}")
+                    print(f"{db_inst.get_logprint_error()} Zeitüberschreitung bei Host {hostname} nach {host_timeout}s")
+                    report_progress(db_inst, hostname, "timeout")
+    finally:
+        # Wartende Hosts verwerfen, laufende Worker abwarten: sonst schreiben sie noch nach writer.close()
+        # und finish_run in einen bereits abgeschlossenen Lauf
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def process_async(hostnames, db_inst, concurrency, host_timeout, scheme='http', verify_ssl=True, archive=None,
+                  writer=None):
+    """
+    Runs the collection with ``AsyncSoftwareInventoryWinRM`` in an asyncio event loop.
+
+    The inserts are blocking ODBC calls, so they are handed to ``writer`` (or a single writer thread without
+    group commit) to keep the event loop free.
+
+    :param hostnames:
+    :param db_inst:
+    :param concurrency:
+    :param host_timeout:
+    :param scheme:
+    :param verify_ssl:
+    :param archive:
+    :param writer:
+    :return:
+    """
+    # Erst hier importieren: der Thread-Modus soll ohne spnego auskommen
+    from functions.AsyncSoftwareInventoryWinRM import collect_hosts
+
+    settings = get_settings(db_inst.config_file)
+    user = settings.ps_user
+    pwd = settings.ps_password
+
+    # Ohne DatabaseWriter schreibt ein einzelner Thread, damit der Event-Loop frei bleibt
+    insert_executor = None
+    if writer is None:
+        insert_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inventory_writer")
+
+    async def on_result(hostname, software_list, error, timings):
+        insert_start = time.monotonic()
+        status = "ok"
+        write = None
+        if error is not None:
+            print(f"{db_inst.get_logprint_error()} Failed executing script on {hostname}: {error}")
+            db_inst.logger.error(f"Failed to execute powershell script on {hostname}: {error}")
+        else:
+            if archive is not None:
+                archive.submit(hostname, software_list)
             try:
-                process_host(hostname, db_inst)
+                loop = asyncio.get_running_loop()
+                if writer is not None:
+                    # blockiert nur, solange die Warteschlange des Writers voll ist
+                    write = await loop.run_in_executor(None, writer.submit, hostname, software_list)
+                else:
+                    await loop.run_in_executor(insert_executor, db_inst.insert_software, software_list, hostname)
+                    print(f"{db_inst.get_logprint_info()} Data of {hostname} successfully inserted into database.")
             except Exception as e:
-                print(f"{db_inst.get_logprint_error()} Fehler bei Host {hostname}: {e}")
-            # Host-Zähler nach jeder Verarbeitung erhöhen
-            with global_vars.processed_hosts_lock:
-                global_vars.processed_hosts += 1
-                print(f"{db_inst.get_logprint_info()} Verarbeiteter Host: {hostname} ({global_vars.processed_hosts}/{global_vars.total_hosts})")
+                status = "failed"
+                print(f"{db_inst.get_logprint_error()} Error inserting data into database for {hostname}: {e}")
+                db_inst.logger.error(f"Inserting the software of {hostname} failed: {e}")
+        timings = dict(timings, insert=time.monotonic() - insert_start)
+        total = host_timeout if isinstance(error, TimeoutError) else sum(timings.values())
+        record_timings(hostname, timings, total)
+        if error is not None:
+            status = "timeout" if isinstance(error, TimeoutError) else "failed"
+        report_progress(db_inst, hostname, status)
+        track_write(db_inst, hostname, write)
+
+    try:
+        asyncio.run(collect_hosts(hostnames, user, pwd, on_result, concurrency=concurrency,
+                                  host_timeout=host_timeout, scheme=scheme, verify_ssl=verify_ssl))
+    finally:
+        if insert_executor is not None:
+            insert_executor.shutdown(wait=True)
+
+
+def process_host(hostname, db_inst, cancelled=None, archive=None, writer=None):
+    """
+    Collects the software of ``hostname`` and passes the parsed list straight to ``insert_software``, or queues it
+    at ``writer``. The durations are recorded for the planning of the next runs; with a writer the ``insert``
+    phase is only the time spent waiting for room in its queue.
 
-def process_host(hostname, db_inst):
+    :param hostname:
+    :param db_inst:
+    :param cancelled: set if the host exceeded its deadline, the result is discarded then
+    :param archive: optional ``PayloadArchive`` the software list is additionally written to
+    :param writer: optional ``DatabaseWriter``
+    :return: ``tuple`` (status, ``Future`` of the writer or ``None``), see ``collect_host``
+    """
+    start = time.monotonic()
     client = SoftwareInventoryWinRM(
         host=hostname
     )
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    json_dir = os.path.join(current_dir, "..", "json", f"{hostname}_output.json")
-    json_dir = os.path.normpath(json_dir)
+    timings = client.timings
+    try:
+        return collect_host(client, hostname, db_inst, timings, cancelled, archive, writer)
+    finally:
+        record_timings(hostname, timings, time.monotonic() - start)
+
+
+def collect_host(client, hostname, db_inst, timings, cancelled, archive, writer=None):
+    """
+    Collects and writes (or queues) the software of one host
+
+    :return: ``tuple`` (status ``ok``, ``failed`` or ``discarded``, ``Future`` of the writer or ``None``)
+    """
     db_inst.logger.info(f"Processing {hostname}...")
     print(f"\n{db_inst.get_logprint_info()} Processing {hostname}...")
 
     try:
-        client.get_installed_software(json_dir)
+        software_list = client.get_installed_software()
     except Exception as e:
         print(f"{db_inst.get_logprint_error()} Failed executing script on {hostname}: {e}")
         if str(e).startswith("the specified credentials"):
             db_inst.logger.error(f"The specified credentials were incorrect")
         else:
             db_inst.logger.error(f"Failed to execute powershell script on {hostname}: {e}")
+        return "failed", None
 
+    # Host hat seine Deadline überschritten - Ergebnis verwerfen
+    if cancelled is not None and cancelled.is_set():
+        db_inst.logger.warning(f"Discarding late result of {hostname}")
+        return "discarded", None
 
-    try:
-        with open(json_dir, "r", encoding="utf-8") as f:
-            software_list = json.load(f)
+    if archive is not None:
+        archive.submit(hostname, software_list)
 
-    except Exception as e:
-        print(f"{db_inst.get_logprint_error()} Error occurred while reading json-file for {hostname}: {e}")
-        return
-
-    for entry in software_list:
-        if "Hostname" not in entry or not entry["Hostname"]:
-            entry["Hostname"] = hostname
-            print(f"Finished checking entries on {hostname}")
+    insert_start = time.monotonic()
     try:
+        if writer is not None:
+            # Ob der Host geschrieben wurde, zeigt erst der Commit seines Batches
+            return "ok", writer.submit(hostname, software_list, cancelled)
         db_inst.insert_software(software_list, hostname)
+        if cancelled is not None and cancelled.is_set():
+            # Deadline während des Inserts abgelaufen: die Zeilen stehen in der Datenbank, gemeldet bleibt timeout
+            db_inst.logger.warning(f"Data of {hostname} was written after its deadline")
         print(f"{db_inst.get_logprint_info()} Data of {hostname} successfully inserted into database.")
-
+        return "ok", None
     except Exception as e:
-        print(f"{db_inst.get_logprint_error()} Error inserting data into database for {hostname}: {e}")
\ No newline at end of file
+        print(f"{db_inst.get_logprint_error()} Error inserting data into database for {hostname}: {e}")
+        db_inst.logger.error(f"Inserting the software of {hostname} failed: {e}")
+        return "failed", None
+    finally:
+        timings['insert'] = time.monotonic() - insert_start
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from functions.publisher_rules import get_publisher_matcher
+
+# Anzahl gemerkter Rohnamen bzw. Datumswerte, reicht für alle Titel einer Umgebung
+NAME_CACHE_SIZE = 16384
+DATE_CACHE_SIZE = 4096
+DATE_FORMATS = ("%Y%m%d", "%Y-%m-%d", "%d.%m.%Y")
+
+# Die Schritte bleiben getrennt: jeder arbeitet auf dem Ergebnis des vorherigen, zusammengefasst würden sich
+# Wortgrenzen und damit die Namen ändern
+_ARCH_IN_PARENS = re.compile(r'\(\s*.*?(x64|x86|64-bit|32-bit|x86_64).*?\s*\)', re.IGNORECASE)
+_ARCH_WORD = re.compile(r'\b(x64|x86|64-bit|32-bit|x86_64)\b', re.IGNORECASE)
+_VERSION = re.compile(r'\bv?\d+(\.\d+)*\b', re.IGNORECASE)
+_EMPTY_PARENS = re.compile(r'\(\s*\)')
+_HYPHEN_SPACES = re.compile(r'(?<=\D)\s*-\s*(?=\D)')
+_TRAILING = re.compile(r'[\s\-]+$')
+_MULTI_SPACE = re.compile(r'\s{2,}')
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def clean_names(item):
+    # Architektur in Klammern entfernen (z.B. (x64), (64-bit), (x86_64))
+    name = _ARCH_IN_PARENS.sub('', item)
+    # Architektur-Begriffe außerhalb von Klammern entfernen (inkl. Unterstrich)
+    name = _ARCH_WORD.sub('', name)
+    # Versionen entfernen, z.B. "14.40.33816", "v11.10"
+    name = _VERSION.sub('', name)
+    # Leere Klammern entfernen
+    name = _EMPTY_PARENS.sub('', name)
+    # Leerzeichen um Bindestriche bereinigen, Jahresbereiche wie 2015-2022 bleiben
+    name = _HYPHEN_SPACES.sub('-', name)
+    # Leerzeichen und Bindestriche am Ende entfernen
+    name = _TRAILING.sub('', name)
+    # Mehrere Leerzeichen auf eins reduzieren
+    name = _MULTI_SPACE.sub(' ', name)
+    name = name.strip()
+    return name
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_install_date(install_date_str):
+    """
+    Parses the ``InstallDate`` of the registry in one of the supported formats
+
+    :param install_date_str:
+    :return: ``datetime.date`` or ``None``
+    """
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(install_date_str, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def normalise_software(item, matcher=None):
+    """
+    Converts one collected software entry into the column values written to the database
+    (name, publisher, installDate, programSize, version)
+
+    :param item:
+    :param matcher: ``PublisherMatcher``, default the one of ``config/publisher_rules.csv``
+    :return: ``tuple``
+    """
+    size = item.get('Size') or 0
+    version = item.get('Version') or '0.0.0'
+    # process installDate
+    install_date = None
+    if install_date_str := item.get('InstallDate'):
+        try:
+            install_date = parse_install_date(install_date_str)
+        except Exception:
+            install_date = None
+
+    # unification same publisher with different spelling, see publisher_rules.csv
+    if matcher is None:
+        matcher = get_publisher_matcher()
+    publisher = matcher.canonicalise(str(item.get('Publisher', '')))
+
+    name = clean_names(item.get('Name'))
+
+    return (
+        name,
+        publisher[:90],  # Auf maximale Länge kürzen
+        install_date,
+        size,
+        version[:50]
+    )
+
+
+def normalise_software_list(software_list, rules_file=None):
+    """
+    Normalises the whole software list of one host, the publisher rules are looked up once per list
+
+    :param software_list:
+    :param rules_file: publisher rule table, default ``config/publisher_rules.csv``
+    :return: ``list`` of ``tuple``, see ``normalise_software``
+    """
+    matcher = get_publisher_matcher(rules_file)
+    return [normalise_software(item, matcher) for item in software_list]
+
+
+def normaliser_stats(rules_file=None):
+    """
+    Hit rates of the name, date and publisher memo, to check that normalisation is served from the cache
+
+    :param rules_file:
+    :return: ``dict``
+    """
+    stats = {}
+    for key, info in (('names', clean_names.cache_info()), ('dates', parse_install_date.cache_info()),
+                      ('publishers', get_publisher_matcher(rules_file).cache_info())):
+        lookups = info.hits + info.misses
+        stats[key] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize,
+                      'hit_rate': info.hits / lookups if lookups else 0.0}
+    return stats
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from contextlib import contextmanager
+
+# Zeitpunkt des ersten Imports, die Schritte werden relativ dazu gemessen
+_process_start = time.perf_counter()
+_steps = []
+_lock = threading.Lock()
+
+
+def record(step, seconds, error=None):
+    """
+    Records the duration of one start-up step, e.g. loading the config or creating the database schema
+
+    :param step:
+    :param seconds:
+    :param error: ``Exception`` if the step failed
+    :return:
+    """
+    with _lock:
+        _steps.append({'step': step, 'seconds': seconds, 'at': time.perf_counter() - _process_start,
+                       'error': str(error) if error else None})
+
+
+@contextmanager
+def timed(step):
+    """
+    Measures the block as start-up step ``step``, a raised exception is recorded and passed on
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        record(step, time.perf_counter() - start, e)
+        raise
+    record(step, time.perf_counter() - start)
+
+
+def startup_report():
+    """
+    The recorded start-up steps in the order they finished
+
+    :return: ``dict`` with ``steps`` and ``uptime`` (seconds since the first import of this module)
+    """
+    with _lock:
+        steps = [dict(step) for step in _steps]
+    return {'steps': steps, 'uptime': time.perf_counter() - _process_start}
+
+
+def print_startup_report(prefix=""):
+    report = startup_report()
+    for step in report['steps']:
+        status = f"FEHLER: {step['error']}" if step['error'] else "ok"
+        print(f"{prefix}{step['step']:<28} {step['seconds'] * 1000:9.1f} ms  (nach {step['at']:6.2f}s) {status}")
+    print(f"{prefix}{'Start abgeschlossen nach':<28} {report['uptime'] * 1000:9.1f} ms")
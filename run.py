@@ -1,4 +1,7 @@
-from app import app
+from functions.startup_timing import print_startup_report, timed
+
+with timed("Import der Web-Oberfläche"):
+    from app import app
 from functions.DatabaseManager import DatabaseManager
 
 db_manager = DatabaseManager()
@@ -6,8 +9,17 @@ db_manager = DatabaseManager()
 if __name__ == '__main__':
     # start_periodic_inventory()
 
+    # Datenbank vor dem ersten Request verbinden, schlägt das fehl, wird es beim ersten Zugriff wiederholt
+    try:
+        with timed("Datenbank-Start"):
+            with db_manager.connection():
+                pass
+    except Exception as e:
+        print(f"Database not available on startup, retrying on first use: {e}")
+    print_startup_report()
+
     # Starte Flask-App
     app.app.run(host='0.0.0.0',
                 port=5000,
                 debug=False
-                )
\ No newline at end of file
+                )
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Vergleicht das zeilenweise Einfügen der Software mit ``executemany`` in Batches (``[db] batch_size``).
+
+Läuft über den SQLite-Backend (``[db] engine = sqlite``) mit denselben Tabellen und Abfragen wie der Dienst.
+Da SQLite im Prozess läuft, fehlt der Netzwerk-Roundtrip, der beim SQL Server den Großteil der Zeit ausmacht:
+``--latency-ms`` schlägt deshalb pro Aufruf (zeilenweise: pro Zeile, ``executemany``: pro Batch) eine feste
+Wartezeit auf. Zusätzlich wird das erneute Schreiben aller Hosts im snapshot-Modus gemessen.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config.config_manager import load_settings  # noqa: E402
+from functions.StorageBackend import create_backend  # noqa: E402
+
+PUBLISHERS = ["Microsoft Corporation", "Adobe Inc.", "Oracle Corporation", "Interflex Datensysteme GmbH & Co. KG",
+              "Google LLC", "Mozilla", "Citrix Systems, Inc.", "VMware, Inc.", "Siemens AG", "SAP SE"]
+PRODUCTS = ["Visual C++ 2015-2022 Redistributable", "Office 16 Click-to-Run Extensibility Component", "Acrobat Reader",
+            "Java 8 Update", "Chrome", "Firefox ESR", "Workspace App", "Tools", "Update Health Tools", "GUI"]
+
+
+def rows(count, hostname):
+    # Bereits normalisierte Zeilen wie aus normalise_software()
+    random.seed(f"{hostname}{count}")
+    return [(random.choice(PRODUCTS), random.choice(PUBLISHERS),
+             date(random.randint(2015, 2025), random.randint(1, 12), random.randint(1, 28)),
+             random.randint(0, 900000), f"{random.randint(1, 40)}.{random.randint(0, 99)}")
+            for _ in range(count)]
+
+
+class LatencyCursor:
+    """
+    Cursor, der vor jedem Aufruf ``latency`` Sekunden wartet (Roundtrip zum Datenbankserver)
+    """
+
+    def __init__(self, cursor, latency):
+        self._cursor = cursor
+        self._latency = latency
+
+    def execute(self, *args):
+        time.sleep(self._latency)
+        return self._cursor.execute(*args)
+
+    def executemany(self, *args):
+        time.sleep(self._latency)
+        return self._cursor.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def backend(path, batch_size):
+    config_file = os.path.join(os.path.dirname(path), "bench.ini")
+    with open(config_file, "w", encoding="utf-8") as config:
+        config.write(f"[db]\nengine = sqlite\nsqlite_path = {path}\nprod-table = software\n"
+                     f"backup-table = software_backup\n")
+    storage = create_backend("sqlite", load_settings(config_file), "software", batch_size)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = storage.connect()
+    storage.create_tables(conn.cursor(), "flat")
+    conn.commit()
+    return storage, conn
+
+
+def measure(path, hosts, entries, latency, batch_size):
+    data = {f"host{i:04d}": rows(entries, f"host{i:04d}") for i in range(hosts)}
+    total = hosts * entries
+    results = {}
+    for label, size in (("zeilenweise", 1), (f"executemany/{batch_size}", batch_size)):
+        storage, conn = backend(path, size)
+        cursor = LatencyCursor(conn.cursor(), latency)
+        start = time.perf_counter()
+        for hostname, params in data.items():
+            storage.insert_rows(cursor, storage.table, params, hostname)
+            conn.commit()
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed
+        print(f"{label:>20} | {total:>7} Zeilen | {elapsed:7.2f} s | {total / elapsed:10.0f} Zeilen/s")
+
+        if size == batch_size:
+            # Zweiter Lauf im snapshot-Modus: pro Host ändern sich einige Versionen
+            start = time.perf_counter()
+            changed = 0
+            for hostname, params in data.items():
+                params = params[:-5] + rows(5, hostname + "x")
+                storage.load_staging(cursor, params, hostname)
+                changed += sum(storage.write_snapshot(cursor, hostname))
+                storage.clear_staging(cursor, hostname)
+                conn.commit()
+            elapsed = time.perf_counter() - start
+            print(f"{'snapshot':>20} | {total:>7} Zeilen | {elapsed:7.2f} s | {total / elapsed:10.0f} Zeilen/s "
+                  f"| {changed} Änderungen")
+        conn.close()
+    slow, fast = results.values()
+    print(f"{'Faktor':>20} | {slow / fast:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--entries", type=int, default=500, help="Software-Einträge pro Host")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulierter Roundtrip pro Aufruf")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        measure(os.path.join(tmp, "bench.sqlite3"), args.hosts, args.entries, args.latency_ms / 1000,
+                args.batch_size)
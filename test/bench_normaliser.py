@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Vergleicht ``functions.software_normaliser`` mit der ursprünglichen Normalisierung (sieben ``re.sub`` pro Zeile).
+
+Erzeugt synthetische Software-Listen für viele Hosts aus einem gemeinsamen Titel-Bestand, prüft dass beide
+Varianten identische Zeilen liefern und misst die Laufzeit sowie die Trefferquote des Caches. Für den Vergleich
+werden die eingebauten Herstellerregeln verwendet, sie entsprechen der ursprünglichen Vereinheitlichung.
+"""
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from functions.publisher_rules import BUILTIN_RULES, PublisherMatcher  # noqa: E402
+from functions.software_normaliser import normalise_software, normaliser_stats  # noqa: E402
+
+PUBLISHERS = ["Microsoft Corporation", "Microsoft", "Adobe Inc.", "Oracle Corporation", "Interflex Datensysteme",
+              "Google LLC", "Mozilla", "Citrix Systems, Inc.", None, ""]
+PRODUCTS = ["Microsoft Visual C++ 2015-2022 Redistributable", "Office 16 Click-to-Run Extensibility Component",
+            "Adobe Acrobat Reader", "Java 8 Update", "Google Chrome", "Mozilla Firefox ESR", "Citrix Workspace App",
+            "VMware Tools", "Update Health Tools", "IF-6040 GUI", "7-Zip", "Notepad++", "SQL Server - Tools"]
+SUFFIXES = ["", " (x64)", " (x86)", " x64", " (64-bit)", " - 14.40.33816", " v11.10", " (x64 en-US)", " 2019",
+            " - Deutsch", " (32-bit)", "  - ", " (Version 3.2)"]
+DATES = ["20240115", "2023-11-02", "01.03.2022", "", None, "2024/01/01"]
+
+
+def reference_clean_names(item):
+    name = re.sub(r'\(\s*.*?(x64|x86|64-bit|32-bit|x86_64).*?\s*\)', '', item, flags=re.IGNORECASE)
+    name = re.sub(r'\b(x64|x86|64-bit|32-bit|x86_64)\b', '', name, flags=re.IGNORECASE)
+    name = re.sub(r'\bv?\d+(\.\d+)*\b', '', name, flags=re.IGNORECASE)
+    name = re.sub(r'\(\s*\)', '', name)
+    name = re.sub(r'(?<=\D)\s*-\s*(?=\D)', '-', name)
+    name = re.sub(r'[\s\-]+$', '', name)
+    name = re.sub(r'\s{2,}', ' ', name)
+    return name.strip()
+
+
+def reference_normalise(item):
+    size = item.get('Size') or 0
+    version = item.get('Version') or '0.0.0'
+    install_date = None
+    if install_date_str := item.get('InstallDate'):
+        try:
+            for fmt in ("%Y%m%d", "%Y-%m-%d", "%d.%m.%Y"):
+                try:
+                    install_date = datetime.strptime(install_date_str, fmt).date()
+                    break
+                except ValueError:
+                    continue
+        except Exception:
+            install_date = None
+    publisher = str(item.get('Publisher', ''))
+    if "Interflex" in publisher:
+        publisher = "Interflex Datensysteme GmbH & Co. KG"
+    if "Microsoft" in publisher:
+        publisher = "Microsoft Corporation"
+    return reference_clean_names(item.get('Name')), publisher[:90], install_date, size, version[:50]
+
+
+def catalogue(titles):
+    random.seed(titles)
+    return [{
+        "Name": f"{random.choice(PRODUCTS)} {random.randint(1, 40)}.{random.randint(0, 9)}{random.choice(SUFFIXES)}",
+        "Publisher": random.choice(PUBLISHERS),
+        "InstallDate": random.choice(DATES),
+        "Size": random.choice([0, None, random.randint(1, 900000)]),
+        "Version": random.choice([None, f"{random.randint(1, 40)}.{random.randint(0, 99)}.{random.randint(0, 9999)}"]),
+    } for _ in range(titles)]
+
+
+def measure(hosts, entries, titles):
+    titles = catalogue(titles)
+    host_lists = [random.sample(titles, entries) for _ in range(hosts)]
+    total = hosts * entries
+
+    start = time.perf_counter()
+    expected = [[reference_normalise(item) for item in software_list] for software_list in host_lists]
+    reference_time = time.perf_counter() - start
+
+    matcher = PublisherMatcher(BUILTIN_RULES)
+    start = time.perf_counter()
+    actual = [[normalise_software(item, matcher) for item in software_list] for software_list in host_lists]
+    cached_time = time.perf_counter() - start
+
+    assert actual == expected, "Normalisierung weicht von der ursprünglichen Implementierung ab"
+    names = normaliser_stats()['names']
+    print(f"{hosts} Hosts x {entries} Einträge ({total} Zeilen), identische Ergebnisse")
+    print(f"  ursprünglich {reference_time * 1000:8.1f} ms | {total / reference_time:10.0f} Zeilen/s")
+    print(f"  mit Cache    {cached_time * 1000:8.1f} ms | {total / cached_time:10.0f} Zeilen/s "
+          f"| Faktor {reference_time / cached_time:.1f}x | Trefferquote Namen {names['hit_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    measure(hosts=165, entries=400, titles=3000)
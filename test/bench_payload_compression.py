@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Vergleicht die Übertragungsgröße der Inventar-Payload mit und ohne GZip (``[inventory] compress_payload``).
+
+Die Software-Liste wird synthetisch in der Form von ``ConvertTo-Json`` erzeugt. WS-Man überträgt stdout
+nochmals Base64-kodiert in ``rsp:Stream``, daher wird auch diese Größe ausgegeben.
+"""
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from functions.SoftwareInventoryWinRM import decode_payload  # noqa: E402
+
+PUBLISHERS = ["Microsoft Corporation", "Adobe Inc.", "Oracle Corporation", "Interflex Datensysteme GmbH & Co. KG",
+              "Google LLC", "Mozilla", "Citrix Systems, Inc.", "VMware, Inc.", "Siemens AG", "SAP SE"]
+PRODUCTS = ["Visual C++ 2015-2022 Redistributable", "Office 16 Click-to-Run Extensibility Component", "Acrobat Reader",
+            "Java 8 Update", "Chrome", "Firefox ESR", "Workspace App", "Tools", "Update Health Tools", "GUI"]
+
+
+def software_list(count):
+    random.seed(count)
+    return [{
+        "Name": f"{random.choice(PRODUCTS)} {random.randint(1, 40)}.{random.randint(0, 99)} (x64)",
+        "Publisher": random.choice(PUBLISHERS),
+        "InstallDate": f"20{random.randint(15, 25)}{random.randint(1, 12):02d}{random.randint(1, 28):02d}",
+        "Size": random.randint(0, 900000),
+        "Version": f"{random.randint(1, 40)}.{random.randint(0, 99)}.{random.randint(0, 99999)}",
+    } for _ in range(count)]
+
+
+class PrintLog:
+    # Print-Präfixe wie DatabaseManager, ohne Konfiguration
+    def get_logprint_debug(self):
+        return "[DEBUG]"
+
+    def get_logprint_warning(self):
+        return "[WARNING]"
+
+
+def wire_size(stdout):
+    # stdout der PowerShell wird in rsp:Stream erneut Base64-kodiert
+    return len(base64.b64encode(stdout))
+
+
+def measure(count):
+    payload = json.dumps(software_list(count), indent=4, ensure_ascii=False).encode("utf-8")
+    plain = base64.b64encode(payload)
+    compressed = base64.b64encode(gzip.compress(payload))
+
+    # Derselbe Dekodierpfad wie im Dienst (Base64, GZip-Erkennung, JSON)
+    log = PrintLog()
+    assert decode_payload(compressed, "BENCH", log, "json") == decode_payload(plain, "BENCH", log, "json")
+    start = time.perf_counter()
+    for _ in range(20):
+        decode_payload(compressed, "BENCH", log, "json")
+    inflate_ms = (time.perf_counter() - start) / 20 * 1000
+
+    plain_wire = wire_size(plain)
+    gzip_wire = wire_size(compressed)
+    print(f"{count:>6} Einträge | unkomprimiert {plain_wire / 1024:9.1f} KB | gzip {gzip_wire / 1024:8.1f} KB | "
+          f"Ersparnis {100 - gzip_wire / plain_wire * 100:5.1f} % | Dekodieren {inflate_ms:6.2f} ms")
+
+
+if __name__ == '__main__':
+    for entries in (50, 250, 1000, 2000, 5000):
+        measure(entries)
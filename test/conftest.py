@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Hilfsskripte ohne Tests, die beim Import Umgebung oder GUI voraussetzen
+collect_ignore = ["calc_test.py", "check_env.py", "test_importa.py", "tk_login_dev.py"]
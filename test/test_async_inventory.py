@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import base64
+import gzip
+import json
+import struct
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+spnego = pytest.importorskip("spnego")
+
+import config.config_manager as config_manager
+from functions import AsyncSoftwareInventoryWinRM as async_winrm
+from functions.HostStateCache import host_state
+
+USER = "inventory"
+PASSWORD = "secret"
+HOST = "127.0.0.1"
+
+SOFTWARE = [
+    {"Name": "7-Zip 23.01 (x64)", "Publisher": "Igor Pavlov", "InstallDate": "20240105", "Size": 5530,
+     "Version": "23.01"},
+    {"Name": "Mozilla Firefox (x64 de)", "Publisher": "Mozilla", "InstallDate": None, "Size": 0,
+     "Version": "128.0"},
+]
+
+NS_ADDRESSING = "http://schemas.xmlsoap.org/ws/2004/08/addressing"
+ENCRYPTED_CONTENT_TYPE = ('multipart/encrypted;protocol="application/HTTP-SPNEGO-session-encrypted";'
+                          'boundary="Encrypted Boundary"')
+
+RESPONSE = ('<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" '
+            'xmlns:rsp="http://schemas.microsoft.com/wbem/wsman/1/windows/shell"><s:Header/>'
+            '<s:Body>{body}</s:Body></s:Envelope>')
+
+FAULT = ('<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body><s:Fault>'
+         '<s:Code><s:Value>s:Receiver</s:Value></s:Code>'
+         '<s:Reason><s:Text xml:lang="en-US">{text}</s:Text></s:Reason></s:Fault></s:Body></s:Envelope>')
+
+# Antwort von Windows, wenn ein Receive ohne Ausgabe die OperationTimeout erreicht
+TIMEOUT_FAULT = ('<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" '
+                 'xmlns:f="http://schemas.microsoft.com/wbem/wsman/1/wsmanfault"><s:Body><s:Fault>'
+                 '<s:Code><s:Value>s:Receiver</s:Value></s:Code>'
+                 '<s:Reason><s:Text xml:lang="en-US">The WS-Management service cannot complete the operation '
+                 'within the time specified in OperationTimeout.</s:Text></s:Reason>'
+                 '<s:Detail><f:WSManFault Code="2150858793"/></s:Detail></s:Fault></s:Body></s:Envelope>')
+
+
+class PrintLog:
+    """Print-Präfixe wie ``DatabaseManager``, ohne Konfiguration"""
+
+    def get_logprint_info(self):
+        return "[INFO]"
+
+    def get_logprint_error(self):
+        return "[ERROR]"
+
+    def get_logprint_debug(self):
+        return "[DEBUG]"
+
+    def get_logprint_warning(self):
+        return "[WARNING]"
+
+
+class FakeWsman:
+    """
+    Minimal WinRM endpoint: NTLM handshake, message encryption and the Create/Command/Receive/Signal/Delete
+    sequence of one PowerShell command, answered with ``stdout``
+    """
+
+    def __init__(self, stdout, receive_fault=None):
+        self.stdout = stdout
+        # Fault-Text, mit dem der Receive beantwortet wird, danach bricht der Endpunkt die Verbindung ab
+        self.receive_fault = receive_fault
+        self.actions = []
+        self.commands = []
+        self.receives = 0
+        self.server = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, HOST, 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        context = spnego.server(protocol="ntlm")
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                headers, body = request
+                authorization = headers.get("authorization")
+                if authorization:
+                    try:
+                        token = context.step(base64.b64decode(authorization.split(" ", 1)[1]))
+                    except spnego.exceptions.SpnegoError:
+                        await send_response(writer, 401, b"", {"WWW-Authenticate": "Negotiate"})
+                        break
+                    if token:
+                        challenge = f"Negotiate {base64.b64encode(token).decode()}"
+                        await send_response(writer, 401, b"", {"WWW-Authenticate": challenge})
+                    else:
+                        await send_response(writer, 200, b"")
+                    continue
+
+                assert context.complete, "WS-Man request before authentication"
+                assert headers["content-type"].startswith("multipart/encrypted")
+                status, message = self.answer(unwrap(context, body))
+                await send_response(writer, status, wrap(context, message), {"Content-Type": ENCRYPTED_CONTENT_TYPE})
+                if self.receive_fault and self.actions[-1] == "Receive":
+                    break
+        finally:
+            writer.close()
+
+    def answer(self, message):
+        root = ElementTree.fromstring(message)
+        action = root.find(f".//{{{NS_ADDRESSING}}}Action").text.rsplit("/", 1)[1]
+        self.actions.append(action)
+        if action == "Create":
+            return 200, RESPONSE.format(body="<rsp:Shell><rsp:ShellId>SHELL-1</rsp:ShellId></rsp:Shell>")
+        if action == "Command":
+            self.commands.append(root.find(f".//{{{async_winrm.NS_SHELL}}}Command").text)
+            return 200, RESPONSE.format(body="<rsp:CommandResponse><rsp:CommandId>CMD-1</rsp:CommandId>"
+                                             "</rsp:CommandResponse>")
+        if action == "Receive":
+            self.receives += 1
+            if self.receive_fault:
+                return 500, FAULT.format(text=self.receive_fault)
+            if self.receives == 1:
+                return 500, TIMEOUT_FAULT
+            # Ausgabe in zwei Teilen, wie bei großen Payloads
+            half = len(self.stdout) // 2
+            streams = "".join(f'<rsp:Stream Name="stdout" CommandId="CMD-1">{base64.b64encode(part).decode()}'
+                              f'</rsp:Stream>' for part in (self.stdout[:half], self.stdout[half:]))
+            state = (f'<rsp:CommandState CommandId="CMD-1" State="{async_winrm.STATE_DONE}">'
+                     f'<rsp:ExitCode>0</rsp:ExitCode></rsp:CommandState>')
+            return 200, RESPONSE.format(body=f"<rsp:ReceiveResponse>{streams}{state}</rsp:ReceiveResponse>")
+        return 200, RESPONSE.format(body="")
+
+
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    return headers, await reader.readexactly(length) if length else b""
+
+
+async def send_response(writer, status, body, headers=None):
+    lines = [f"HTTP/1.1 {status} Fake", f"Content-Length: {len(body)}"]
+    lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+def unwrap(context, body):
+    payload = body.split(b"\tContent-Type: application/octet-stream\r\n", 1)[1]
+    payload = payload[:-len(async_winrm.MIME_BOUNDARY + b"--\r\n")]
+    header_length = struct.unpack("<i", payload[:4])[0]
+    return context.unwrap_winrm(payload[4:4 + header_length], payload[4 + header_length:])
+
+
+def wrap(context, message):
+    message = message.encode("utf-8")
+    wrapped = context.wrap_winrm(message)
+    return (async_winrm.MIME_BOUNDARY + b"\r\n"
+            + b"\tContent-Type: " + async_winrm.ENCRYPTION_PROTOCOL + b"\r\n"
+            + b"\tOriginalContent: type=application/soap+xml;charset=UTF-8;Length="
+            + str(len(message)).encode() + b"\r\n"
+            + async_winrm.MIME_BOUNDARY + b"\r\n"
+            + b"\tContent-Type: application/octet-stream\r\n"
+            + struct.pack("<i", len(wrapped.header)) + wrapped.header + wrapped.data
+            + async_winrm.MIME_BOUNDARY + b"--\r\n")
+
+
+@pytest.fixture
+def environment(tmp_path, monkeypatch):
+    """NTLM-Benutzer für den Fake-Endpunkt, eine minimale config.ini und ein Logger ohne Datenbank"""
+    users = tmp_path / "ntlm_users"
+    users.write_text(f":{USER}:{PASSWORD}\n")
+    monkeypatch.setenv("NTLM_USER_FILE", str(users))
+
+    config_file = tmp_path / "config.ini"
+    config_file.write_text("[db]\nprod-table = sw_inventory\nbackup-table = sw_inventory_backup\n"
+                           "[inventory]\ncompress_payload = true\n")
+    monkeypatch.setattr(config_manager, "DEFAULT_CONFIG_FILE", str(config_file))
+    monkeypatch.setattr(config_manager, "_settings", None)
+
+    monkeypatch.setattr(async_winrm.dm, "DatabaseManager", PrintLog)
+    yield
+    host_state.discard(HOST, "payload_format", "os")
+
+
+def collect(port, password=PASSWORD):
+    results = {}
+
+    async def on_result(hostname, software_list, error, timings):
+        results[hostname] = (software_list, error, timings)
+
+    asyncio.run(async_winrm.collect_hosts([HOST], USER, password, on_result, host_timeout=10, port=port))
+    return results[HOST]
+
+
+def detect_output(software):
+    payload = base64.b64encode(gzip.compress(json.dumps(software).encode("utf-8"))).decode("ascii")
+    return f"PAYLOAD:json|Microsoft Windows Server 2019 Standard\r\n{payload}\r\n".encode("utf-8")
+
+
+def test_collects_software_over_wsman(environment):
+    async def run():
+        async with FakeWsman(detect_output(SOFTWARE)) as endpoint:
+            return endpoint, await asyncio.to_thread(collect, endpoint.port)
+
+    endpoint, (software_list, error, timings) = asyncio.run(run())
+    assert error is None
+    assert [entry["Name"] for entry in software_list] == [entry["Name"] for entry in SOFTWARE]
+    assert all(entry["Hostname"] == HOST for entry in software_list)
+    # Der leere Receive nach der OperationTimeout wird wiederholt
+    assert endpoint.actions == ["Create", "Command", "Receive", "Receive", "Signal", "Delete"]
+    assert endpoint.commands[0].startswith("powershell -encodedcommand ")
+    assert host_state.get(HOST)["payload_format"] == "json"
+    assert timings["connect"] > 0 and timings["script"] > 0
+
+
+def test_rejected_credentials(environment):
+    async def run():
+        async with FakeWsman(detect_output(SOFTWARE)) as endpoint:
+            return endpoint, await asyncio.to_thread(collect, endpoint.port, "wrong")
+
+    endpoint, (software_list, error, _) = asyncio.run(run())
+    assert software_list is None
+    assert isinstance(error, PermissionError)
+    assert endpoint.actions == []
+
+
+def test_failed_shell_delete_keeps_original_error(environment):
+    async def run():
+        async with FakeWsman(detect_output(SOFTWARE), receive_fault="The WS-Management service cannot process "
+                                                                    "the request.") as endpoint:
+            return endpoint, await asyncio.to_thread(collect, endpoint.port)
+
+    endpoint, (software_list, error, _) = asyncio.run(run())
+    assert software_list is None
+    # Der Delete scheitert an der abgebrochenen Verbindung, gemeldet wird der Fault des Receive
+    assert isinstance(error, RuntimeError)
+    assert "cannot process the request" in str(error)
+    assert endpoint.actions == ["Create", "Command", "Receive"]
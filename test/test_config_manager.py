@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import config.config_manager as config_manager
+
+
+def test_get_config_keeps_db_config_layout(tmp_path, monkeypatch):
+    config_file = tmp_path / "config.ini"
+    config_file.write_text("[db]\nhost = db01\nuser = inventory\ndatabase = swinv\n"
+                           "prod-table = sw_inventory\nbackup-table = sw_inventory_backup\n")
+    monkeypatch.setattr(config_manager, "DEFAULT_CONFIG_FILE", str(config_file))
+    monkeypatch.setattr(config_manager, "_settings", None)
+
+    assert config_manager.get_config() == {
+        'db_config': {
+            'hostname': 'db01',
+            'username': 'inventory',
+            'password': '',
+            'database': 'swinv',
+            'table_name': 'sw_inventory',
+        }
+    }
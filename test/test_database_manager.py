@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import io
+import json
+import logging
+from datetime import date
+
+import pytest
+
+import config.config_manager as config_manager
+from functions.DatabaseManager import DatabaseManager
+from functions.inventory_export import export_stream
+
+WINRAR = {"Name": "WinRAR 6.24 (64-bit)", "Publisher": "win.rar GmbH", "InstallDate": "20240105", "Size": 5530,
+          "Version": "6.24"}
+FIREFOX = {"Name": "Mozilla Firefox (x64 de)", "Publisher": "Mozilla", "InstallDate": None, "Size": 0,
+           "Version": "128.0"}
+NOTEPAD = {"Name": "Notepad++ (64-bit x64)", "Publisher": "Notepad++ Team", "InstallDate": "20240312",
+           "Size": 4120, "Version": "8.6.5"}
+
+
+def open_manager(tmp_path, **options):
+    """
+    Frischer ``DatabaseManager`` (Singleton zurückgesetzt) auf ``tmp_path/inventory.db``,
+    ``options`` landen im Abschnitt [db] der config.ini
+    """
+    config_file = tmp_path / "config.ini"
+    lines = ["[db]", "engine = sqlite", f"sqlite_path = {tmp_path / 'inventory.db'}",
+             "prod-table = sw_inventory", "backup-table = sw_inventory_backup"]
+    lines += [f"{key} = {value}" for key, value in options.items()]
+    config_file.write_text("\n".join(lines) + "\n")
+    # get_settings prüft die mtime nur alle paar Sekunden
+    config_manager._settings = None
+    DatabaseManager._instance = None
+    return DatabaseManager(config_file=str(config_file))
+
+
+def close_manager(db):
+    db.__exit__(None, None, None)
+    DatabaseManager._instance = None
+
+
+@pytest.fixture
+def db(request, tmp_path, monkeypatch):
+    """
+    ``DatabaseManager`` gegen eine SQLite-Datei, Optionen für [db] per ``indirect``-Parametrisierung
+    """
+    # Logdatei unter tmp_path statt neben dem Repository
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config_manager, "_settings", None)
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    manager = open_manager(tmp_path, **getattr(request, "param", {}))
+    yield manager
+    close_manager(manager)
+
+
+def rows_of(db, table="sw_inventory"):
+    with db.connection() as conn:
+        return conn.execute(f"SELECT hostname, name, version, programSize, isNew FROM {table} "
+                            f"ORDER BY hostname, name, version").fetchall()
+
+
+def history_of(db, hostname):
+    with db.connection() as conn:
+        return conn.execute(f"SELECT name, version, valid_from_run, valid_to_run FROM {db.history_table} "
+                            f"WHERE hostname = ? ORDER BY name, version, valid_from_run", (hostname,)).fetchall()
+
+
+def test_append_insert_many(db):
+    counts = db.insert_many([("HOST01", [WINRAR, FIREFOX]), ("HOST02", [NOTEPAD])])
+    assert counts == {"HOST01": 2, "HOST02": 1}
+
+    # append: eine geänderte Liste wird vollständig angehängt
+    assert db.insert_many([("HOST01", [WINRAR, FIREFOX, NOTEPAD])]) == {"HOST01": 3}
+    rows = rows_of(db)
+    assert len(rows) == 6
+    assert [row[1] for row in rows if row[0] == "HOST01"].count("WinRAR") == 2
+
+
+def test_unchanged_software_is_skipped_unless_forced(db):
+    assert db.insert_software([WINRAR, FIREFOX], "HOST01") == 2
+    with db.connection() as conn:
+        first_seen = conn.execute("SELECT last_seen FROM host_fingerprints").fetchone()[0]
+
+    # Gleiche Software in anderer Reihenfolge: nur last_seen wird aktualisiert
+    assert db.insert_software([FIREFOX, WINRAR], "HOST01") == 0
+    assert len(rows_of(db)) == 2
+    with db.connection() as conn:
+        assert conn.execute("SELECT last_seen FROM host_fingerprints").fetchone()[0] > first_seen
+
+    assert db.insert_software([WINRAR, FIREFOX], "HOST01", force=True) == 2
+    assert len(rows_of(db)) == 4
+    assert db.insert_many([("HOST01", [WINRAR, FIREFOX])]) == {"HOST01": 0}
+
+
+@pytest.mark.parametrize("db", [{"write_mode": "snapshot"}], indirect=True)
+def test_snapshot_counts_inserted_updated_and_deleted_rows(db, caplog):
+    caplog.set_level(logging.INFO, logger="DatabaseManager")
+    assert db.insert_software([WINRAR, FIREFOX], "HOST01") == 2
+
+    # WinRAR wird größer, Firefox wechselt die Version, Notepad++ kommt hinzu
+    changed = [dict(WINRAR, Size=6000), dict(FIREFOX, Version="129.0"), NOTEPAD]
+    assert db.insert_software(changed, "HOST01") == 4
+    assert "Snapshot of HOST01: 2 inserted, 1 updated, 1 deleted" in caplog.text
+    assert rows_of(db) == [("HOST01", "Mozilla Firefox", "129.0", 0, 1),
+                           ("HOST01", "Notepad++", "8.6.5", 4120, 1),
+                           ("HOST01", "WinRAR", "6.24", 6000, 0)]
+
+    # Erneut erzwungen: nur die Zeilen mit isNew = 1 ändern sich
+    assert db.insert_software(changed, "HOST01", force=True) == 2
+    assert "Snapshot of HOST01: 0 inserted, 2 updated, 0 deleted" in caplog.text
+    assert [row[4] for row in rows_of(db)] == [0, 0, 0]
+
+
+@pytest.mark.parametrize("db", [{"schema": "normalised"}], indirect=True)
+def test_normalised_schema_stores_hosts_publishers_and_titles_once(db):
+    db.insert_many([("HOST01", [WINRAR, FIREFOX]), ("HOST02", [WINRAR, NOTEPAD])])
+    tables = db.schema_tables
+    with db.connection() as conn:
+        count = {name: conn.execute(f"SELECT COUNT(*) FROM {tables[name]}").fetchone()[0]
+                 for name in ("hosts", "publishers", "titles", "installations")}
+    assert count == {"hosts": 2, "publishers": 3, "titles": 3, "installations": 4}
+
+    # Firefox verschwindet von HOST01, die Web-Oberfläche liest die View
+    assert db.insert_software([WINRAR], "HOST01") == 2
+    items = db.get_inventory_page()["items"]
+    assert [(item["hostname"], item["name"]) for item in items] == [
+        ("HOST01", "WinRAR"), ("HOST02", "Notepad++"), ("HOST02", "WinRAR")]
+    assert db.get_inventory_counts()["software_all"] == 3
+
+
+def test_flat_table_is_migrated_to_normalised_schema(db, tmp_path):
+    db.insert_many([("HOST01", [WINRAR, FIREFOX]), ("HOST02", [NOTEPAD])])
+    # Duplikat aus dem append-Modus wird bei der Migration zusammengefasst
+    db.insert_software([WINRAR, FIREFOX], "HOST01", force=True)
+    close_manager(db)
+
+    normalised = open_manager(tmp_path, schema="normalised")
+    try:
+        # Die Migration läuft beim ersten Verbindungsaufbau
+        items = normalised.get_inventory_page()["items"]
+        assert [(item["hostname"], item["name"], item["version"]) for item in items] == [
+            ("HOST01", "Mozilla Firefox", "128.0"), ("HOST01", "WinRAR", "6.24"), ("HOST02", "Notepad++", "8.6.5")]
+        assert normalised.get_inventory_counts()["software_all"] == 3
+        assert normalised.migrate_to_normalised() == 0
+        assert normalised.migrate_to_normalised(force=True) == 0
+        # Die flache Tabelle bleibt erhalten
+        assert len(rows_of(normalised)) == 5
+    finally:
+        close_manager(normalised)
+
+
+@pytest.mark.parametrize("db", [{"history_retention_runs": 2}], indirect=True)
+def test_run_history_diff_and_pruning(db):
+    first = db.start_run()
+    db.insert_software([WINRAR, FIREFOX], "HOST01")
+    db.finish_run(first, hosts=1)
+
+    second = db.start_run()
+    db.insert_software([WINRAR, NOTEPAD], "HOST01")
+    db.finish_run(second, hosts=1)
+
+    diff = db.diff_runs(first, second)
+    assert [row["name"] for row in diff["added"]] == ["Notepad++"]
+    assert [row["name"] for row in diff["removed"]] == ["Mozilla Firefox"]
+    assert [row["name"] for row in db.get_software_at_run(first)] == ["Mozilla Firefox", "WinRAR"]
+    with pytest.raises(ValueError):
+        db.diff_runs(second, first)
+
+    # Unveränderte Software schreibt keine Historie, der dritte Lauf verdrängt den ersten
+    third = db.start_run()
+    assert db.insert_software([NOTEPAD, WINRAR], "HOST01") == 0
+    db.finish_run(third, hosts=1)
+
+    assert [(run["run_id"], run["status"], run["hosts"]) for run in db.get_runs()] == [
+        (third, "finished", 1), (second, "finished", 1)]
+    assert history_of(db, "HOST01") == [("Notepad++", "8.6.5", second, None), ("WinRAR", "6.24", first, None)]
+    with pytest.raises(ValueError, match="Unknown or pruned"):
+        db.get_software_at_run(first)
+    assert db.diff_runs(second, third) == {"added": [], "removed": []}
+
+
+def test_prune_history_keeps_newest_runs(db):
+    for software_list in ([WINRAR], [FIREFOX], [NOTEPAD]):
+        run_id = db.start_run()
+        db.insert_software(software_list, "HOST01")
+        db.finish_run(run_id, hosts=1)
+    assert len(history_of(db, "HOST01")) == 3
+
+    # WinRAR war nur im ersten, Firefox nur im zweiten Lauf vorhanden
+    assert db.prune_history(keep_runs=1) == 2
+    assert history_of(db, "HOST01") == [("Notepad++", "8.6.5", run_id, None)]
+    assert [run["run_id"] for run in db.get_runs()] == [run_id]
+
+
+def test_crashed_run_is_aborted_by_next_start(db):
+    crashed = db.start_run()
+    current = db.start_run()
+    assert {run["run_id"]: run["status"] for run in db.get_runs()} == {crashed: "aborted", current: "running"}
+
+
+def test_summary_counts_are_refreshed_per_run(db):
+    db.insert_many([("HOST01", [WINRAR, FIREFOX]), ("HOST02", [WINRAR])])
+    counts = db.get_inventory_counts()
+    assert {key: counts[key] for key in ("hosts", "software", "software_all", "publisher")} == {
+        "hosts": 2, "software": 2, "software_all": 3, "publisher": 2}
+
+    # Gelesen wird die Zusammenfassung, nicht die Tabelle
+    db.insert_software([NOTEPAD], "HOST03")
+    assert db.get_inventory_counts()["hosts"] == 2
+
+    run_id = db.start_run()
+    db.finish_run(run_id, hosts=3)
+    refreshed = db.get_inventory_counts()
+    assert (refreshed["hosts"], refreshed["software_all"], refreshed["publisher"]) == (3, 4, 3)
+    assert refreshed["updated_at"] > counts["updated_at"]
+
+
+def fill_pages(db):
+    """Fünf Installationen auf drei Hosts, zwei davon ohne installDate"""
+    db.insert_many([("HOST01", [WINRAR, FIREFOX]), ("HOST02", [NOTEPAD, dict(FIREFOX, Version="129.0")]),
+                    ("HOST03", [dict(WINRAR, InstallDate="20230101")])])
+
+
+def read_all_pages(db, limit, **kwargs):
+    pages, cursor = [], None
+    while True:
+        page = db.get_inventory_page(cursor=cursor, limit=limit, **kwargs)
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_inventory_pages_follow_cursor_with_null_install_date(db, descending):
+    fill_pages(db)
+    pages = read_all_pages(db, 2, sort="installDate", descending=descending)
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+    rows = [(item["installDate"], item["hostname"], item["version"]) for page in pages for item in page]
+    # NULL steht aufsteigend vorne und absteigend hinten, gleiche Werte nach dem natürlichen Schlüssel
+    expected = [(None, "HOST01", "128.0"), (None, "HOST02", "129.0"), (date(2023, 1, 1), "HOST03", "6.24"),
+                (date(2024, 1, 5), "HOST01", "6.24"), (date(2024, 3, 12), "HOST02", "8.6.5")]
+    assert rows == (expected[::-1] if descending else expected)
+
+
+def test_inventory_pages_filter_and_reject_foreign_cursor(db):
+    fill_pages(db)
+    pages = read_all_pages(db, 1, filters={"name": "firefox"}, sort="version", descending=True)
+    assert [item["version"] for page in pages for item in page] == ["129.0", "128.0"]
+
+    cursor = db.get_inventory_page(sort="hostname", limit=1)["next_cursor"]
+    with pytest.raises(ValueError):
+        db.get_inventory_page(sort="hostname", descending=True, cursor=cursor)
+    with pytest.raises(ValueError):
+        db.get_inventory_page(sort="programSize")
+
+
+@pytest.mark.parametrize("db", [{"export_chunk_size": 2}], indirect=True)
+def test_export_inventory_streams_csv_and_ndjson(db):
+    fill_pages(db)
+    expected = [(item["hostname"], item["name"], item["version"]) for item in db.get_inventory_page()["items"]]
+
+    chunks, content_type, extension = export_stream(db.export_inventory(), "csv")
+    chunks = list(chunks)
+    assert (content_type, extension) == ("text/csv", "csv")
+    # Ein Ausgabe-Chunk pro fetchmany, der erste mit Kopfzeile
+    assert len(chunks) == 3
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert [(row["hostname"], row["name"], row["version"]) for row in rows] == expected
+    assert [row["installDate"] for row in rows if row["hostname"] == "HOST01"] == ["", "2024-01-05"]
+
+    chunks, content_type, extension = export_stream(db.export_inventory(filters={"hostname": "HOST02"}),
+                                                    "ndjson", compress=True)
+    assert (content_type, extension) == ("application/gzip", "ndjson.gz")
+    lines = gzip.decompress(b"".join(chunks)).decode("utf-8").splitlines()
+    objects = [json.loads(line) for line in lines]
+    assert [(item["name"], item["installDate"]) for item in objects] == [
+        ("Mozilla Firefox", None), ("Notepad++", "2024-03-12")]
+
+
+def test_export_inventory_of_past_run(db):
+    run_id = db.start_run()
+    db.insert_software([WINRAR, FIREFOX], "HOST01")
+    db.finish_run(run_id, hosts=1)
+    db.insert_software([NOTEPAD], "HOST01")
+
+    chunks, _, _ = export_stream(db.export_inventory(run_id=run_id), "ndjson")
+    assert [json.loads(line)["name"] for line in b"".join(chunks).decode("utf-8").splitlines()] == [
+        "Mozilla Firefox", "WinRAR"]
+    with pytest.raises(ValueError):
+        db.export_inventory(run_id=run_id + 1)
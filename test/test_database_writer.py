@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from functions.DatabaseWriter import DatabaseWriter
+
+
+class BrokenPrintDb:
+    """``insert_many`` gelingt, aber die Ausgabe danach schlägt beim ersten Batch fehl"""
+
+    def __init__(self):
+        self.logger = logging.getLogger("test_database_writer")
+        self.broken = True
+
+    def get_logprint_info(self):
+        if self.broken:
+            self.broken = False
+            raise RuntimeError("log target gone")
+        return "[INFO]"
+
+    def get_logprint_error(self):
+        return "[ERROR]"
+
+    def insert_many(self, items):
+        return {hostname: len(software_list) for hostname, software_list in items}
+
+
+def test_writer_survives_errors_after_insert():
+    writer = DatabaseWriter(BrokenPrintDb(), max_delay=0)
+    first = writer.submit("TESTHOST01", [{"Name": "7-Zip"}])
+    assert isinstance(first.exception(timeout=5), RuntimeError)
+
+    # Der Thread läuft weiter und schreibt die folgenden Hosts
+    second = writer.submit("TESTHOST02", [{"Name": "7-Zip"}, {"Name": "Notepad++"}])
+    assert second.result(timeout=5) == 2
+
+    closer = threading.Thread(target=writer.close)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
+    stats = writer.stats()
+    assert stats["failed"] == 1
+    assert stats["hosts"] == 2
+
+
+def test_writer_survives_cancelled_future():
+    writer = DatabaseWriter(BrokenPrintDb(), max_delay=0)
+    writer.db_inst.broken = False
+    gate = threading.Event()
+    original = writer.db_inst.insert_many
+
+    def slow_insert_many(items):
+        gate.wait(5)
+        return original(items)
+
+    writer.db_inst.insert_many = slow_insert_many
+    cancelled = writer.submit("TESTHOST01", [{"Name": "7-Zip"}])
+    cancelled.cancel()
+    gate.set()
+    assert writer.submit("TESTHOST02", [{"Name": "7-Zip"}]).result(timeout=5) == 1
+    writer.close()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+import pytest
+
+from vars import global_vars
+
+
+class FlakyMetadata:
+    """``get_metadata`` wie ``DatabaseManager``: ``None`` solange die Datenbank nicht erreichbar ist"""
+
+    def __init__(self, value):
+        self.value = value
+        self.available = False
+        self.reads = 0
+
+    def get_metadata(self, key):
+        self.reads += 1
+        return self.value if self.available else None
+
+
+@pytest.fixture
+def metadata(monkeypatch):
+    db = FlakyMetadata(datetime(2026, 10, 1, 6, 0))
+    monkeypatch.setattr(global_vars, "db", db)
+    vars(global_vars).pop("last_run_time", None)
+    yield db
+    vars(global_vars).pop("last_run_time", None)
+
+
+def test_last_run_time_is_read_again_after_outage(metadata):
+    assert global_vars.last_run_time is None
+    assert "last_run_time" not in vars(global_vars)
+
+    metadata.available = True
+    assert global_vars.last_run_time == datetime(2026, 10, 1, 6, 0)
+    # Einmal gelesen, danach ohne Datenbank aus dem Modul
+    reads = metadata.reads
+    assert global_vars.last_run_time == datetime(2026, 10, 1, 6, 0)
+    assert metadata.reads == reads
+
+
+def test_assigned_last_run_time_replaces_lazy_value(metadata):
+    global_vars.last_run_time = "2026-10-18 06:00:00"
+    assert global_vars.last_run_time == "2026-10-18 06:00:00"
+    assert metadata.reads == 0
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+
+from functions.PayloadArchive import PayloadArchive
+
+SOFTWARE = [{"Name": "7-Zip 23.01 (x64)", "Publisher": "Igor Pavlov", "Hostname": "TESTHOST01"}]
+
+
+def test_payloads_of_one_host_in_the_same_second_are_kept(tmp_path):
+    archive = PayloadArchive(str(tmp_path))
+    for _ in range(3):
+        assert archive.submit("TESTHOST01", SOFTWARE)
+    archive.close()
+
+    files = sorted(tmp_path.glob("TESTHOST01_*.json.gz"))
+    assert len(files) == 3
+    for file in files:
+        with gzip.open(file, "rt", encoding="utf-8") as f:
+            assert json.load(f) == SOFTWARE
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+import pytest
+
+from functions import pwsh_processor
+from functions.DatabaseWriter import DatabaseWriter
+from functions.ProgressBroadcaster import ProgressBroadcaster
+from vars import global_vars
+
+SOFTWARE = [{"Name": "7-Zip 23.01 (x64)", "Publisher": "Igor Pavlov", "Hostname": "TESTHOST01"}]
+
+
+class FakeDb:
+    """Print-Präfixe, Logger und Inserts wie ``DatabaseManager``, ohne Datenbank"""
+
+    def __init__(self, fail_hosts=()):
+        self.logger = logging.getLogger("test_pwsh_processor")
+        self.fail_hosts = set(fail_hosts)
+        self.written = []
+
+    def get_logprint_info(self):
+        return "[INFO]"
+
+    def get_logprint_error(self):
+        return "[ERROR]"
+
+    def insert_software(self, software_list, hostname):
+        if hostname in self.fail_hosts:
+            raise RuntimeError("insert failed")
+        self.written.append(hostname)
+
+    def insert_many(self, items):
+        results = {}
+        for hostname, software_list in items:
+            if hostname in self.fail_hosts:
+                results[hostname] = RuntimeError("insert failed")
+            else:
+                self.written.append(hostname)
+                results[hostname] = len(software_list)
+        return results
+
+
+class FakeClient:
+    def __init__(self, error=None):
+        self.error = error
+
+    def get_installed_software(self):
+        if self.error is not None:
+            raise self.error
+        return SOFTWARE
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    """Fängt die Fortschrittsereignisse ab und setzt den Zähler des Laufs zurück"""
+    broadcaster = ProgressBroadcaster()
+    monkeypatch.setattr(pwsh_processor, "progress_broadcaster", broadcaster)
+    monkeypatch.setattr(global_vars, "processed_hosts", 0)
+    monkeypatch.setattr(global_vars, "total_hosts", 0)
+    return broadcaster
+
+
+def host_events(broadcaster):
+    return [(data["hostname"], data["status"]) for _, event, data in broadcaster._events if event == "host"]
+
+
+def test_collect_failure_is_reported():
+    status, write = pwsh_processor.collect_host(FakeClient(ValueError("no route")), "TESTHOST01", FakeDb(), {},
+                                                None, None)
+    assert (status, write) == ("failed", None)
+
+
+def test_insert_failure_is_reported():
+    db_inst = FakeDb(fail_hosts={"TESTHOST01"})
+    status, write = pwsh_processor.collect_host(FakeClient(), "TESTHOST01", db_inst, {}, None, None)
+    assert (status, write) == ("failed", None)
+
+
+def test_late_result_is_discarded():
+    cancelled = threading.Event()
+    cancelled.set()
+    db_inst = FakeDb()
+    status, _ = pwsh_processor.collect_host(FakeClient(), "TESTHOST01", db_inst, {}, cancelled, None)
+    assert status == "discarded"
+    assert db_inst.written == []
+
+
+def test_writer_future_carries_write_failure():
+    db_inst = FakeDb(fail_hosts={"TESTHOST02"})
+    writer = DatabaseWriter(db_inst, max_delay=0)
+    ok = pwsh_processor.collect_host(FakeClient(), "TESTHOST01", db_inst, {}, None, None, writer)
+    failed = pwsh_processor.collect_host(FakeClient(), "TESTHOST02", db_inst, {}, None, None, writer)
+    stats = writer.close()
+    assert ok[0] == failed[0] == "ok"
+    assert ok[1].result() == 1
+    assert isinstance(failed[1].exception(), RuntimeError)
+    assert stats["failed"] == 1
+
+
+def test_concurrent_reports_real_status(monkeypatch, progress):
+    def process_host(hostname, db_inst, cancelled=None, archive=None, writer=None):
+        if hostname == "BROKEN":
+            return "failed", None
+        return "ok", None
+
+    monkeypatch.setattr(pwsh_processor, "process_host", process_host)
+    pwsh_processor.process_concurrent(["HOST01", "BROKEN"], FakeDb(), max_workers=2, host_timeout=None)
+    assert sorted(host_events(progress)) == [("BROKEN", "failed"), ("HOST01", "ok")]
+
+
+def test_concurrent_waits_for_timed_out_workers(monkeypatch, progress):
+    db_inst = FakeDb()
+    writer = DatabaseWriter(db_inst, max_delay=0)
+
+    def process_host(hostname, db_inst, cancelled=None, archive=None, writer=None):
+        # Hängender Host, der nach seiner Deadline doch noch antwortet
+        time.sleep(1.5)
+        return pwsh_processor.collect_host(FakeClient(), hostname, db_inst, {}, cancelled, archive, writer)
+
+    monkeypatch.setattr(pwsh_processor, "process_host", process_host)
+    pwsh_processor.process_concurrent(["SLOWHOST"], db_inst, max_workers=1, host_timeout=0.5, writer=writer)
+    # Der Worker ist beendet, bevor der Writer geschlossen wird, und hat sein Ergebnis verworfen
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("inventory_worker")]
+    stats = writer.close()
+    assert stats["hosts"] == 0
+    assert host_events(progress) == [("SLOWHOST", "timeout")]
+
+
+def test_failed_write_is_published(progress):
+    db_inst = FakeDb(fail_hosts={"TESTHOST02"})
+    writer = DatabaseWriter(db_inst, max_delay=0)
+    for hostname in ("TESTHOST01", "TESTHOST02"):
+        status, write = pwsh_processor.collect_host(FakeClient(), hostname, db_inst, {}, None, None, writer)
+        pwsh_processor.report_progress(db_inst, hostname, status)
+        pwsh_processor.track_write(db_inst, hostname, write)
+    writer.close()
+    events = host_events(progress)
+    assert events[:2] == [("TESTHOST01", "ok"), ("TESTHOST02", "ok")]
+    assert events[2:] == [("TESTHOST02", "failed")]
+    # Der zweite Bericht zählt den Host nicht erneut
+    assert global_vars.processed_hosts == 2
+
+
+@pytest.mark.parametrize("mode, scheme, port", [("threads", "http", 5985), ("threads", "https", 5985),
+                                                ("async", "http", 5985), ("async", "https", 5986)])
+def test_precheck_probes_only_the_collector_port(monkeypatch, progress, mode, scheme, port):
+    probed = {}
+
+    def precheck_hosts(hostnames, ports, **kwargs):
+        probed['ports'] = ports
+        return list(hostnames), {}
+
+    monkeypatch.setattr(pwsh_processor, "precheck_hosts", precheck_hosts)
+    db_inst = FakeDb()
+    db_inst.get_logprint_warning = lambda: "[WARNING]"
+    inventory_config = {'mode': mode, 'winrm_scheme': scheme, 'precheck_timeout': 1.0, 'precheck_retries': 0,
+                        'precheck_backoff': 0.5, 'breaker_threshold': 3, 'breaker_skip_runs': 1}
+    assert pwsh_processor.precheck(["TESTHOST01"], db_inst, inventory_config) == ["TESTHOST01"]
+    assert probed['ports'] == (port,)
+
+
+def test_timed_out_host_inside_insert_is_not_counted_as_success(monkeypatch, progress):
+    class SlowInsertDb(FakeDb):
+        def insert_software(self, software_list, hostname):
+            # Deadline läuft während des Inserts ab
+            time.sleep(1.5)
+            super().insert_software(software_list, hostname)
+
+    db_inst = SlowInsertDb()
+
+    def process_host(hostname, db_inst, cancelled=None, archive=None, writer=None):
+        return pwsh_processor.collect_host(FakeClient(), hostname, db_inst, {}, cancelled, archive, writer)
+
+    monkeypatch.setattr(pwsh_processor, "process_host", process_host)
+    pwsh_processor.process_concurrent(["SLOWHOST"], db_inst, max_workers=1, host_timeout=0.5)
+    assert host_events(progress) == [("SLOWHOST", "timeout")]
+    assert global_vars.processed_hosts == 1
+    # Ein laufender Insert lässt sich nicht abbrechen, er ist aber vor dem Ende des Laufs abgeschlossen
+    assert db_inst.written == ["SLOWHOST"]
+
+
+def test_writer_drops_queued_write_after_deadline(progress):
+    db_inst = FakeDb()
+    writer = DatabaseWriter(db_inst, max_delay=0)
+    cancelled = threading.Event()
+    cancelled.set()
+    write = writer.submit("SLOWHOST", SOFTWARE, cancelled)
+    pwsh_processor.track_write(db_inst, "SLOWHOST", write)
+    stats = writer.close()
+    assert write.cancelled()
+    assert db_inst.written == []
+    assert stats["dropped"] == 1 and stats["failed"] == 0
+    # Kein zweites host-Ereignis für den verworfenen Schreibvorgang
+    assert host_events(progress) == []
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import base64
+import gzip
+import json
+
+import pytest
+
+from functions.HostStateCache import host_state
+from functions.SoftwareInventoryWinRM import handle_output
+
+SOFTWARE = [
+    {"Name": "7-Zip 23.01 (x64)", "Publisher": "Igor Pavlov", "InstallDate": "20240105", "Size": 5530,
+     "Version": "23.01"},
+    {"Name": "Mozilla Firefox (x64 de)", "Publisher": "Mozilla", "InstallDate": None, "Size": 0,
+     "Version": "128.0"},
+]
+
+TEXT_PAYLOAD = "\r\n".join([
+    "Name       : 7-Zip 23.01 (x64)",
+    "Version    : 23.01",
+    "Publisher  : Igor Pavlov",
+    "Installiert: 20240105",
+    "Größe      : 5530 KB",
+    "-------------------------------",
+])
+
+
+class PrintLog:
+    """Print-Präfixe wie ``DatabaseManager``, ohne Konfiguration"""
+
+    def get_logprint_info(self):
+        return "[INFO]"
+
+    def get_logprint_debug(self):
+        return "[DEBUG]"
+
+    def get_logprint_warning(self):
+        return "[WARNING]"
+
+
+@pytest.fixture
+def host():
+    hostname = "TESTHOST01"
+    yield hostname
+    host_state.discard(hostname, "payload_format", "os")
+
+
+def encode(payload: bytes):
+    return base64.b64encode(payload).decode("ascii")
+
+
+def test_json_payload(host):
+    output = encode(json.dumps(SOFTWARE).encode("utf-8"))
+    software_list = handle_output(output, host, PrintLog(), "json")
+    assert [entry["Name"] for entry in software_list] == [entry["Name"] for entry in SOFTWARE]
+    assert all(entry["Hostname"] == host for entry in software_list)
+
+
+def test_single_entry_is_a_list(host):
+    # ConvertTo-Json gibt ein einzelnes Objekt ohne Array aus
+    output = encode(json.dumps(SOFTWARE[0]).encode("utf-8"))
+    software_list = handle_output(output, host, PrintLog(), "json")
+    assert len(software_list) == 1
+    assert software_list[0]["Version"] == "23.01"
+
+
+def test_detect_header_is_cached(host):
+    output = "PAYLOAD:json|Microsoft Windows Server 2019 Standard\r\n" + encode(json.dumps(SOFTWARE).encode("utf-8"))
+    software_list = handle_output(output, host, PrintLog())
+    assert len(software_list) == 2
+    assert host_state.get(host)["payload_format"] == "json"
+    assert host_state.get(host)["os"] == "Microsoft Windows Server 2019 Standard"
+
+
+def test_text_payload(host):
+    output = "PAYLOAD:text|Microsoft Windows Server 2008 R2\r\n" + encode(TEXT_PAYLOAD.encode("utf-8"))
+    software_list = handle_output(output, host, PrintLog())
+    assert software_list == [{"Name": "7-Zip 23.01 (x64)", "Version": "23.01", "Publisher": "Igor Pavlov",
+                              "InstallDate": "20240105", "Size": 5530, "Hostname": host}]
+
+
+def test_text_fallback_without_format(host):
+    software_list = handle_output(encode(TEXT_PAYLOAD.encode("utf-8")), host, PrintLog())
+    assert software_list[0]["Name"] == "7-Zip 23.01 (x64)"
+
+
+def test_empty_payload(host):
+    with pytest.raises(ValueError):
+        handle_output(encode(b"  "), host, PrintLog(), "json")
+
+
+def test_gzip_json_payload(host):
+    output = encode(gzip.compress(json.dumps(SOFTWARE).encode("utf-8")))
+    software_list = handle_output(output, host, PrintLog(), "json")
+    assert [entry["Name"] for entry in software_list] == [entry["Name"] for entry in SOFTWARE]
+    assert all(entry["Hostname"] == host for entry in software_list)
+
+
+def test_gzip_text_payload_with_header(host):
+    output = "PAYLOAD:text|Microsoft Windows Server 2008 R2\r\n" + encode(gzip.compress(TEXT_PAYLOAD.encode("utf-8")))
+    software_list = handle_output(output, host, PrintLog())
+    assert software_list[0]["Size"] == 5530
+    assert software_list[0]["Publisher"] == "Igor Pavlov"
+
+
+def test_gzip_and_plain_payload_decode_alike(host):
+    # Schlägt GZip auf dem Host fehl, kommt derselbe Inhalt unkomprimiert
+    payload = json.dumps(SOFTWARE).encode("utf-8")
+    plain = handle_output(encode(payload), host, PrintLog(), "json")
+    compressed = handle_output(encode(gzip.compress(payload)), host, PrintLog(), "json")
+    assert plain == compressed
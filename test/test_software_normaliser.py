@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+from functions.publisher_rules import BUILTIN_RULES, PublisherMatcher
+from functions.software_normaliser import clean_names, normalise_software
+
+# Rohdaten und Ergebnis der ursprünglichen Normalisierung (re.sub je Schritt, fest codierte Hersteller), erzeugt
+# mit reference_normalise aus bench_normaliser.py
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__), "fixtures", "normaliser_golden.json")
+
+with open(GOLDEN_FILE, encoding="utf-8") as golden_file:
+    GOLDEN = json.load(golden_file)
+
+
+def entry_id(entry):
+    return entry["raw"].get("Name") or "<leer>"
+
+
+@pytest.mark.parametrize("entry", GOLDEN, ids=entry_id)
+def test_normalise_software_matches_golden(entry):
+    # Die eingebauten Regeln entsprechen der ursprünglichen Vereinheitlichung, unabhängig von publisher_rules.csv
+    name, publisher, install_date, size, version = normalise_software(entry["raw"], PublisherMatcher(BUILTIN_RULES))
+    expected = entry["expected"]
+    assert name == expected["Name"]
+    assert publisher == expected["Publisher"]
+    assert (install_date.isoformat() if install_date else None) == expected["InstallDate"]
+    assert size == expected["Size"]
+    assert version == expected["Version"]
+
+
+def test_clean_names_matches_golden():
+    assert [clean_names(entry["raw"]["Name"]) for entry in GOLDEN] == [entry["expected"]["Name"] for entry in GOLDEN]
+    # Zweiter Durchlauf aus dem Cache liefert dasselbe
+    assert [clean_names(entry["raw"]["Name"]) for entry in GOLDEN] == [entry["expected"]["Name"] for entry in GOLDEN]
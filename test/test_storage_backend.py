@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import config.config_manager as config_manager
+from functions.StorageBackend import StorageBackend, create_backend
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend(None, "sw_inventory", 500)
+    assert {"connect", "create_tables", "write_snapshot", "write_summary"} <= StorageBackend.__abstractmethods__
+
+
+def test_incomplete_backend_cannot_be_created():
+    class PartialBackend(StorageBackend):
+        def describe(self):
+            return "partial"
+
+    with pytest.raises(TypeError, match="abstract"):
+        PartialBackend(None, "sw_inventory", 500)
+
+
+def test_sqlite_backend_implements_all_methods(tmp_path):
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(f"[db]\nengine = sqlite\nsqlite_path = {tmp_path / 'inventory.db'}\n"
+                           "prod-table = sw_inventory\nbackup-table = sw_inventory_backup\n")
+    backend = create_backend("sqlite", config_manager.load_settings(str(config_file)), "sw_inventory", 500)
+    assert backend.engine == "sqlite"
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import itertools
+
+import pytest
+
+pytest.importorskip("winrm")
+
+from functions import SoftwareInventoryWinRM as inventory_module
+from functions import WinRMSessionPool as pool_module
+from functions.SoftwareInventoryWinRM import SoftwareInventoryWinRM
+from functions.WinRMSessionPool import WinRMSessionPool
+
+
+class FakeProtocol:
+    """``winrm.Protocol`` eines Hosts, dessen Shells der Server schließen kann"""
+
+    def __init__(self):
+        self.shell_ids = itertools.count(1)
+        self.closed_by_server = set()
+        self.commands = []
+
+    def open_shell(self):
+        return f"SHELL-{next(self.shell_ids)}"
+
+    def run_command(self, shell_id, command):
+        if shell_id in self.closed_by_server:
+            raise ConnectionResetError(f"shell {shell_id} is gone")
+        self.commands.append(shell_id)
+        return "CMD-1"
+
+    def get_command_output(self, shell_id, command_id):
+        return b"ok", b"", 0
+
+    def cleanup_command(self, shell_id, command_id):
+        pass
+
+    def close_shell(self, shell_id):
+        pass
+
+
+@pytest.fixture
+def protocol(monkeypatch):
+    protocol = FakeProtocol()
+
+    class FakeSession:
+        def __init__(self, target, auth, transport, **kwargs):
+            self.protocol = protocol
+
+    monkeypatch.setattr(pool_module.winrm, "Session", FakeSession)
+    monkeypatch.setattr(inventory_module, "winrm_pool", WinRMSessionPool())
+    return protocol
+
+
+def make_client(host="TESTHOST01"):
+    # Ohne __init__: braucht weder DatabaseManager noch config.ini
+    client = object.__new__(SoftwareInventoryWinRM)
+    client.host = host
+    client.user, client.pwd, client.transport = "inventory", "secret", "ntlm"
+    client.timings = {'connect': 0.0, 'script': 0.0}
+    client.get_logprint_warning = lambda: "[WARNING]"
+    return client
+
+
+def test_shell_is_reused(protocol):
+    client = make_client()
+    client.run_ps("Get-Date")
+    client.run_ps("Get-Date")
+    assert protocol.commands == ["SHELL-1", "SHELL-1"]
+
+
+def test_stale_pooled_shell_is_retried_with_new_shell(protocol):
+    client = make_client()
+    client.run_ps("Get-Date")
+    # Server hat die Shell im Leerlauf geschlossen
+    protocol.closed_by_server.add("SHELL-1")
+
+    assert client.run_ps("Get-Date").std_out == b"ok"
+    assert protocol.commands == ["SHELL-1", "SHELL-2"]
+    stats = inventory_module.winrm_pool.stats()
+    assert stats == {'open': 1, 'idle': 1, 'in_use': 0, 'hosts': 1}
+
+
+def test_new_shell_is_not_retried(protocol):
+    protocol.closed_by_server.add("SHELL-1")
+    with pytest.raises(ConnectionResetError):
+        make_client().run_ps("Get-Date")
+    assert inventory_module.winrm_pool.stats()['open'] == 0
+
+
+def test_retry_fails_only_once(protocol):
+    client = make_client()
+    client.run_ps("Get-Date")
+    protocol.closed_by_server.update({"SHELL-1", "SHELL-2"})
+    with pytest.raises(ConnectionResetError):
+        client.run_ps("Get-Date")
+    assert inventory_module.winrm_pool.stats()['open'] == 0
@@ -1,16 +1,19 @@
 import csv
+import os
 from threading import Event, Lock
 
 from functions.DatabaseManager import DatabaseManager
 
 db = DatabaseManager()
 
+HOSTS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "csv", "hosts.csv"))
+
 service_active = Event()
 service_active.set()
 
 def get_total_hosts():
     try:
-        with open('csv\\hosts.csv', 'r') as f:
+        with open(HOSTS_FILE, 'r') as f:
             return sum(1 for _ in csv.reader(f)) - 1  # minus header
     except Exception as e:
         return e
@@ -18,8 +21,49 @@ def get_total_hosts():
 # Fortschrittsvariablen
 inventory_start_time = None
 processed_hosts = 0
-total_hosts = get_total_hosts()
 is_running = False
-last_run_time = db.get_metadata("last_inventory_start")
 last_host_count = 0
-processed_hosts_lock = Lock()
\ No newline at end of file
+processed_hosts_lock = Lock()
+
+# Planung des laufenden Inventars: erwartete Dauer (Sekunden) der noch offenen Hosts
+host_predictions = {}
+run_parallelism = 1
+
+
+def get_eta_seconds():
+    """
+    Estimated remaining run time from the recorded host durations, ``None`` without a plan.
+    The open hosts are spread over ``run_parallelism`` workers, but the run can't end before its longest host.
+    """
+    with processed_hosts_lock:
+        return estimate_eta_seconds()
+
+
+def estimate_eta_seconds():
+    """
+    Same as ``get_eta_seconds``, for callers already holding ``processed_hosts_lock``
+    """
+    if not host_predictions:
+        return None
+    durations = host_predictions.values()
+    return max(sum(durations) / max(1, run_parallelism), max(durations))
+
+
+def __getattr__(name):
+    """
+    ``total_hosts`` and ``last_run_time`` are read on first access instead of on import, the import neither needs
+    ``csv/hosts.csv`` nor the database. Assigning them replaces the lazy value as before. ``last_run_time`` is only
+    kept once the database returned a value.
+    """
+    if name == "total_hosts":
+        value = get_total_hosts()
+    elif name == "last_run_time":
+        # get_metadata liefert None auch, wenn die Datenbank nicht erreichbar ist: dann nicht merken und beim
+        # nächsten Zugriff erneut lesen (aus dem Metadaten-Cache, solange dieser gültig ist)
+        value = db.get_metadata("last_inventory_start")
+        if value is None:
+            return None
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value